@@ -1,69 +1,134 @@
 import argparse
-import typing
 
-from PIL import Image
+import numpy as np
 from src.config import load_config, Config
-from src.utils.image_utils import get_pixel_count
+from src.snapshot_diff import (
+    ChangeType,
+    CHANGE_TYPES,
+    count_snapshot_changes,
+    get_rolling_rates,
+)
+from src.snapshot_history import get_snapshot_names, iterate_snapshots
+from src.template_cache import load_compiled_template
 from src.utils.color_utils import ColorName
-from src.utils.graphing_utils import Grapher, parse_filename_unix_time
-import os
-
-
-def _get_image_paths(config: Config):
-    image_paths = []
-    for image_path in os.listdir(config.picture_dir):
-        assert image_path.endswith(".png"), (
-            f"Expected .png file, got {image_path}!"
-        )
-        image_paths.append(image_path)
-    print(len(image_paths))
-    image_paths.sort()  # dir/yyyy-mm-dd hh-mm-ss format should sort alphabetically.
-    return image_paths
+from src.utils.graph_rendering import GRAPH_RENDERERS, GraphRenderer
+from src.utils.graphing_utils import (
+    Grapher,
+    get_time_range_start,
+    parse_filename_unix_time,
+)
+from src.utils.palette_utils import PALETTE, TRANSPARENT_INDEX
 
 
 TIME_INTERVAL = 30
 
+DEFAULT_CHANGE_TYPES: tuple[ChangeType, ...] = (
+    "placed",
+    "overwritten_correct",
+    "overwritten_wrong",
+)
+
+
+def get_rates_start(
+        since: float | None,
+        smoothing_minutes: float | None,
+) -> float | None:
+    """
+    :return: The earliest unix time of the progress pictures that are
+     needed for the placement rates from **since** on, not counting the
+     picture before it.
+    """
+    if since is None or smoothing_minutes is None:
+        return since
+    return since - smoothing_minutes * 60
+    # ^ The first rates are averaged over the intervals before them.
+
+
+def put_placement_rates(
+        grapher: Grapher,
+        image_names: list[str],
+        interval_counts: list[np.ndarray],
+        smoothing_minutes: float | None = None,
+) -> None:
+    """
+    Add the amount of changed pixels per minute to the grapher.
+
+    :param grapher: The grapher to add the data to.
+    :param image_names: The file names of the progress pictures, in
+     chronological order.
+    :param interval_counts: The amount of changed pixels per palette index
+     between each progress picture and the one before it. One shorter than
+     **image_names**.
+    :param smoothing_minutes: If given, average the rates over a rolling
+     window of this many minutes.
+    """
+    if len(interval_counts) == 0:
+        return
+
+    rates = get_rolling_rates(
+        np.array([parse_filename_unix_time(name) for name in image_names]),
+        np.array(interval_counts),
+        smoothing_minutes,
+    )
+    for image_name, rate in zip(image_names[1:], rates):
+        rate_data: dict[ColorName, float] = {
+            color_name: float(rate[index])
+            for index, color_name in enumerate(PALETTE)
+            if index != TRANSPARENT_INDEX
+        }
+        grapher.add_data_point_from_filename(image_name, rate_data)
+
 
 def put_average_placement_data(
         config: Config,
         grapher: Grapher,
+        change_types: tuple[ChangeType, ...] = DEFAULT_CHANGE_TYPES,
+        smoothing_minutes: float | None = None,
+        since: float | None = None,
 ) -> None:
-    image_paths = _get_image_paths(config)
-
-    previous_image_count: dict[ColorName, int] | None = None
-    previous_image_time: int | None = None
-    for image_name in image_paths:
-        path = os.path.join(config.picture_dir, image_name)
-        img = Image.open(path)
-        count = get_pixel_count(img)
-        image_time = parse_filename_unix_time(image_name)
-        if previous_image_count is None:
-            previous_image_count = count
-            previous_image_time = image_time
-            continue
-
-        previous_image_count = typing.cast(dict[ColorName, int],
-                                           previous_image_count)
-        previous_image_time = typing.cast(int, previous_image_time)
-        assert count.keys() == previous_image_count.keys()
-
-        timespan = (image_time - previous_image_time)
-        count_difference: dict[ColorName, float] = {
-            k: (v - previous_image_count[k]) * 60 / timespan
-            for k, v in count.items()
-        }
-        grapher.add_data_point_from_filename(image_name, count_difference)
-        previous_image_count = count
+    """
+    Add the amount of changed pixels per minute between each progress
+    picture to the grapher.
+
+    :param config: The config to get the progress pictures of.
+    :param grapher: The grapher to add the data to.
+    :param change_types: The kinds of pixel changes to count.
+    :param smoothing_minutes: If given, average the rates over a rolling
+     window of this many minutes.
+    :param since: If given, skip progress pictures that aren't needed for
+     the rates from this unix time on, without opening them.
+    """
+    image_names = get_snapshot_names(
+        config, get_rates_start(since, smoothing_minutes),
+        include_previous=True)
+    template = load_compiled_template(config)
+
+    interval_counts: list[np.ndarray] = []
+    previous_image: np.ndarray | None = None
+    for image_name, image in iterate_snapshots(config, image_names):
+        if previous_image is not None:
+            changes = count_snapshot_changes(template, previous_image, image)
+            interval_counts.append(sum(
+                changes[change_type] for change_type in change_types))
+        previous_image = image
+
+    put_placement_rates(grapher, image_names, interval_counts,
+                        smoothing_minutes)
 
 
 def save_average_placement_graph(
         config_name: str,
         max_minutes: int | None = None,
         step_graph: bool = False,
+        change_types: tuple[ChangeType, ...] = DEFAULT_CHANGE_TYPES,
+        smoothing_minutes: float | None = None,
+        renderer: GraphRenderer = "matplotlib",
 ):
     config = load_config(config_name)
     grapher = Grapher()
-    put_average_placement_data(config, grapher)
+    put_average_placement_data(config, grapher, change_types,
+                               smoothing_minutes,
+                               get_time_range_start(max_minutes))
     grapher.make_graph(
         config,
         config.paths.AVERAGE_PIXEL_PLACEMENT_GRAPH_NAME,
@@ -72,6 +137,7 @@ def save_average_placement_graph(
         max_minutes=max_minutes,
         as_step=step_graph,
         hide_repeating_zeros=False,
+        renderer=renderer,
     )
 
 
@@ -99,10 +165,40 @@ if __name__ == "__main__":
              "(Default: Line graph)"
     )
 
+    arg_parser.add_argument(
+        "--change_type", "-c",
+        type=str,
+        action="append",
+        choices=CHANGE_TYPES,
+        default=None,
+        help="The kind of pixel change to count. Can be used multiple times. "
+             "(Default: placed, overwritten_correct and overwritten_wrong)"
+    )
+    arg_parser.add_argument(
+        "--smoothing_minutes",
+        type=float,
+        default=None,
+        help="Average the placement rate over a rolling window of this many "
+             "minutes, to smooth out spikes from saved-up pixels. "
+             "(Default: No smoothing)"
+    )
+    arg_parser.add_argument(
+        "--renderer",
+        type=str,
+        choices=GRAPH_RENDERERS,
+        default="matplotlib",
+        help="What to draw the graph with. \"pil\" (PNG) and \"svg\" are "
+             "a lot faster, since they don't load matplotlib. "
+             "(Default: matplotlib)"
+    )
+
     args = arg_parser.parse_args()
 
     save_average_placement_graph(
         args.config,
         args.max_minutes,
         args.step_graph,
+        tuple(args.change_type or DEFAULT_CHANGE_TYPES),
+        args.smoothing_minutes,
+        args.renderer,
     )
@@ -1,39 +1,339 @@
 import argparse
+import asyncio
+import contextlib
+import io
 import os.path
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
 
 from src import (
     save_latest_image,
     save_remainder_images,
-    save_pixel_count,
 )
-from src.config import load_config
+from src.change_stream import ChangeLog
+from src.config import load_config, Config
+from src.config_group import (
+    ConfigGroup,
+    fetch_group_tiles,
+    get_group_canvas,
+    is_config_group,
+    load_config_group,
+)
+from src.count_pixels import save_remainder_count
+from src.latest_image_loader import (
+    TileFetcher,
+    fetch_latest_tiles,
+    save_fetched_image,
+    save_snapshot_palette,
+)
+from src.overwrite_tracker import update_overwrite_stats
+from src.progress_picture import save_remainder_palette
+from src.snapshot_history import load_snapshot_palette
+from src.strip_pipeline import save_latest_image_in_strips
+from src.tile_archive import TileRecorder
+from src.tile_pyramid import update_tile_pyramids
+from src.utils.profiling_utils import (
+    PipelineProfiler,
+    cprofile_run,
+    measure_stage,
+)
+
+
+def update_outputs(
+        config: Config,
+        timestamp: str | None,
+        ignore_if_identical: bool,
+        profiler: PipelineProfiler | None,
+        track_overwrites: bool,
+        snapshot: np.ndarray | None = None,
+        *,
+        outputs_saved: bool = False,
+        pyramid: bool = False,
+) -> None:
+    """
+    Update the remainder pictures, pixel counts and (optionally) overwrite
+    statistics after a progress picture was saved.
+
+    :param snapshot: The palette indices of the saved progress picture, if
+     they are still in memory. (Default: load the progress picture)
+    :param outputs_saved: Whether the remainder pictures and pixel counts
+     were already saved along with the progress picture, like
+     `save_latest_image_in_strips` does.
+    :param pyramid: Whether to update the tile pyramids of the progress
+     picture and remainder picture.
+    """
+    if timestamp is None:
+        assert ignore_if_identical
+        # ^ `ignore_if_identical` must be true for `timestamp` to be None.
+        print("The canvas hasn't changed! Discarding downloaded image.\n")
+        return
+
+    progress_path = os.path.join(config.picture_dir,
+                                 timestamp + ".png")
+    print(f"Added latest image at `{progress_path}`")
+    if not outputs_saved:
+        if snapshot is None and pyramid:
+            with measure_stage(profiler, config, "load_progress"):
+                snapshot = load_snapshot_palette(config, f"{timestamp}.png")
+            # ^ Kept for the pyramids, instead of loading it twice.
+        if snapshot is None:
+            remainder = save_remainder_images(config, f"{timestamp}.png",
+                                              profiler=profiler)
+        else:
+            remainder = save_remainder_palette(config, snapshot,
+                                               profiler=profiler)
+        save_remainder_count(config, remainder, f"{timestamp}.png",
+                             profiler=profiler)
+    remainder_path = os.path.join(config.output_dir,
+                                  config.paths.REMAINING_PIXELS_NAME)
+    print(f"Updated remainder pictures at `{remainder_path}`")
+    count_path = os.path.join(config.output_dir,
+                              config.paths.REMAINING_PIXEL_COUNT_NAME)
+    print(f"Updated pixel count at `{count_path}`")
+
+    if track_overwrites:
+        with measure_stage(profiler, config, "overwrites"):
+            update_overwrite_stats(config)
+        stats_path = os.path.join(config.output_dir,
+                                  config.paths.OVERWRITE_STATS_NAME)
+        print(f"Updated overwrite statistics at `{stats_path}`")
+
+    if pyramid:
+        with measure_stage(profiler, config, "pyramid"):
+            tile_count = update_tile_pyramids(config, f"{timestamp}.png",
+                                              snapshot, remainder)
+        pyramid_path = os.path.join(config.output_dir,
+                                    config.paths.TILE_PYRAMID_DIRECTORY)
+        print(f"Updated {tile_count} tile(s) of the tile pyramids at "
+              f"`{pyramid_path}`")
+    print()
 
 
 def main(
         config_names: list[str],
         ignore_if_identical: bool,
+        profiler: PipelineProfiler | None = None,
+        track_overwrites: bool = False,
+        subsecond: bool = False,
+        fetcher: TileFetcher | None = None,
+        strip_height: int | None = None,
+        pyramid: bool = False,
+        change_log: ChangeLog | None = None,
 ):
+    if strip_height is not None and pyramid:
+        raise ValueError("Tile pyramids need the whole canvas in memory, so "
+                         "they can't be updated in strips!")
     for config_name in config_names:
+        if is_config_group(config_name):
+            group = load_config_group(config_name)
+            coords, pictures, fetched_at = asyncio.run(
+                fetch_group_tiles(group, fetcher=fetcher))
+            _process_group_tiles(group, coords, pictures, ignore_if_identical,
+                                 fetched_at, subsecond, profiler,
+                                 track_overwrites, pyramid, change_log)
+            continue
         config = load_config(config_name)
         print(f"Fetching for `{config_name}`...")
-        timestamp: str | None = save_latest_image(config, ignore_if_identical)
-        if timestamp is None:
-            assert ignore_if_identical
-            # ^ `ignore_if_identical` must be true for `timestamp` to be None.
-            print("The canvas hasn't changed! Discarding downloaded image.\n")
+        if strip_height is not None:
+            timestamp = save_latest_image_in_strips(
+                config, ignore_if_identical, strip_height,
+                subsecond=subsecond, profiler=profiler, fetcher=fetcher)
+            update_outputs(config, timestamp, ignore_if_identical, profiler,
+                           track_overwrites, outputs_saved=True,
+                           pyramid=pyramid)
             continue
+        timestamp: str | None = save_latest_image(
+            config, ignore_if_identical, subsecond=subsecond,
+            profiler=profiler, fetcher=fetcher, change_log=change_log)
+        update_outputs(config, timestamp, ignore_if_identical, profiler,
+                       track_overwrites, pyramid=pyramid)
+    print("Successfully fetched latest image(s)!")
+
+
+def _process_group_tiles(
+        group: ConfigGroup,
+        coords: list[tuple[int, int]],
+        pictures: list[bytes],
+        ignore_if_identical: bool,
+        fetched_at: datetime,
+        subsecond: bool,
+        profiler: PipelineProfiler | None,
+        track_overwrites: bool,
+        pyramid: bool,
+        change_log: ChangeLog | None,
+) -> None:
+    """
+    Decode the chunks of a config group once, and update every member from
+    its part of the shared canvas.
+    """
+    print(f"Fetched {len(coords)} chunk(s) for the {len(group.members)} "
+          f"config(s) in `{group.name}`")
+    canvas = get_group_canvas(group, coords, pictures)
+    for member in group.members:
+        print(f"Updating `{member.name}`...")
+        snapshot = group.get_member_snapshot(canvas, member)
+        timestamp = save_snapshot_palette(
+            member, snapshot, ignore_if_identical,
+            fetched_at=fetched_at, subsecond=subsecond, profiler=profiler,
+            change_log=change_log,
+        )
+        update_outputs(member, timestamp, ignore_if_identical, profiler,
+                       track_overwrites, snapshot, pyramid=pyramid)
+
+
+def _process_fetched_tiles(
+        config: Config,
+        coords: list[tuple[int, int]],
+        pictures: list[bytes],
+        ignore_if_identical: bool,
+        fetched_at: datetime,
+        subsecond: bool,
+        profiler: PipelineProfiler | None,
+        track_overwrites: bool,
+        pyramid: bool,
+        change_log: ChangeLog | None,
+) -> str:
+    """
+    Run the CPU-heavy stages for one config. This runs in a worker process,
+    so all printed output is captured and returned to keep it grouped.
+
+    :return: Everything the stages printed.
+    """
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        print(f"Fetching for `{config.name}`...")
+        saved_timestamp = save_fetched_image(
+            config, coords, pictures, ignore_if_identical,
+            fetched_at=fetched_at, subsecond=subsecond, profiler=profiler,
+            change_log=change_log,
+        )
+        update_outputs(config, saved_timestamp, ignore_if_identical,
+                       profiler, track_overwrites, pyramid=pyramid)
+    return output.getvalue()
+
+
+async def _fetch_and_process(
+        executor: Executor,
+        config: Config,
+        ignore_if_identical: bool,
+        profiler: PipelineProfiler | None,
+        track_overwrites: bool,
+        subsecond: bool,
+        fetcher: TileFetcher | None,
+        pyramid: bool,
+        change_log: ChangeLog | None,
+) -> str:
+    coords, pictures, fetched_at = await fetch_latest_tiles(
+        config, profiler=profiler, fetcher=fetcher)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor,
+        _process_fetched_tiles,
+        config, coords, pictures, ignore_if_identical, fetched_at, subsecond,
+        profiler, track_overwrites, pyramid, change_log,
+    )
+
+
+def _capture_group_output(*args) -> str:
+    """
+    Run `_process_group_tiles` in a worker process, and return everything it
+    printed.
+    """
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        _process_group_tiles(*args)
+    return output.getvalue()
+
+
+async def _fetch_and_process_group(
+        executor: Executor,
+        group: ConfigGroup,
+        ignore_if_identical: bool,
+        profiler: PipelineProfiler | None,
+        track_overwrites: bool,
+        subsecond: bool,
+        fetcher: TileFetcher | None,
+        pyramid: bool,
+        change_log: ChangeLog | None,
+) -> str:
+    coords, pictures, fetched_at = await fetch_group_tiles(
+        group, fetcher=fetcher)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor,
+        _capture_group_output,
+        group, coords, pictures, ignore_if_identical, fetched_at, subsecond,
+        profiler, track_overwrites, pyramid, change_log,
+    )
+
+
+async def _run_pipelined(
+        configs: list[Config | ConfigGroup],
+        ignore_if_identical: bool,
+        profiler: PipelineProfiler | None,
+        max_workers: int | None,
+        track_overwrites: bool,
+        subsecond: bool,
+        fetcher: TileFetcher | None,
+        pyramid: bool,
+        change_log: ChangeLog | None,
+) -> None:
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        tasks = [
+            asyncio.create_task(_fetch_and_process_group(
+                executor, config, ignore_if_identical, profiler,
+                track_overwrites, subsecond, fetcher, pyramid, change_log))
+            if isinstance(config, ConfigGroup) else
+            asyncio.create_task(_fetch_and_process(
+                executor, config, ignore_if_identical, profiler,
+                track_overwrites, subsecond, fetcher, pyramid, change_log))
+            for config in configs
+        ]
+        for task in asyncio.as_completed(tasks):
+            print(await task, end="")
+
+
+def main_pipelined(
+        config_names: list[str],
+        ignore_if_identical: bool,
+        profiler: PipelineProfiler | None = None,
+        max_workers: int | None = None,
+        track_overwrites: bool = False,
+        subsecond: bool = False,
+        fetcher: TileFetcher | None = None,
+        pyramid: bool = False,
+        change_log: ChangeLog | None = None,
+):
+    """
+    Like `main`, but download the chunks of all configs concurrently, and
+    process each config in a worker process as soon as its chunks arrive.
 
-        progress_path = os.path.join(config.picture_dir,
-                                     timestamp + ".png")
-        print(f"Added latest image at `{progress_path}`")
-        save_remainder_images(config, f"{timestamp}.png")
-        remainder_path = os.path.join(config.output_dir,
-                                      config.paths.REMAINING_PIXELS_NAME)
-        print(f"Updated remainder pictures at `{remainder_path}`")
-        save_pixel_count(config)
-        count_path = os.path.join(config.output_dir,
-                                  config.paths.REMAINING_PIXEL_COUNT_NAME)
-        print(f"Updated pixel count at `{count_path}`\n")
+    :param config_names: The names of the configs to fetch for.
+    :param ignore_if_identical: Discard downloaded images that are identical
+     to the most recent saved image.
+    :param profiler: An optional profiler to record each stage with.
+    :param max_workers: The maximum amount of worker processes.
+     (Default: the amount of CPU cores)
+    :param track_overwrites: Whether to update the overwrite statistics.
+    :param subsecond: Whether to include microseconds in the names of the
+     saved images.
+    :param fetcher: The function to get the chunk images with.
+     (Default: download them from wplace)
+    :param pyramid: Whether to update the tile pyramids of each config.
+    :param change_log: If given, record the pixels that changed in each
+     config in it.
+    """
+    configs = [
+        load_config_group(config_name) if is_config_group(config_name)
+        else load_config(config_name)
+        for config_name in config_names
+    ]
+    asyncio.run(_run_pipelined(configs, ignore_if_identical, profiler,
+                               max_workers, track_overwrites, subsecond,
+                               fetcher, pyramid, change_log))
     print("Successfully fetched latest image(s)!")
 
 
@@ -53,6 +353,135 @@ if __name__ == "__main__":
         help="Discard the downloaded image if it is identical to the most "
              "recent already-saved image."
     )
+    arg_parser.add_argument(
+        "--instrument", "-i",
+        action="store_true",
+        help="Record the wall time, CPU time and memory usage of each "
+             "pipeline stage to `pipeline_stats.jsonl` in the output "
+             "directory of each config."
+    )
+    arg_parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Like --instrument, but also write a cProfile dump of the "
+             "whole run to the `profiles` directory. With --parallel, the "
+             "dump only covers the main process."
+    )
+    arg_parser.add_argument(
+        "--parallel", "-p",
+        action="store_true",
+        help="Download the chunks for all configs at once, and process "
+             "each config in a separate process as soon as its chunks "
+             "have been downloaded."
+    )
+    arg_parser.add_argument(
+        "--workers", "-w",
+        type=int,
+        default=None,
+        help="The maximum amount of processes to use with --parallel. "
+             "(Default: The amount of CPU cores)"
+    )
+    arg_parser.add_argument(
+        "--track_overwrites", "-o",
+        action="store_true",
+        help="Also update the overwrite heatmaps and statistics with the "
+             "new progress picture. (See griefing_heatmap_maker.py)"
+    )
+    arg_parser.add_argument(
+        "--subsecond", "-s",
+        action="store_true",
+        help="Include microseconds in the name of the progress picture, so "
+             "that more than one picture per second can be saved."
+    )
+    arg_parser.add_argument(
+        "--record",
+        type=str,
+        default=None,
+        metavar="DIRECTORY",
+        help="Also save the downloaded chunks to an archive directory, to "
+             "replay them later with load_tester.py."
+    )
+    arg_parser.add_argument(
+        "--strip_height",
+        type=int,
+        default=None,
+        help="Download and process the canvas in strips of this many pixels "
+             "high (a multiple of 1000), to use less memory for very large "
+             "canvases. Config groups are always processed as a whole."
+    )
+    arg_parser.add_argument(
+        "--pyramid",
+        action="store_true",
+        help="Also update zoomable tile pyramids of the progress picture and "
+             "remainder picture, for viewing very large canvases. Only tiles "
+             "that changed since the last fetch are saved again."
+    )
+    arg_parser.add_argument(
+        "--change_log",
+        action="store_true",
+        help="Append the pixels that changed since the previous progress "
+             "picture (their wplace coordinates, old and new colors, and "
+             "whether they now match the template) to "
+             "`pixel_changes.jsonl` in the output directory."
+    )
+    arg_parser.add_argument(
+        "--change_socket",
+        type=str,
+        default=None,
+        metavar="PATH",
+        help="Also send every change record to this Unix socket, as one JSON "
+             "line. Implies --change_log."
+    )
+    arg_parser.add_argument(
+        "--change_webhook",
+        type=str,
+        default=None,
+        metavar="URL",
+        help="Also POST every change record to this URL, as JSON. Implies "
+             "--change_log."
+    )
     args = arg_parser.parse_args()
+    if args.strip_height is not None and args.parallel:
+        arg_parser.error("--strip_height can't be used with --parallel")
+    if args.strip_height is not None and args.pyramid:
+        arg_parser.error("--strip_height can't be used with --pyramid")
+
+    pixel_change_log = None
+    if (
+            args.change_log
+            or args.change_socket is not None
+            or args.change_webhook is not None
+    ):
+        if args.strip_height is not None:
+            arg_parser.error("--strip_height can't be used with --change_log")
+        try:
+            pixel_change_log = ChangeLog(args.change_socket,
+                                         args.change_webhook)
+        except ValueError as e:
+            arg_parser.error(f"--change_webhook: {e}")
+
+    pipeline_profiler = None
+    if args.instrument or args.profile:
+        pipeline_profiler = PipelineProfiler()
+    tile_fetcher = None
+    if args.record is not None:
+        tile_fetcher = TileRecorder(args.record, run_time=time.time())
+        # ^ All configs of this run are recorded as one fetch.
+
+    def run():
+        if args.parallel:
+            main_pipelined(args.config, args.ignore_if_identical,
+                           pipeline_profiler, args.workers,
+                           args.track_overwrites, args.subsecond,
+                           tile_fetcher, args.pyramid, pixel_change_log)
+        else:
+            main(args.config, args.ignore_if_identical, pipeline_profiler,
+                 args.track_overwrites, args.subsecond, tile_fetcher,
+                 args.strip_height, args.pyramid, pixel_change_log)
 
-    main(args.config, args.ignore_if_identical)
+    if args.profile:
+        with cprofile_run(pipeline_profiler.run_id) as profile_path:
+            run()
+        print(f"Saved cProfile dump at `{profile_path}`")
+    else:
+        run()
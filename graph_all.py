@@ -0,0 +1,238 @@
+import argparse
+from typing import NamedTuple
+
+import numpy as np
+
+from average_pixel_placement_grapher import (
+    DEFAULT_CHANGE_TYPES,
+    get_rates_start,
+    put_placement_rates,
+)
+from pixel_progress_grapher import convert_progress_data_to_percentage
+from src.config import load_config, Config
+from src.snapshot_diff import ChangeType, CHANGE_TYPES, count_snapshot_changes
+from src.snapshot_history import get_snapshot_names, iterate_snapshots
+from src.template_cache import CompiledTemplate, load_compiled_template
+from src.utils.color_utils import ColorName
+from src.utils.graph_rendering import GRAPH_RENDERERS, GraphRenderer
+from src.utils.graphing_utils import Grapher, get_time_range_start
+from src.utils.palette_utils import count_palette, get_misplaced_palette
+
+
+class HistoryGraphers(NamedTuple):
+    remaining: Grapher
+    placed: Grapher
+    misplaced: Grapher
+    placement_rate: Grapher
+
+
+def _copy_grapher(grapher: Grapher) -> Grapher:
+    copy = Grapher()
+    copy.data = {key: list(values) for key, values in grapher.data.items()}
+    return copy
+
+
+def _convert_to_template_percentage(
+        grapher: Grapher,
+        template_pixel_count: int,
+) -> None:
+    """
+    Convert the pixel counts of each color to a percentage of all pixels in
+    the template. Unlike `convert_progress_data_to_percentage`, every color
+    is divided by the same amount, since misplaced pixels of a color are
+    mostly on pixels of other colors.
+    """
+    for key in grapher.data:
+        if key == "time":
+            continue
+        grapher.data[key] = [
+            round(i * 100 / template_pixel_count, 2)
+            if template_pixel_count > 0 else 0.0
+            for i in grapher.data[key]
+        ]
+    del grapher.data["Transparent"]
+
+
+def put_all_graph_data(
+        config: Config,
+        change_types: tuple[ChangeType, ...] = DEFAULT_CHANGE_TYPES,
+        smoothing_minutes: float | None = None,
+        since: float | None = None,
+        template: CompiledTemplate | None = None,
+) -> HistoryGraphers:
+    """
+    Walk through the progress pictures once, and collect the data of the
+    progress, misplacement and placement rate graphs together.
+
+    :param config: The config to get the progress pictures of.
+    :param change_types: The kinds of pixel changes to count for the
+     placement rate.
+    :param smoothing_minutes: If given, average the placement rates over a
+     rolling window of this many minutes.
+    :param since: If given, skip progress pictures that aren't needed for
+     the graphs from this unix time on, without opening them.
+    :param template: The compiled template of the config, if it is already
+     loaded. (Default: load the template)
+    :return: A grapher with the data of each graph.
+    """
+    if template is None:
+        template = load_compiled_template(config)
+    goal_counts = template.goal_counts
+    image_names = get_snapshot_names(
+        config, get_rates_start(since, smoothing_minutes),
+        include_previous=True)
+    # ^ The other graphs only need the pictures from `since` on, but the
+    #  few extra points are cropped away when the graphs are made.
+    graphers = HistoryGraphers(Grapher(), Grapher(), Grapher(), Grapher())
+
+    interval_counts: list[np.ndarray] = []
+    previous_image: np.ndarray | None = None
+    for image_name, image in iterate_snapshots(config, image_names):
+        color_counts = count_palette(image)
+        remaining: dict[ColorName, int] = {
+            k: goal_counts[k] - v for k, v in color_counts.items()
+        }
+        graphers.remaining.add_data_point_from_filename(image_name,
+                                                        remaining)
+        graphers.placed.add_data_point_from_filename(image_name,
+                                                     color_counts)
+        graphers.misplaced.add_data_point_from_filename(
+            image_name,
+            count_palette(get_misplaced_palette(template.palette, image)),
+        )
+        if previous_image is not None:
+            changes = count_snapshot_changes(template, previous_image, image)
+            interval_counts.append(sum(
+                changes[change_type] for change_type in change_types))
+        previous_image = image
+
+    put_placement_rates(graphers.placement_rate, image_names,
+                        interval_counts, smoothing_minutes)
+    return graphers
+
+
+def save_all_graphs(
+        config_name: str,
+        max_minutes: int | None = None,
+        as_step: bool = False,
+        change_types: tuple[ChangeType, ...] = DEFAULT_CHANGE_TYPES,
+        smoothing_minutes: float | None = None,
+        renderer: GraphRenderer = "matplotlib",
+) -> None:
+    """
+    Save the progress, misplacement and placement rate graphs, and the
+    percentage versions of the progress and misplacement graphs, from one
+    pass over the progress pictures.
+    """
+    config = load_config(config_name)
+    template = load_compiled_template(config)
+    graphers = put_all_graph_data(config, change_types, smoothing_minutes,
+                                  get_time_range_start(max_minutes), template)
+    if len(graphers.remaining.data["time"]) == 0:
+        print("There are no progress pictures to graph yet!")
+        return
+
+    placed_percentage = _copy_grapher(graphers.placed)
+    convert_progress_data_to_percentage(config, placed_percentage,
+                                        template.goal_counts)
+    misplaced_percentage = _copy_grapher(graphers.misplaced)
+    _convert_to_template_percentage(
+        misplaced_percentage,
+        int(np.count_nonzero(template.opacity_mask)))
+    # ^ Copied first, because making a graph crops the data in place.
+
+    graphs: list[tuple[Grapher, str, str, str]] = [
+        (graphers.remaining, config.paths.PIXEL_PROGRESS_GRAPH_NAME,
+         "Remaining pixels", ""),
+        (placed_percentage, config.paths.PIXEL_PROGRESS_PERCENTAGE_GRAPH_NAME,
+         "Placed pixels", "Placed pixels (%)"),
+        (graphers.misplaced, config.paths.MISPLACEMENT_GRAPH_NAME,
+         "Misplaced pixels", "Misplaced pixels"),
+        (misplaced_percentage,
+         config.paths.MISPLACEMENT_PERCENTAGE_GRAPH_NAME,
+         "Misplaced pixels", "Misplaced pixels (% of the template)"),
+    ]
+    for grapher, file_name, title, y_axis_label in graphs:
+        grapher.make_graph(
+            config,
+            file_name,
+            f"{title} on '{config.name}'",
+            y_axis_label,
+            max_minutes=max_minutes,
+            as_step=as_step,
+            renderer=renderer,
+        )
+    if len(graphers.placement_rate.data["time"]) > 0:
+        graphers.placement_rate.make_graph(
+            config,
+            config.paths.AVERAGE_PIXEL_PLACEMENT_GRAPH_NAME,
+            title=f"Pixels placed on '{config.name}'",
+            y_axis_label="Pixels per minute",
+            max_minutes=max_minutes,
+            as_step=as_step,
+            hide_repeating_zeros=False,
+            renderer=renderer,
+        )
+    print(f"Saved all graphs to `{config.output_dir}`")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Make the progress, misplacement and placement rate "
+                    "graphs at once, reading every progress picture only "
+                    "once."
+    )
+    arg_parser.add_argument(
+        "config",
+        type=str,
+        help="The config to use."
+    )
+    arg_parser.add_argument(
+        "--max_minutes", "-m",
+        type=int,
+        default=None,
+        help="How far back in time to make the graphs, in minutes. "
+             "(Default: No limit)"
+    )
+    arg_parser.add_argument(
+        "--as_step", "-s",
+        action="store_true",
+        help="Whether to make the graphs as steps or as lines. "
+             "(Default: Line graphs)"
+    )
+    arg_parser.add_argument(
+        "--change_type", "-c",
+        type=str,
+        action="append",
+        choices=CHANGE_TYPES,
+        default=None,
+        help="The kind of pixel change to count in the placement rate graph. "
+             "Can be used multiple times. "
+             "(Default: placed, overwritten_correct and overwritten_wrong)"
+    )
+    arg_parser.add_argument(
+        "--smoothing_minutes",
+        type=float,
+        default=None,
+        help="Average the placement rate over a rolling window of this many "
+             "minutes. (Default: No smoothing)"
+    )
+    arg_parser.add_argument(
+        "--renderer",
+        type=str,
+        choices=GRAPH_RENDERERS,
+        default="matplotlib",
+        help="What to draw the graphs with. \"pil\" (PNG) and \"svg\" are "
+             "a lot faster, since they don't load matplotlib. "
+             "(Default: matplotlib)"
+    )
+    args = arg_parser.parse_args()
+
+    save_all_graphs(
+        args.config,
+        args.max_minutes,
+        args.as_step,
+        tuple(args.change_type or DEFAULT_CHANGE_TYPES),
+        args.smoothing_minutes,
+        args.renderer,
+    )
@@ -0,0 +1,47 @@
+import argparse
+import json
+import os
+
+from src.config import load_config
+from src.overwrite_tracker import update_overwrite_stats
+
+
+def save_griefing_heatmaps(config_name: str) -> None:
+    config = load_config(config_name)
+    processed = update_overwrite_stats(config)
+    print(f"Processed {processed} new progress picture(s).")
+
+    stats_path = os.path.join(config.output_dir,
+                              config.paths.OVERWRITE_STATS_NAME)
+    with open(stats_path, "r") as f:
+        statistics = json.load(f)
+    print(
+        f"{statistics['overwrite_count']} overwrites on "
+        f"{statistics['overwritten_pixels']} different pixels, "
+        f"{statistics['unrepaired_pixels']} of which haven't been "
+        f"repaired yet."
+    )
+    if statistics["mean_repair_time"] is not None:
+        print(
+            f"Overwritten pixels took "
+            f"{statistics['mean_repair_time'] / 60:.1f} minutes to repair "
+            f"on average (median: "
+            f"{statistics['median_repair_time'] / 60:.1f} minutes)."
+        )
+    print(f"Saved heatmaps and statistics to `{config.output_dir}`")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Make heatmaps of how often pixels got overwritten and "
+                    "how long it took to repair them."
+    )
+    arg_parser.add_argument(
+        "config",
+        type=str,
+        help="The config to use."
+    )
+
+    args = arg_parser.parse_args()
+
+    save_griefing_heatmaps(args.config)
@@ -0,0 +1,235 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import os.path
+import shutil
+import time
+from datetime import datetime
+from typing import NamedTuple
+
+from fetch_latest_picture import update_outputs
+from pixel_progress_grapher import put_progress_data_from_history
+from src.config import load_config, Config
+from src.latest_image_loader import (
+    fetch_latest_tiles,
+    get_grid_coordinates,
+    save_fetched_image,
+)
+from src.tile_archive import TileReplayer
+from src.utils.graphing_utils import Grapher
+from src.utils.profiling_utils import PipelineProfiler, measure_stage
+
+LOAD_TEST_DIRECTORY = "load_tests"
+
+
+class LoadTestResult(NamedTuple):
+    rounds: int
+    # ^ The amount of recorded fetches that were replayed.
+    config_runs: int
+    # ^ The amount of times a config went through the whole pipeline.
+    snapshots: int
+    # ^ The amount of progress pictures that were saved.
+    wall_time: float
+    max_lag: float
+    # ^ How far (in seconds) the replay fell behind the sped-up recording.
+
+    @property
+    def snapshots_per_second(self) -> float:
+        return self.snapshots / self.wall_time if self.wall_time > 0 else 0
+
+    @property
+    def configs_per_minute(self) -> float:
+        return (
+            self.config_runs * 60 / self.wall_time if self.wall_time > 0
+            else 0
+        )
+
+
+def make_load_test_config(config_name: str, run_directory: str) -> Config:
+    """
+    Load a config, but save all of its pictures and outputs in a separate
+    directory, so that a load test doesn't mix with the real progress
+    pictures.
+
+    :param config_name: The name of the config to load.
+    :param run_directory: The directory to put the config's data directory
+     in.
+    :return: The redirected config.
+    """
+    config = load_config(config_name)
+    template_path = os.path.join(config.data_directory,
+                                 config.paths.TEMPLATE_NAME)
+    config.data_directory = os.path.join(run_directory, config.name)
+    config.create_directories()
+    shutil.copy(template_path, os.path.join(config.data_directory,
+                                            config.paths.TEMPLATE_NAME))
+    return config
+
+
+def _save_progress_graph(
+        config: Config,
+        profiler: PipelineProfiler | None,
+) -> None:
+    with measure_stage(profiler, config, "graph"):
+        grapher = Grapher()
+        put_progress_data_from_history(config, grapher, False)
+        grapher.make_graph(
+            config,
+            config.paths.PIXEL_PROGRESS_GRAPH_NAME,
+            f"Remaining pixels on '{config.name}'",
+            "",
+        )
+
+
+def run_load_test(
+        configs: list[Config],
+        replayer: TileReplayer,
+        speedup: float = 0,
+        ignore_if_identical: bool = False,
+        graph: bool = False,
+        profiler: PipelineProfiler | None = None,
+) -> LoadTestResult:
+    """
+    Replay recorded chunks through the fetch pipeline of every config, as if
+    they were downloaded at the recorded times. Each config is only run at
+    the times its own chunks were recorded, and its progress pictures are
+    named after those times, so a replay always gives the same history.
+
+    :param configs: The configs to run the pipeline for.
+    :param replayer: The recorded chunks to replay.
+    :param speedup: How much faster than recorded to replay the fetches.
+     0 replays every fetch as soon as the previous one is done.
+    :param ignore_if_identical: Discard progress pictures that are identical
+     to the previous one, like `fetch_latest_picture.py` does.
+    :param graph: Also draw the progress graph after every fetch.
+    :param profiler: An optional profiler to record each stage with.
+    :return: The measured throughput.
+    """
+    config_times = {
+        config.name: set(replayer.get_times(
+            get_grid_coordinates(config.top_left, config.image_size)))
+        for config in configs
+    }
+    config_runs = 0
+    snapshots = 0
+    max_lag = 0.0
+    first_time = replayer.times[0]
+    start = time.perf_counter()
+    for recorded_time in replayer.times:
+        if speedup > 0:
+            scheduled = start + (recorded_time - first_time) / speedup
+            time.sleep(max(scheduled - time.perf_counter(), 0))
+            max_lag = max(max_lag, time.perf_counter() - scheduled)
+        replayer.time = recorded_time
+        for config in configs:
+            if recorded_time not in config_times[config.name]:
+                continue
+            with contextlib.redirect_stdout(io.StringIO()):
+                # ^ Printing every step would be measured too.
+                coords, pictures, _ = asyncio.run(fetch_latest_tiles(
+                    config, profiler=profiler, fetcher=replayer))
+                timestamp = save_fetched_image(
+                    config, coords, pictures, ignore_if_identical,
+                    fetched_at=datetime.fromtimestamp(recorded_time),
+                    subsecond=True, profiler=profiler,
+                )
+                update_outputs(config, timestamp, ignore_if_identical,
+                               profiler, False)
+                if graph:
+                    _save_progress_graph(config, profiler)
+            config_runs += 1
+            if timestamp is not None:
+                snapshots += 1
+    return LoadTestResult(
+        len(replayer.times),
+        config_runs,
+        snapshots,
+        time.perf_counter() - start,
+        max_lag,
+    )
+
+
+def main(
+        config_names: list[str],
+        archive_directory: str,
+        speedup: float,
+        ignore_if_identical: bool,
+        graph: bool,
+        instrument: bool,
+):
+    run_id = time.strftime("%Y-%m-%dT%H%M%S")
+    run_directory = os.path.join(LOAD_TEST_DIRECTORY, run_id)
+    configs = [make_load_test_config(config_name, run_directory)
+               for config_name in config_names]
+    replayer = TileReplayer(archive_directory)
+    profiler = PipelineProfiler(run_id) if instrument else None
+
+    print(f"Replaying {len(replayer.times)} recorded fetch(es) for "
+          f"{len(configs)} config(s)...")
+    result = run_load_test(configs, replayer, speedup, ignore_if_identical,
+                           graph, profiler)
+    print(f"Processed {result.config_runs} config fetch(es) and saved "
+          f"{result.snapshots} progress picture(s) in "
+          f"{result.wall_time:.2f} seconds.")
+    print(f"Snapshots per second: {result.snapshots_per_second:.2f}")
+    print(f"Configs per minute: {result.configs_per_minute:.1f}")
+    if speedup > 0:
+        print(f"Fell behind the {speedup}x replay by at most "
+              f"{result.max_lag:.2f} seconds.")
+    print(f"Saved the load test outputs at `{run_directory}`")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Measure how fast the fetch pipeline runs, by replaying "
+                    "chunks recorded with `fetch_latest_picture.py --record` "
+                    "instead of downloading them."
+    )
+    arg_parser.add_argument(
+        "config",
+        type=str,
+        nargs="+",
+        help="The configs to run the pipeline for. Their outputs are saved "
+             "in the `load_tests` folder, not in their data directories."
+    )
+    arg_parser.add_argument(
+        "--archive", "-a",
+        type=str,
+        required=True,
+        help="The archive directory with the recorded chunks."
+    )
+    arg_parser.add_argument(
+        "--speedup", "-s",
+        type=float,
+        default=0,
+        help="Replay the recorded fetches this many times faster than they "
+             "were recorded. (Default: 0, as fast as possible)"
+    )
+    arg_parser.add_argument(
+        "--ignore_if_identical", "-id",
+        action="store_true",
+        help="Discard progress pictures that are identical to the previous "
+             "one."
+    )
+    arg_parser.add_argument(
+        "--graph", "-g",
+        action="store_true",
+        help="Also draw the progress graph after every fetch."
+    )
+    arg_parser.add_argument(
+        "--instrument", "-i",
+        action="store_true",
+        help="Record the time and memory usage of each pipeline stage to "
+             "`pipeline_stats.jsonl` in the output directory of each config."
+    )
+    args = arg_parser.parse_args()
+
+    main(
+        args.config,
+        args.archive,
+        args.speedup,
+        args.ignore_if_identical,
+        args.graph,
+        args.instrument,
+    )
@@ -0,0 +1,111 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from src.config import load_config, Config
+from src.utils.palette_utils import (
+    OUTPUT_COMPRESS_LEVEL,
+    SNAPSHOT_COMPRESS_LEVEL,
+    image_to_palette,
+    save_palette_image,
+)
+
+
+def convert_picture(path: str, compress_level: int) -> tuple[int, int] | None:
+    """
+    Convert an RGBA picture to a palette picture, in place.
+
+    :param path: The picture to convert.
+    :param compress_level: The zlib compression level to save with.
+    :return: A tuple of the file size before and after converting, or None
+     if the picture already was a palette picture.
+    """
+    with Image.open(path) as img:
+        if img.mode == "P":
+            return None
+        palette = image_to_palette(img)
+
+    old_size = os.path.getsize(path)
+    temporary_path = path + ".tmp"
+    save_palette_image(palette, temporary_path, compress_level)
+    with Image.open(temporary_path) as converted:
+        if not np.array_equal(image_to_palette(converted), palette):
+            os.remove(temporary_path)
+            raise ValueError(f"Converting {path} changed its pixels!")
+    os.replace(temporary_path, path)
+    return old_size, os.path.getsize(path)
+
+
+def _get_convertible_pictures(config: Config) -> list[tuple[str, int]]:
+    pictures = [
+        (os.path.join(config.picture_dir, name), SNAPSHOT_COMPRESS_LEVEL)
+        for name in sorted(os.listdir(config.picture_dir))
+        if name.endswith(".png")
+    ]
+    for name in (
+            config.paths.REMAINING_PIXELS_NAME,
+            config.paths.REMAINING_PLACEABLE_PIXELS_NAME,
+            config.paths.REMAINING_UNPLACEABLE_PIXELS_NAME,
+    ):
+        path = os.path.join(config.output_dir, name)
+        if os.path.exists(path):
+            pictures.append((path, OUTPUT_COMPRESS_LEVEL))
+    return pictures
+
+
+def migrate_pictures(
+        config_names: list[str],
+        max_workers: int | None = None,
+) -> None:
+    pictures: list[tuple[str, int]] = []
+    for config_name in config_names:
+        pictures += _get_convertible_pictures(load_config(config_name))
+
+    converted = 0
+    old_total = 0
+    new_total = 0
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(
+            convert_picture,
+            [path for path, _ in pictures],
+            [compress_level for _, compress_level in pictures],
+            chunksize=16,
+        )
+        for result in results:
+            if result is None:
+                continue
+            converted += 1
+            old_total += result[0]
+            new_total += result[1]
+
+    print(f"Converted {converted} of {len(pictures)} picture(s) to palette "
+          f"pictures.")
+    if converted > 0:
+        print(f"Size: {old_total / 1e6:.1f} MB -> {new_total / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Convert the progress pictures and remainder pictures "
+                    "of configs from RGBA to the smaller palette format."
+    )
+    arg_parser.add_argument(
+        "config",
+        type=str,
+        nargs="+",
+        help="The configs to convert the pictures of."
+    )
+    arg_parser.add_argument(
+        "--workers", "-w",
+        type=int,
+        default=None,
+        help="The maximum amount of processes to use. "
+             "(Default: The amount of CPU cores)"
+    )
+
+    args = arg_parser.parse_args()
+
+    migrate_pictures(args.config, args.workers)
@@ -0,0 +1,57 @@
+import argparse
+import os.path
+import time
+
+from src.config import load_config
+from src.painting_route import get_route_length, save_painting_route
+
+
+def main(config_name: str, charges: int, available_only: bool):
+    config = load_config(config_name)
+    start = time.perf_counter()
+    route = save_painting_route(config, charges, available_only)
+    duration = time.perf_counter() - start
+    if len(route) == 0:
+        print("There are no remaining pixels to place!")
+        return
+    batch_count = -(-len(route) // charges)  # ceil division
+    color_switches = sum(1 for previous, stop in zip(route, route[1:])
+                         if previous.color != stop.color)
+    print(f"Planned a route over {len(route)} pixel(s) in {duration:.2f} "
+          f"seconds: {batch_count} batch(es) of {charges} pixel(s), "
+          f"{color_switches} color switch(es) and "
+          f"{get_route_length(route):.0f} pixels of travel.")
+    route_path = os.path.join(config.output_dir,
+                              config.paths.PAINTING_ROUTE_NAME)
+    print(f"Saved the route at `{route_path}`")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Order the remaining pixels into a short path to paint "
+                    "them in, grouped by color and split into batches."
+    )
+    arg_parser.add_argument(
+        "config",
+        type=str,
+        help="The config to plan the route for."
+    )
+    arg_parser.add_argument(
+        "--charges", "-c",
+        type=int,
+        default=30,
+        help="The amount of pixels in each batch, usually the amount of "
+             "charges you can save up. (Default: 30)"
+    )
+    arg_parser.add_argument(
+        "--available_only", "-a",
+        action="store_true",
+        help="Only include the colors that you can place, as set in the "
+             "config's bought colors."
+    )
+
+    args = arg_parser.parse_args()
+    if args.charges < 1:
+        arg_parser.error("--charges must be at least 1")
+
+    main(args.config, args.charges, args.available_only)
@@ -43,7 +43,7 @@ def create_circle_overlay(
             f"File {remaining_pixel_path} does not exist! "
             "Run `main.py` first to create a progress picture."
         )
-    remaining_pixels = Image.open(remaining_pixel_path)
+    remaining_pixels = Image.open(remaining_pixel_path).convert("RGBA")
     color_mask = Mask.new(remaining_pixels.size)
     for pixel_color in pixel_colors:
         pixel_mask = Mask.from_image_color(remaining_pixels, pixel_color)
@@ -2,13 +2,15 @@ import argparse
 import types
 from io import TextIOWrapper
 
-from src.utils.graphing_utils import Grapher
-from src.utils.image_utils import get_pixel_count
+from src.utils.graph_rendering import GRAPH_RENDERERS, GraphRenderer
+from src.utils.graphing_utils import Grapher, get_time_range_start
 from src.config import load_config, Config
+from src.count_pixels import read_pixel_count_history
+from src.snapshot_history import get_snapshot_names, iterate_snapshots
+from src.template_cache import load_compiled_template
 from src.utils.color_utils import ColorName, PIXEL_COLORS
+from src.utils.palette_utils import count_palette
 from typing import Literal, cast
-from PIL import Image
-import os
 
 
 def parse_file(text: TextIOWrapper) -> dict[ColorName, int]:
@@ -27,16 +29,19 @@ def put_progress_data(
         config: Config,
         grapher: Grapher,
         as_progress: bool,
+        since: float | None = None,
 ) -> None:
-    template = config.get_template_image()
-    template_count = get_pixel_count(template)
+    """
+    Add the pixel counts of each progress picture to the grapher.
 
-    for file in os.listdir(config.picture_dir):
-        filename = os.fsdecode(file)
-        image_path = os.path.join(config.picture_dir, filename)
-        img = Image.open(image_path)
+    :param since: If given, skip progress pictures taken before this unix
+     time without opening them.
+    """
+    template_count = load_compiled_template(config).goal_counts
 
-        color_data = get_pixel_count(img)
+    snapshot_names = get_snapshot_names(config, since)
+    for filename, palette in iterate_snapshots(config, snapshot_names):
+        color_data = count_palette(palette)
         if not as_progress:
             color_data: dict[ColorName, int] = {
                 k: template_count[k] - v
@@ -46,12 +51,46 @@ def put_progress_data(
         grapher.add_data_point_from_filename(filename, color_data)
 
 
+def put_progress_data_from_history(
+        config: Config,
+        grapher: Grapher,
+        as_progress: bool,
+        since: float | None = None,
+) -> None:
+    """
+    Like `put_progress_data`, but read the counts from the pixel count
+    history log instead of decoding every progress picture. Only progress
+    pictures that were counted by `fetch_latest_picture.py` are included.
+    """
+    for record in read_pixel_count_history(config):
+        if since is not None and record["unix_time"] < since:
+            continue
+        if as_progress:
+            color_data = {
+                k: goal - record["remaining"][k]
+                for k, goal in record["goal"].items()
+            }
+        else:
+            color_data = record["remaining"]
+        grapher.add_data_point(record["unix_time"],
+                               {k: float(v) for k, v in color_data.items()})
+
+
 def convert_progress_data_to_percentage(
         config: Config,
         grapher: Grapher,
+        goal_counts: dict[ColorName, int] | None = None,
 ) -> None:
-    template_image = config.get_template_image()
-    pixel_counts: dict[ColorName, int] = get_pixel_count(template_image)
+    """
+    Convert the pixel counts of each color to a percentage of that color's
+    pixels in the template.
+
+    :param goal_counts: The amount of pixels of each color in the template,
+     if the template is already loaded. (Default: load the template)
+    """
+    pixel_counts: dict[ColorName, int] = (
+        load_compiled_template(config).goal_counts if goal_counts is None
+        else goal_counts)
     percentage_data: dict[Literal['time'] | ColorName, list[float]] = {}
     for key in grapher.data:
         if key == "Transparent":
@@ -76,10 +115,16 @@ def save_pixel_progress_graph(
         as_step: bool = False,
         as_progress: bool = False,
         as_percentage: bool = False,
+        from_history: bool = False,
+        renderer: GraphRenderer = "matplotlib",
 ):
     config = load_config(config_name)
     grapher = Grapher()
-    put_progress_data(config, grapher, as_progress)
+    since = get_time_range_start(max_minutes)
+    if from_history:
+        put_progress_data_from_history(config, grapher, as_progress, since)
+    else:
+        put_progress_data(config, grapher, as_progress, since)
 
     if as_percentage:
         convert_progress_data_to_percentage(config, grapher)
@@ -92,7 +137,8 @@ def save_pixel_progress_graph(
         f"{title} on '{config.name}'",
         y_label,
         max_minutes=max_minutes,
-        as_step=as_step
+        as_step=as_step,
+        renderer=renderer,
     )
 
 
@@ -131,6 +177,22 @@ if __name__ == "__main__":
         help="Display each plot as a percentage of the placed pixels from the "
              "total pixels from the template image."
     )
+    arg_parser.add_argument(
+        "--from_history", "-f",
+        action="store_true",
+        help="Read the pixel counts from the history log that "
+             "fetch_latest_picture.py writes, instead of counting every "
+             "progress picture again. This is a lot faster."
+    )
+    arg_parser.add_argument(
+        "--renderer",
+        type=str,
+        choices=GRAPH_RENDERERS,
+        default="matplotlib",
+        help="What to draw the graph with. \"pil\" (PNG) and \"svg\" are "
+             "a lot faster, since they don't load matplotlib. "
+             "(Default: matplotlib)"
+    )
     args = arg_parser.parse_args()
 
     save_pixel_progress_graph(
@@ -139,4 +201,6 @@ if __name__ == "__main__":
         args.as_step,
         args.as_progress,
         args.as_percentage,
+        args.from_history,
+        args.renderer,
     )
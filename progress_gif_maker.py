@@ -3,12 +3,18 @@ import os
 
 from PIL import Image
 from src.config import Config, load_config
+from src.snapshot_history import iterate_snapshots
 from src.utils.graphing_utils import parse_filename_unix_time
 
 
+def _load_image(config: Config, filename: str) -> Image.Image:
+    with Image.open(os.path.join(config.picture_dir, filename)) as image:
+        return image.convert("RGBA")
+
+
 def get_progress_images(
         config: Config
-) -> tuple[int, list[Image.Image], list[int]]:
+) -> tuple[float, list[Image.Image], list[float]]:
     """
     Get all the progress images and the timings between each image.
 
@@ -19,23 +25,21 @@ def get_progress_images(
     """
     # Get images and their timestamps
     images: list[Image.Image] = []
-    timestamps: list[int] = []
-    for filename in os.listdir(config.picture_dir):
-        image_path = os.path.join(config.picture_dir, filename)
-        image = Image.open(image_path)
+    timestamps: list[float] = []
+    for filename, image in iterate_snapshots(config, loader=_load_image):
         images.append(image)
         timestamps.append(
             parse_filename_unix_time(filename)
         )
 
     # Calculate distance between each image
-    distances: list[int] = []
+    distances: list[float] = []
     for i in range(len(timestamps) - 1):
         # This list would be 1 shorter than the list of images.
         distances.append(timestamps[i + 1] - timestamps[i])
     # Add the last image's duration to the list, as average of all previous.
     average_duration = sum(distances) / len(distances)
-    distances.append(int(average_duration * 2))  # average * 2 to signify end.
+    distances.append(average_duration * 2)  # average * 2 to signify end.
 
     total_time = timestamps[-1] - timestamps[0]
     return total_time, images, distances
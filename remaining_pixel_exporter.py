@@ -0,0 +1,55 @@
+import argparse
+import time
+import typing
+
+from src.config import load_config
+from src.remaining_pixel_export import (
+    ExportFormat,
+    get_remaining_pixel_list_path,
+    save_remaining_pixel_list,
+)
+
+
+def main(config_name: str, export_format: ExportFormat, available_only: bool):
+    config = load_config(config_name)
+    start = time.perf_counter()
+    pixel_counts = save_remaining_pixel_list(config, export_format,
+                                             available_only)
+    duration = time.perf_counter() - start
+    if len(pixel_counts) == 0:
+        print("There are no remaining pixels to place!")
+    for color, count in sorted(pixel_counts.items(), key=lambda i: -i[1]):
+        print(f"{color}: {count}")
+    print(f"Exported {sum(pixel_counts.values())} pixel(s) in "
+          f"{duration:.3f} seconds to "
+          f"`{get_remaining_pixel_list_path(config, export_format)}`")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Save the wplace coordinates of all remaining pixels, "
+                    "grouped by color."
+    )
+    arg_parser.add_argument(
+        "config",
+        type=str,
+        help="The config to export the remaining pixels of."
+    )
+    arg_parser.add_argument(
+        "--format", "-f",
+        type=str,
+        choices=typing.get_args(ExportFormat.__value__),
+        default="json",
+        help="\"json\" saves a list of each coordinate part per color, "
+             "\"csv\" saves one row per pixel. (Default: json)"
+    )
+    arg_parser.add_argument(
+        "--available_only", "-a",
+        action="store_true",
+        help="Only include the colors that you can place, as set in the "
+             "config's bought colors."
+    )
+
+    args = arg_parser.parse_args()
+
+    main(args.config, args.format, args.available_only)
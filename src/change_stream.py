@@ -0,0 +1,187 @@
+import http.client
+import json
+import os.path
+import socket
+import urllib.parse
+import urllib.request
+from datetime import datetime
+from typing import TypedDict
+
+import numpy as np
+
+from src.config import Config
+from src.template_cache import CompiledTemplate, load_compiled_template
+from src.utils.coord_utils import offset_coordinates
+
+__all__ = [
+    "ChangeRecord",
+    "get_change_record",
+    "ChangeLog",
+    "read_change_log",
+]
+
+
+PUSH_TIMEOUT = 5
+# ^ Seconds to wait for a socket or webhook before giving up on it.
+
+
+class ChangeRecord(TypedDict):
+    snapshot: str
+    # ^ The file name of the progress picture with the changes.
+    previous_snapshot: str
+    unix_time: float
+    change_count: int
+    # The following lists have one entry per changed pixel.
+    tl_x: list[int]
+    tl_y: list[int]
+    px_x: list[int]
+    px_y: list[int]
+    old: list[int]
+    new: list[int]
+    # ^ Palette indices: the index in `PALETTE`, where 0 is transparent.
+    direction: list[int]
+    # ^ 1 if the pixel now matches the template and didn't before, -1 if it
+    #  matched the template before but doesn't anymore, and 0 otherwise.
+
+
+def get_change_record(
+        config: Config,
+        template: CompiledTemplate,
+        previous: np.ndarray,
+        current: np.ndarray,
+) -> dict:
+    """
+    Find every pixel that changed between two progress pictures.
+
+    :param config: The config the progress pictures belong to, to convert
+     positions to wplace coordinates.
+    :param template: The compiled template, to tell if changes are towards
+     or away from it.
+    :param previous: The palette indices of the earlier progress picture.
+    :param current: The palette indices of the later progress picture.
+    :return: The columns of a `ChangeRecord` that describe the changes.
+    """
+    changed = np.flatnonzero(previous != current)
+    # ^ Only look at changed pixels from here, so the rest is O(changes).
+    ys, xs = np.divmod(changed, current.shape[1])
+    old = previous.ravel()[changed]
+    new = current.ravel()[changed]
+    goal = template.palette.ravel()[changed]
+    opaque = template.opacity_mask.ravel()[changed]
+    was_correct = (old == goal) & opaque
+    is_correct = (new == goal) & opaque
+    coords = offset_coordinates(config.top_left, xs, ys)
+    return {
+        "change_count": len(changed),
+        "tl_x": coords.TlX.tolist(),
+        "tl_y": coords.TlY.tolist(),
+        "px_x": coords.PxX.tolist(),
+        "px_y": coords.PxY.tolist(),
+        "old": old.tolist(),
+        "new": new.tolist(),
+        "direction": (is_correct.astype(np.int8)
+                      - was_correct.astype(np.int8)).tolist(),
+    }
+
+
+class ChangeLog:
+    """
+    Appends a `ChangeRecord` to the output directory of a config for every
+    saved progress picture, and optionally pushes it to a Unix socket or a
+    webhook, so other tools don't need to compare progress pictures
+    themselves.
+    """
+    def __init__(
+            self,
+            socket_path: str | None = None,
+            webhook_url: str | None = None,
+    ) -> None:
+        """
+        :param socket_path: A Unix socket to send each record to, as one
+         JSON line.
+        :param webhook_url: A URL to POST each record to, as JSON.
+        :raise ValueError: If **webhook_url** isn't an HTTP(S) URL.
+        """
+        if webhook_url is not None:
+            url = urllib.parse.urlsplit(webhook_url)
+            if url.scheme not in ("http", "https") or not url.hostname:
+                raise ValueError(f"`{webhook_url}` is not an http:// or "
+                                 f"https:// URL!")
+            _ = url.port
+            # ^ Raises a ValueError if the port isn't a valid number.
+        self.socket_path = socket_path
+        self.webhook_url = webhook_url
+
+    def emit(
+            self,
+            config: Config,
+            previous_name: str,
+            previous: np.ndarray,
+            snapshot_name: str,
+            current: np.ndarray,
+            fetched_at: datetime,
+    ) -> int:
+        """
+        Record the changes between a new progress picture and the one
+        before it.
+
+        :return: The amount of changed pixels.
+        """
+        record: ChangeRecord = {
+            "snapshot": snapshot_name,
+            "previous_snapshot": previous_name,
+            "unix_time": fetched_at.timestamp(),
+            **get_change_record(config, load_compiled_template(config),
+                                previous, current),
+        }
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        path = os.path.join(config.output_dir, config.paths.CHANGE_LOG_NAME)
+        with open(path, "a") as f:
+            f.write(line)
+        self._push(line)
+        return record["change_count"]
+
+    def _push(self, line: str) -> None:
+        data = line.encode()
+        # A consumer that isn't running shouldn't stop the fetch, so
+        #  failures are only printed.
+        if self.socket_path is not None:
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                    s.settimeout(PUSH_TIMEOUT)
+                    s.connect(self.socket_path)
+                    s.sendall(data)
+            except OSError as e:
+                print(f"Could not send the changes to "
+                      f"`{self.socket_path}`: {e}")
+        if self.webhook_url is not None:
+            request = urllib.request.Request(
+                self.webhook_url,
+                data=data,
+                headers={"Content-Type": "application/json"},
+                method="POST",
+            )
+            try:
+                with urllib.request.urlopen(request, timeout=PUSH_TIMEOUT):
+                    pass
+            except (OSError, ValueError, http.client.HTTPException) as e:
+                # ^ A malformed response is an `HTTPException`.
+                print(f"Could not send the changes to "
+                      f"`{self.webhook_url}`: {e}")
+
+
+def read_change_log(config: Config) -> list[ChangeRecord]:
+    """
+    Read all change records of a config, oldest first. A partially
+    written last line is skipped.
+    """
+    path = os.path.join(config.output_dir, config.paths.CHANGE_LOG_NAME)
+    if not os.path.exists(path):
+        return []
+    records = []
+    with open(path, "r") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break  # unfinished last line
+            records.append(json.loads(line))
+    return records
@@ -14,7 +14,7 @@ from src.utils.coord_utils import (
     WplaceCoordinate,
     get_bottom_right_corner,
 )
-from typing import TypedDict
+from typing import NotRequired, TypedDict
 
 __all__ = [
     "Config",
@@ -23,6 +23,8 @@ __all__ = [
 
 
 CONFIG_DIRECTORY = "configs"
+DEFAULT_HEATMAP_CELL_SIZE = 50
+DEFAULT_TEMPLATE_ALPHA_THRESHOLD = 128
 
 TopLeftCorner = TypedDict(
     "TopLeftCorner",
@@ -55,6 +57,9 @@ class ConfigFile(TypedDict):
     data_directory: str
     subdirectories: Subdirectories
     bought_colors: list[str]
+    heatmap_cell_size: NotRequired[int]
+    template_alpha_threshold: NotRequired[int]
+    perceptual_color_matching: NotRequired[bool]
 
 
 def _validate_colors(color_names: list[str]) -> list[ColorName]:
@@ -72,16 +77,37 @@ def _validate_colors(color_names: list[str]) -> list[ColorName]:
 
 class FileNames:
     TEMPLATE_NAME = "template.png"
+    TEMPLATE_CACHE_NAME = "template_cache.npz"
+    SNAPSHOT_CUBE_NAME = "snapshot_cube.bin"
+    SNAPSHOT_CUBE_INDEX_NAME = "snapshot_cube.json"
+    OVERWRITE_STATE_NAME = "overwrite_state.npz"
     GRAPH_NAME = "graph.png"
     REMAINING_PIXELS_NAME = "remaining_pixels.png"
     REMAINING_PLACEABLE_PIXELS_NAME = "remaining_pixels_placeable.png"
     REMAINING_UNPLACEABLE_PIXELS_NAME = "remaining_pixels_unplaceable.png"
     CIRCLE_OVERLAY_NAME = "pixel_finder.png"
     REMAINING_PIXEL_COUNT_NAME = "remaining_pixels.txt"
+    PIXEL_COUNT_HISTORY_NAME = "remaining_pixels_history.jsonl"
     PROGRESS_GIF_NAME = "progress.gif"
     AVERAGE_PIXEL_PLACEMENT_GRAPH_NAME = "average_placement_graph.png"
     PIXEL_PROGRESS_GRAPH_NAME = "progress_graph.png"
+    PIXEL_PROGRESS_PERCENTAGE_GRAPH_NAME = "progress_percentage_graph.png"
     MISPLACEMENT_GRAPH_NAME = "misplacement_graph.png"
+    MISPLACEMENT_PERCENTAGE_GRAPH_NAME = "misplacement_percentage_graph.png"
+    PIPELINE_STATS_NAME = "pipeline_stats.jsonl"
+    OVERWRITE_HEATMAP_NAME = "overwrite_heatmap.png"
+    REPAIR_TIME_HEATMAP_NAME = "repair_time_heatmap.png"
+    OVERWRITE_STATS_NAME = "overwrite_stats.json"
+    REGIONAL_PROGRESS_NAME = "regional_progress.png"
+    REGIONAL_PROGRESS_DATA_NAME = "regional_progress.json"
+    SNAPPED_TEMPLATE_NAME = "template_snapped.png"
+    TILE_PYRAMID_DIRECTORY = "pyramid"
+    PAINTING_ROUTE_NAME = "painting_route.json"
+    WORK_ZONE_DIRECTORY = "zones"
+    CHANGE_LOG_NAME = "pixel_changes.jsonl"
+    LATEST_SNAPSHOT_HASH_NAME = "latest_snapshot_hash.json"
+    REMAINING_PIXEL_LIST_NAME = "remaining_pixel_list.json"
+    REMAINING_PIXEL_CSV_NAME = "remaining_pixel_list.csv"
 
 
 class Config:
@@ -92,6 +118,9 @@ class Config:
     data_directory: str
     subdirectories: Subdirectories
     bought_colors: list[ColorName]
+    heatmap_cell_size: int
+    template_alpha_threshold: int
+    perceptual_color_matching: bool
 
     def __init__(self, name: str, config_data: ConfigFile) -> None:
         self.name = name
@@ -114,6 +143,17 @@ class Config:
             if subdirectory not in self.subdirectories:
                 raise KeyError(subdirectory)
         self.bought_colors = _validate_colors(config_data["bought_colors"])
+        self.heatmap_cell_size = config_data.get("heatmap_cell_size",
+                                                 DEFAULT_HEATMAP_CELL_SIZE)
+        if self.heatmap_cell_size < 1:
+            raise ValueError("Heatmap cell size must be greater than 0!")
+        self.template_alpha_threshold = config_data.get(
+            "template_alpha_threshold", DEFAULT_TEMPLATE_ALPHA_THRESHOLD)
+        if not 1 <= self.template_alpha_threshold <= 255:
+            raise ValueError("Template alpha threshold must be between 1 "
+                             "and 255!")
+        self.perceptual_color_matching = config_data.get(
+            "perceptual_color_matching", False)
 
         self.create_directories()
 
@@ -0,0 +1,159 @@
+import json
+import os.path
+from datetime import datetime
+from typing import TypedDict
+
+import numpy as np
+
+from src.config import CONFIG_DIRECTORY, load_config, Config
+from src.latest_image_loader import (
+    TileFetcher,
+    crop_image,
+    fetch_pictures,
+    get_grid_coordinates,
+    stitch_pictures,
+)
+from src.utils.coord_utils import (
+    WplaceCoordinate,
+    get_bottom_right_corner,
+)
+from src.utils.palette_utils import image_to_palette
+
+__all__ = [
+    "ConfigGroupFile",
+    "ConfigGroup",
+    "is_config_group",
+    "load_config_group",
+    "fetch_group_tiles",
+    "get_group_canvas",
+]
+
+
+class ConfigGroupFile(TypedDict):
+    members: list[str]
+    # ^ The names of the configs in the group.
+
+
+def _get_absolute_position(coord: WplaceCoordinate) -> tuple[int, int]:
+    return coord.TlX * 1000 + coord.PxX, coord.TlY * 1000 + coord.PxY
+
+
+class ConfigGroup:
+    """
+    A set of configs whose areas are downloaded together. The group covers
+    the smallest area that contains every member, so artworks in the same
+    chunks only have their chunks downloaded and decoded once.
+    """
+    name: str
+    members: list[Config]
+    top_left: WplaceCoordinate
+    image_size: tuple[int, int]
+
+    def __init__(self, name: str, members: list[Config]) -> None:
+        if len(members) == 0:
+            raise ValueError("A config group needs at least one member!")
+        self.name = name
+        self.members = members
+
+        lefts, tops = zip(*(_get_absolute_position(member.top_left)
+                            for member in members))
+        rights = [left + member.image_size[0]
+                  for left, member in zip(lefts, members)]
+        bottoms = [top + member.image_size[1]
+                   for top, member in zip(tops, members)]
+        self._position = (min(lefts), min(tops))
+        self.top_left = WplaceCoordinate(
+            self._position[0] // 1000, self._position[1] // 1000,
+            self._position[0] % 1000, self._position[1] % 1000,
+        )
+        self.image_size = (max(rights) - self._position[0],
+                           max(bottoms) - self._position[1])
+
+    @property
+    def bottom_right(self) -> WplaceCoordinate:
+        return get_bottom_right_corner(self.top_left, self.image_size)
+
+    def get_member_offset(self, member: Config) -> tuple[int, int]:
+        """
+        :return: The x and y position of a member's top left corner within
+         the group's area.
+        """
+        x, y = _get_absolute_position(member.top_left)
+        return x - self._position[0], y - self._position[1]
+
+    def get_member_snapshot(
+            self,
+            canvas: np.ndarray,
+            member: Config,
+    ) -> np.ndarray:
+        """
+        Cut a member's area out of the group's canvas. This is a view, so it
+        doesn't copy any pixels.
+
+        :param canvas: The palette indices of the group's area.
+        :param member: The member to get the area of.
+        :return: The palette indices of the member's area.
+        """
+        x, y = self.get_member_offset(member)
+        width, height = member.image_size
+        return canvas[y:y + height, x:x + width]
+
+
+def is_config_group(name: str) -> bool:
+    """
+    :return: True if the config file with this name is a config group.
+    """
+    path = os.path.join(CONFIG_DIRECTORY, f"{name}.json")
+    if not os.path.exists(path):
+        return False
+    with open(path, "r") as f:
+        return "members" in json.load(f)
+
+
+def load_config_group(name: str) -> ConfigGroup:
+    path = os.path.join(CONFIG_DIRECTORY, f"{name}.json")
+    with open(path, "r") as f:
+        group_data: ConfigGroupFile = json.load(f)
+    return ConfigGroup(
+        name,
+        [load_config(member_name) for member_name in group_data["members"]],
+    )
+
+
+async def fetch_group_tiles(
+        group: ConfigGroup,
+        *,
+        fetcher: TileFetcher | None = None,
+) -> tuple[list[tuple[int, int]], list[bytes], datetime]:
+    """
+    Fetch the chunk images that a group's area intersects.
+
+    :param group: The group for which to fetch the chunks.
+    :param fetcher: The function to get the chunk images with.
+     (Default: `fetch_pictures`)
+    :return: A tuple of the chunk coordinates, the image byte strings
+     belonging to each coordinate, and the time the chunks were received.
+    """
+    if fetcher is None:
+        fetcher = fetch_pictures
+    coords = get_grid_coordinates(group.top_left, group.image_size)
+    pictures = await fetcher(coords)
+    return coords, pictures, datetime.now()
+
+
+def get_group_canvas(
+        group: ConfigGroup,
+        coords: list[tuple[int, int]],
+        pictures: list[bytes],
+) -> np.ndarray:
+    """
+    Stitch and crop the chunks of a group's area, and convert it to palette
+    indices once for all members.
+
+    :return: The palette indices of the group's area.
+    """
+    return image_to_palette(crop_image(
+        stitch_pictures(coords, pictures),
+        group.top_left,
+        group.bottom_right,
+    ))
@@ -1,10 +1,27 @@
 import argparse
+import json
 import os.path
+import typing
+from typing import TypedDict
+
+import numpy as np
 from PIL import Image
 
 from src.config import load_config, Config
+from src.template_cache import load_compiled_template
 from src.utils.color_utils import ColorName
-from src.utils.image_utils import get_pixel_count
+from src.utils.graphing_utils import parse_filename_unix_time
+from src.utils.palette_utils import count_palette, image_to_palette
+from src.utils.profiling_utils import PipelineProfiler, measure_stage
+
+
+class PixelCountRecord(TypedDict):
+    snapshot: str
+    # ^ The file name of the progress picture that was counted.
+    unix_time: float
+    remaining: dict[ColorName, int]
+    goal: dict[ColorName, int]
+    placeable: dict[ColorName, bool]
 
 
 def _save_pixel_count_data(
@@ -81,15 +98,123 @@ def _save_pixel_count_data(
             )
 
 
-def save_pixel_count(config: Config):
-    image_path = os.path.join(config.output_dir,
-                              config.paths.REMAINING_PIXELS_NAME)
-    template = config.get_template_image()
-    img = Image.open(image_path)
+def _append_pixel_count_record(
+        config: Config,
+        snapshot_name: str,
+        remainder_data: dict[ColorName, int],
+        template_data: dict[ColorName, int],
+) -> None:
+    """
+    Append the pixel counts of a progress picture to the history log.
+    """
+    colors = [key for key, count in template_data.items() if count > 0]
+    record: PixelCountRecord = {
+        "snapshot": snapshot_name,
+        "unix_time": parse_filename_unix_time(snapshot_name),
+        "remaining": {key: remainder_data.get(key, 0) for key in colors},
+        "goal": {key: template_data[key] for key in colors},
+        "placeable": {key: key in config.available_colors for key in colors},
+    }
+    line = (json.dumps(record) + "\n").encode()
+    path = os.path.join(config.output_dir,
+                        config.paths.PIXEL_COUNT_HISTORY_NAME)
+    # Write the whole line with one `write` call in append mode, so that
+    #  concurrent writers can't interleave, and readers see either nothing
+    #  or a line that is only missing its end (which they skip).
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        written = os.write(fd, line)
+        assert written == len(line), "Partial write to the history log!"
+    finally:
+        os.close(fd)
+
+
+def read_pixel_count_history(
+        config: Config,
+) -> typing.Iterator[PixelCountRecord]:
+    """
+    Read the pixel counts of every counted progress picture, in the order
+    they were counted. A line that is still being written is skipped.
+
+    :param config: The config to read the history of.
+    :return: An iterator of pixel count records.
+    """
+    path = os.path.join(config.output_dir,
+                        config.paths.PIXEL_COUNT_HISTORY_NAME)
+    if not os.path.exists(path):
+        return
+    with open(path, "r") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            yield json.loads(line)
 
-    remaining_pixel_count = get_pixel_count(img)
-    goal_pixel_count = get_pixel_count(template)
+
+def save_remaining_counts(
+        config: Config,
+        remaining_pixel_count: dict[ColorName, int],
+        snapshot_name: str | None = None,
+) -> None:
+    """
+    Save already-counted remaining pixels to `remaining_pixels.txt`, and
+    optionally to the pixel count history log.
+
+    :param config: The config to save the counts of.
+    :param remaining_pixel_count: The amount of remaining pixels per color.
+    :param snapshot_name: The file name of the progress picture that was
+     counted, to add a record to the history log.
+    """
+    goal_pixel_count = load_compiled_template(config).goal_counts
     _save_pixel_count_data(config, remaining_pixel_count, goal_pixel_count)
+    if snapshot_name is not None:
+        _append_pixel_count_record(config, snapshot_name,
+                                   remaining_pixel_count, goal_pixel_count)
+
+
+def save_remainder_count(
+        config: Config,
+        remainder: np.ndarray,
+        snapshot_name: str | None = None,
+        *,
+        profiler: PipelineProfiler | None = None,
+):
+    """
+    Like `save_pixel_count`, but count an array of remaining palette
+    indices instead of loading `remaining_pixels.png`.
+
+    :param config: The config to count the remaining pixels of.
+    :param remainder: The palette indices of the remaining pixels.
+    :param snapshot_name: The file name of the progress picture that the
+     remainder was made from. If given, the counts are also appended to the
+     pixel count history log.
+    :param profiler: An optional profiler to record the stage with.
+    """
+    with measure_stage(profiler, config, "count") as counters:
+        save_remaining_counts(config, count_palette(remainder), snapshot_name)
+        counters.pixels_processed = remainder.size
+
+
+def save_pixel_count(
+        config: Config,
+        snapshot_name: str | None = None,
+        *,
+        profiler: PipelineProfiler | None = None,
+):
+    """
+    Count the remaining pixels per color and save them to
+    `remaining_pixels.txt`.
+
+    :param config: The config to count the remaining pixels of.
+    :param snapshot_name: The file name of the progress picture that the
+     remainder pictures were made from. If given, the counts are also
+     appended to the pixel count history log.
+    :param profiler: An optional profiler to record the stage with.
+    """
+    image_path = os.path.join(config.output_dir,
+                              config.paths.REMAINING_PIXELS_NAME)
+    with Image.open(image_path) as img:
+        remainder = image_to_palette(img)
+    save_remainder_count(config, remainder, snapshot_name, profiler=profiler)
 
 
 if __name__ == "__main__":
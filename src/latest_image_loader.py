@@ -1,22 +1,39 @@
 import argparse
 import asyncio
 import aiohttp
+import hashlib
+import json
+import numpy as np
 import os
-from datetime import datetime
+import tempfile
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta
 from io import BytesIO
 from math import ceil
 from PIL import Image
 
+from src.change_stream import ChangeLog
 from src.config import load_config, Config
-from src.utils.coord_utils import WplaceCoordinate
-from src.utils.image_utils import are_images_identical
-
-TIMESTAMP = datetime.now().strftime("%Y-%m-%dT%H%M%S")
-FILE_NAME = f"{TIMESTAMP}.png"
+from src.snapshot_history import format_snapshot_timestamp
+from src.utils.coord_utils import (
+    WplaceCoordinate,
+    WplaceCoordinates,
+    get_canvas_positions,
+)
+from src.utils.palette_utils import (
+    SNAPSHOT_COMPRESS_LEVEL,
+    image_to_palette,
+    save_palette_image,
+)
+from src.utils.profiling_utils import PipelineProfiler, measure_stage
 
 CHUNK_SIZES = (1000, 1000)
 API_FORMAT = "https://backend.wplace.live/files/s0/tiles/{}/{}.png"
 
+type TileFetcher = Callable[[list[tuple[int, int]]], Awaitable[list[bytes]]]
+# ^ Anything that gets chunk images like `fetch_pictures` does, such as a
+#  recorder or replayer from `src.tile_archive`.
+
 
 def get_grid_coordinates(
         top_left: WplaceCoordinate,
@@ -125,24 +142,6 @@ def stitch_pictures(
     return canvas
 
 
-def get_canvas_position(
-        coord: WplaceCoordinate,
-        *,
-        top_left: WplaceCoordinate
-) -> tuple[int, int]:
-    """
-    Helper to convert a wplace coordinate to a relative canvas position.
-    :param coord: The wplace coordinate to convert to a canvas position.
-    :param top_left: The top left corner of the wplace image.
-    :return: A relative canvas position.
-    """
-    chunk_x = coord.TlX - top_left.TlX
-    chunk_y = coord.TlY - top_left.TlY
-    x = chunk_x * 1000 + coord.PxX
-    y = chunk_y * 1000 + coord.PxY
-    return x, y
-
-
 def crop_image(
         image: Image.Image,
         top_left: WplaceCoordinate,
@@ -156,62 +155,302 @@ def crop_image(
     :param bottom_right: The bottom right corner of the wplace image.
     :return: The cropped image.
     """
-    # The top left corner is always in 0, 0:
-    # At any point, the top left corner will be in the relative top left chunk.
-    # To get the canvas position, the inner chunk coordinates are subtracted,
-    #  and for top left, that means
-    x1, y1 = get_canvas_position(top_left, top_left=top_left)
-    x2, y2 = get_canvas_position(bottom_right, top_left=top_left)
+    # The stitched image starts at the top left corner of the top left chunk,
+    #  so both corners are converted relative to that.
+    chunk_origin = WplaceCoordinate(top_left.TlX, top_left.TlY, 0, 0)
+    xs, ys = get_canvas_positions(
+        WplaceCoordinates(*np.array([top_left, bottom_right]).T),
+        top_left=chunk_origin,
+    )
     return image.crop((
-        x1,
-        y1,
-        x2 + 1,  # cropping is inclusive
-        y2 + 1,
+        int(xs[0]),
+        int(ys[0]),
+        int(xs[1]) + 1,  # cropping is inclusive
+        int(ys[1]) + 1,
     ))
 
 
-def get_latest_progress_picture(config: Config):
+def get_latest_progress_picture_name(config: Config) -> str | None:
     pictures = os.listdir(config.picture_dir)
     if len(pictures) == 0:
         return None
-    image_name = sorted(pictures)[-1]  # latest timestamp
+    return sorted(pictures)[-1]  # latest timestamp
+
+
+def get_latest_progress_picture(config: Config):
+    image_name = get_latest_progress_picture_name(config)
+    if image_name is None:
+        return None
     image_path = os.path.join(config.picture_dir, image_name)
     return Image.open(image_path)
 
 
-def save_latest_image(
+async def fetch_latest_tiles(
+        config: Config,
+        *,
+        profiler: PipelineProfiler | None = None,
+        fetcher: TileFetcher | None = None,
+) -> tuple[list[tuple[int, int]], list[bytes], datetime]:
+    """
+    Fetch the chunk images that a config's canvas intersects.
+
+    :param config: The config for which to fetch the chunks.
+    :param profiler: An optional profiler to record the fetch with.
+    :param fetcher: The function to get the chunk images with.
+     (Default: `fetch_pictures`)
+    :return: A tuple of the chunk coordinates, the image byte strings
+     belonging to each coordinate, and the time the chunks were received.
+    """
+    if fetcher is None:
+        fetcher = fetch_pictures
+    coords = get_grid_coordinates(config.top_left, config.image_size)
+    with measure_stage(profiler, config, "fetch") as counters:
+        pictures = await fetcher(coords)
+        counters.tiles_fetched = len(pictures)
+        counters.bytes_downloaded = sum(len(i) for i in pictures)
+    return coords, pictures, datetime.now()
+
+
+def publish_snapshot_file(
+        config: Config,
+        temporary_path: str,
+        fetched_at: datetime,
+        subsecond: bool,
+) -> str:
+    """
+    Move a completely written progress picture into the picture directory,
+    so that other processes never see a partially written picture.
+
+    The picture is hard linked to its name, which fails if the name already
+    exists, so pictures fetched in the same second (by this or another
+    process) never overwrite each other: the name gets microseconds
+    instead, and is moved forward until it's unused.
+
+    :param config: The config to add the progress picture to.
+    :param temporary_path: The written picture, on the same file system as
+     the picture directory. It is removed afterwards.
+    :param fetched_at: When the chunks were received, to name the picture
+     after.
+    :param subsecond: Whether to include microseconds in the name.
+    :return: The timestamp of the picture.
+    """
+    while True:
+        timestamp = format_snapshot_timestamp(fetched_at, subsecond)
+        path = os.path.join(config.picture_dir, f"{timestamp}.png")
+        try:
+            os.link(temporary_path, path)
+        except FileExistsError:
+            if subsecond:
+                fetched_at += timedelta(microseconds=1)
+            subsecond = True
+            continue
+        os.remove(temporary_path)
+        return timestamp
+
+
+def new_snapshot_hasher(shape: tuple[int, int]):
+    """
+    Start a hash of the palette indices of a progress picture, which can be
+    fed the rows of the picture in order, like the strips of
+    `save_latest_image_in_strips`.
+
+    :param shape: The height and width of the progress picture.
+    :return: A SHA-256 hash object, with the shape already added.
+    """
+    return hashlib.sha256(f"{shape[0]}x{shape[1]}\n".encode())
+
+
+def save_latest_snapshot_hash(
+        config: Config,
+        snapshot_name: str,
+        digest: str,
+) -> None:
+    """
+    Remember the hash of the latest progress picture, so it can be compared
+    to a new canvas without decoding it.
+
+    :param config: The config the progress picture belongs to.
+    :param snapshot_name: The file name of the progress picture.
+    :param digest: The hex digest of a `new_snapshot_hasher` hash of it.
+    """
+    path = os.path.join(config.output_dir,
+                        config.paths.LATEST_SNAPSHOT_HASH_NAME)
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w") as f:
+        json.dump({"snapshot": snapshot_name, "sha256": digest}, f)
+    os.replace(temporary_path, path)
+
+
+def load_latest_snapshot_hash(config: Config) -> str | None:
+    """
+    :return: The hash saved with `save_latest_snapshot_hash`, or None if
+     there is none or it doesn't belong to the latest progress picture
+     (e.g. because the picture was saved by an older version).
+    """
+    path = os.path.join(config.output_dir,
+                        config.paths.LATEST_SNAPSHOT_HASH_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        saved = json.load(f)
+    if saved["snapshot"] != get_latest_progress_picture_name(config):
+        return None
+    return saved["sha256"]
+
+
+def save_fetched_image(
         config: Config,
+        coords: list[tuple[int, int]],
+        pictures: list[bytes],
         ignore_if_identical: bool,
+        *,
+        fetched_at: datetime | None = None,
+        subsecond: bool = False,
+        profiler: PipelineProfiler | None = None,
+        change_log: ChangeLog | None = None,
 ) -> str | None:
     """
-    Fetch and save the most recent wplace canvas image.
+    Stitch, crop and save already-fetched chunk images.
 
-    :param config: The config for which to get the canvas.
-    :param ignore_if_identical: Don't create a file if the downloaded image is
+    :param config: The config for which the chunks were fetched.
+    :param coords: The coordinates of each chunk.
+    :param pictures: The byte strings containing each chunk's image data.
+    :param ignore_if_identical: Don't create a file if the stitched image is
      identical to the most recent saved one.
-    :return: The timestamp of the saved image (the current time), or None if
+    :param fetched_at: When the chunks were received, to name the saved
+     image after. (Default: now)
+    :param subsecond: Whether to include microseconds in the name of the
+     saved image, to save more than one image per second.
+    :param profiler: An optional profiler to record each stage with.
+    :param change_log: If given, record the pixels that changed since the
+     previous progress picture in it.
+    :return: The timestamp of the saved image, or None if
      **ignore-if_identical** is True and the canvas hasn't changed.
     """
-    coords = get_grid_coordinates(config.top_left, config.image_size)
+    with measure_stage(profiler, config, "stitch") as counters:
+        chunk_picture = stitch_pictures(coords, pictures)
+        counters.pixels_processed = chunk_picture.width * chunk_picture.height
+    with measure_stage(profiler, config, "crop") as counters:
+        image = image_to_palette(crop_image(chunk_picture, config.top_left,
+                                            config.bottom_right))
+        counters.pixels_processed = image.size
+
+    return save_snapshot_palette(config, image, ignore_if_identical,
+                                 fetched_at=fetched_at, subsecond=subsecond,
+                                 profiler=profiler, change_log=change_log)
+
+
+def save_snapshot_palette(
+        config: Config,
+        image: np.ndarray,
+        ignore_if_identical: bool,
+        *,
+        fetched_at: datetime | None = None,
+        subsecond: bool = False,
+        profiler: PipelineProfiler | None = None,
+        change_log: ChangeLog | None = None,
+) -> str | None:
+    """
+    Save an already-cropped canvas as a progress picture.
 
-    # Get image
-    pictures = asyncio.run(fetch_pictures(coords))
-    chunk_picture = stitch_pictures(coords, pictures)
-    image = crop_image(chunk_picture, config.top_left, config.bottom_right)
-
-    # Compare image
-    if ignore_if_identical:
-        latest_image = get_latest_progress_picture(config)
-        if (
-                latest_image is not None
-                and are_images_identical(image, latest_image)
-        ):
+    :param config: The config to save the progress picture for.
+    :param image: The palette indices of the canvas.
+    :param ignore_if_identical: Don't create a file if the canvas is
+     identical to the most recent saved one.
+    :param fetched_at: When the chunks were received, to name the saved
+     image after. (Default: now)
+    :param subsecond: Whether to include microseconds in the name of the
+     saved image, to save more than one image per second.
+    :param profiler: An optional profiler to record each stage with.
+    :param change_log: If given, record the pixels that changed since the
+     previous progress picture in it.
+    :return: The timestamp of the saved image, or None if
+     **ignore-if_identical** is True and the canvas hasn't changed.
+    """
+    previous_name = None
+    previous_image = None
+    if ignore_if_identical or change_log is not None:
+        with measure_stage(profiler, config, "identical_check") as counters:
+            previous_name = get_latest_progress_picture_name(config)
+            if previous_name is not None:
+                previous_image = image_to_palette(Image.open(
+                    os.path.join(config.picture_dir, previous_name)))
+                # ^ Read once, for both the comparison and the change log.
+            identical = (
+                    previous_image is not None
+                    and np.array_equal(image, previous_image)
+            )
+            counters.pixels_processed = image.size
+        if ignore_if_identical and identical:
             return None
 
     # Save image
-    path = os.path.join(config.picture_dir, FILE_NAME)
-    image.save(path)
-    return TIMESTAMP
+    with measure_stage(profiler, config, "save") as counters:
+        if fetched_at is None:
+            fetched_at = datetime.now()
+        handle, temporary_path = tempfile.mkstemp(suffix=".png.tmp",
+                                                  dir=config.output_dir)
+        # ^ Not in the picture directory, where it would be taken for a
+        #  progress picture.
+        try:
+            with os.fdopen(handle, "wb") as file:
+                save_palette_image(image, file, SNAPSHOT_COMPRESS_LEVEL)
+            timestamp = publish_snapshot_file(config, temporary_path,
+                                              fetched_at, subsecond)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+        hasher = new_snapshot_hasher(image.shape)
+        hasher.update(np.ascontiguousarray(image))
+        save_latest_snapshot_hash(config, f"{timestamp}.png",
+                                  hasher.hexdigest())
+        counters.pixels_processed = image.size
+
+    if (
+            change_log is not None
+            and previous_image is not None
+            and previous_image.shape == image.shape
+            # ^ The config's area was changed since the previous picture.
+    ):
+        with measure_stage(profiler, config, "changes") as counters:
+            change_log.emit(config, previous_name, previous_image,
+                            f"{timestamp}.png", image, fetched_at)
+            counters.pixels_processed = image.size
+    return timestamp
+
+
+def save_latest_image(
+        config: Config,
+        ignore_if_identical: bool,
+        *,
+        subsecond: bool = False,
+        profiler: PipelineProfiler | None = None,
+        fetcher: TileFetcher | None = None,
+        change_log: ChangeLog | None = None,
+) -> str | None:
+    """
+    Fetch and save the most recent wplace canvas image.
+
+    :param config: The config for which to get the canvas.
+    :param ignore_if_identical: Don't create a file if the downloaded image is
+     identical to the most recent saved one.
+    :param subsecond: Whether to include microseconds in the name of the
+     saved image.
+    :param profiler: An optional profiler to record each stage with.
+    :param fetcher: The function to get the chunk images with.
+     (Default: `fetch_pictures`)
+    :param change_log: If given, record the pixels that changed since the
+     previous progress picture in it.
+    :return: The timestamp of the saved image (the time the chunks were
+     received), or None if **ignore-if_identical** is True and the canvas
+     hasn't changed.
+    """
+    coords, pictures, fetched_at = asyncio.run(
+        fetch_latest_tiles(config, profiler=profiler, fetcher=fetcher))
+    return save_fetched_image(config, coords, pictures, ignore_if_identical,
+                              fetched_at=fetched_at, subsecond=subsecond,
+                              profiler=profiler, change_log=change_log)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,302 @@
+import json
+import os.path
+import typing
+
+import numpy as np
+
+from src.config import Config
+from src.snapshot_cube import open_snapshot_cube
+from src.snapshot_history import (
+    get_snapshot_names,
+    iterate_snapshots,
+    load_snapshot_palette,
+)
+from src.template_cache import CompiledTemplate, load_compiled_template
+from src.utils.graphing_utils import parse_filename_unix_time
+from src.utils.image_utils import make_heatmap_image
+
+__all__ = [
+    "OverwriteState",
+    "update_overwrite_stats",
+]
+
+
+STATE_VERSION = 4
+NEVER = -1
+TOP_PIXEL_COUNT = 10
+REPAIR_TIME_BIN_EDGES = np.geomspace(1, 10 ** 9, 901)
+# ^ Log-spaced repair time bins from 1 second to ~30 years, each ~2.3% wider
+#  than the last, so the median is exact to about 1% and the state doesn't
+#  grow with the history.
+
+
+class OverwriteState:
+    """
+    Per-pixel overwrite statistics, built by walking through consecutive
+    progress pictures. A pixel is "overwritten" when it goes from the
+    template's color to any other color, and "repaired" when it gets the
+    template's color again.
+    """
+    last_correct_time: np.ndarray
+    # ^ unix time of the last picture where the pixel was correct, or -1.
+    wrong_since: np.ndarray
+    # ^ unix time of the picture where the pixel was overwritten, or -1 if
+    #  the pixel isn't waiting to be repaired.
+    overwrite_count: np.ndarray
+    repair_count: np.ndarray
+    total_repair_time: np.ndarray
+    # ^ Sum of all repair times, in seconds.
+    repair_time_histogram: np.ndarray
+    # ^ The amount of repairs in each of `REPAIR_TIME_BIN_EDGES`' bins.
+    is_correct: np.ndarray
+    last_snapshot_name: str | None
+    snapshot_count: int
+
+    def __init__(self, template: CompiledTemplate) -> None:
+        shape = template.palette.shape
+        self.template_hash = template.get_hash()
+        self.last_correct_time = np.full(shape, NEVER, dtype=np.float64)
+        self.wrong_since = np.full(shape, NEVER, dtype=np.float64)
+        self.overwrite_count = np.zeros(shape, dtype=np.uint32)
+        self.repair_count = np.zeros(shape, dtype=np.uint32)
+        self.total_repair_time = np.zeros(shape, dtype=np.float64)
+        self.repair_time_histogram = np.zeros(
+            len(REPAIR_TIME_BIN_EDGES) - 1, dtype=np.uint64)
+        self.is_correct = np.zeros(shape, dtype=bool)
+        self.first_time: float | None = None
+        self.last_time: float | None = None
+        self.last_snapshot_name = None
+        self.snapshot_count = 0
+
+    def add_snapshot(
+            self,
+            template: CompiledTemplate,
+            snapshot: np.ndarray,
+            unix_time: float,
+    ) -> None:
+        """
+        Update the statistics with the next progress picture.
+
+        :param template: The compiled template to compare to.
+        :param snapshot: The palette indices of the progress picture.
+        :param unix_time: When the progress picture was taken.
+        """
+        is_correct = (snapshot == template.palette) & template.opacity_mask
+
+        if self.snapshot_count > 0:
+            overwritten = self.is_correct & ~is_correct
+            self.overwrite_count += overwritten
+            self.wrong_since[overwritten] = unix_time
+
+            repaired = (
+                    is_correct
+                    & ~self.is_correct
+                    & (self.wrong_since != NEVER)
+            )
+            self.repair_count += repaired
+            repair_times = unix_time - self.wrong_since[repaired]
+            self.total_repair_time[repaired] += repair_times
+            bins = np.searchsorted(REPAIR_TIME_BIN_EDGES, repair_times,
+                                   side="right") - 1
+            self.repair_time_histogram += np.bincount(
+                np.clip(bins, 0, len(self.repair_time_histogram) - 1),
+                minlength=len(self.repair_time_histogram),
+            ).astype(np.uint64)
+            self.wrong_since[repaired] = NEVER
+        else:
+            self.first_time = unix_time
+
+        self.last_correct_time[is_correct] = unix_time
+        self.is_correct = is_correct
+        self.last_time = unix_time
+        self.snapshot_count += 1
+
+    def get_mean_repair_time(self) -> np.ndarray:
+        """
+        :return: The mean time it took to repair each pixel, in seconds, or
+         0 for pixels that were never repaired.
+        """
+        return np.divide(
+            self.total_repair_time,
+            self.repair_count,
+            out=np.zeros(self.repair_count.shape, dtype=np.float64),
+            where=self.repair_count > 0,
+        )
+
+    def get_median_repair_time(self) -> float | None:
+        """
+        :return: The median time it took to repair a pixel, in seconds,
+         interpolated within its histogram bin, or None if no pixel was
+         ever repaired.
+        """
+        cumulative = np.cumsum(self.repair_time_histogram)
+        if len(cumulative) == 0 or cumulative[-1] == 0:
+            return None
+        half = cumulative[-1] / 2
+        i = int(np.searchsorted(cumulative, half))
+        before = cumulative[i] - self.repair_time_histogram[i]
+        fraction = (half - before) / self.repair_time_histogram[i]
+        low, high = REPAIR_TIME_BIN_EDGES[i], REPAIR_TIME_BIN_EDGES[i + 1]
+        return float(low * (high / low) ** fraction)
+
+    # region Saving and loading
+    def save(self, path: str) -> None:
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "wb") as f:
+            np.savez(
+                f,
+                metadata=np.array(json.dumps({
+                    "version": STATE_VERSION,
+                    "template_hash": self.template_hash,
+                    "first_time": self.first_time,
+                    "last_time": self.last_time,
+                    "last_snapshot_name": self.last_snapshot_name,
+                    "snapshot_count": self.snapshot_count,
+                })),
+                last_correct_time=self.last_correct_time,
+                wrong_since=self.wrong_since,
+                overwrite_count=self.overwrite_count,
+                repair_count=self.repair_count,
+                total_repair_time=self.total_repair_time,
+                repair_time_histogram=self.repair_time_histogram,
+                is_correct=self.is_correct,
+            )
+        os.replace(temporary_path, path)
+
+    @staticmethod
+    def load(
+            path: str,
+            template: CompiledTemplate,
+    ) -> "OverwriteState | None":
+        """
+        Load saved statistics.
+
+        :return: The saved state, or None if there is no saved state, or if
+         it was made for a different template.
+        """
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as saved:
+            metadata = json.loads(str(saved["metadata"]))
+            if (
+                    metadata["version"] != STATE_VERSION
+                    or metadata["template_hash"] != template.get_hash()
+            ):
+                return None
+            state = OverwriteState(template)
+            state.last_correct_time = saved["last_correct_time"]
+            state.wrong_since = saved["wrong_since"]
+            state.overwrite_count = saved["overwrite_count"]
+            state.repair_count = saved["repair_count"]
+            state.total_repair_time = saved["total_repair_time"]
+            state.repair_time_histogram = saved["repair_time_histogram"]
+            state.is_correct = saved["is_correct"]
+        state.first_time = metadata["first_time"]
+        state.last_time = metadata["last_time"]
+        state.last_snapshot_name = metadata["last_snapshot_name"]
+        state.snapshot_count = metadata["snapshot_count"]
+        return state
+    # endregion Saving and loading
+
+
+def _iterate_snapshots(
+        config: Config,
+        snapshot_names: list[str],
+) -> typing.Iterator[tuple[str, np.ndarray]]:
+    """
+    Load progress pictures from the snapshot cube if they have been
+    exported, or else by decoding the picture a few pictures ahead.
+    """
+    cube_indices: dict[str, int] = {}
+    cube = None
+    try:
+        cube = open_snapshot_cube(config)
+        cube_indices = {name: i for i, name in enumerate(cube.names)}
+    except FileNotFoundError:
+        pass
+
+    def load(snapshot_config: Config, name: str) -> np.ndarray:
+        if cube is not None and name in cube_indices:
+            return np.asarray(cube.frames[cube_indices[name]])
+        return load_snapshot_palette(snapshot_config, name)
+
+    yield from iterate_snapshots(config, snapshot_names, loader=load)
+
+
+def _save_overwrite_outputs(
+        config: Config,
+        template: CompiledTemplate,
+        state: OverwriteState,
+) -> None:
+    make_heatmap_image(state.overwrite_count).save(os.path.join(
+        config.output_dir, config.paths.OVERWRITE_HEATMAP_NAME))
+    mean_repair_time = state.get_mean_repair_time()
+    make_heatmap_image(mean_repair_time, state.repair_count > 0).save(
+        os.path.join(config.output_dir,
+                     config.paths.REPAIR_TIME_HEATMAP_NAME))
+
+    repair_count = int(state.repair_count.sum())
+    most_overwritten = np.argsort(
+        state.overwrite_count, axis=None)[::-1][:TOP_PIXEL_COUNT]
+    statistics = {
+        "snapshot_count": state.snapshot_count,
+        "first_time": state.first_time,
+        "last_time": state.last_time,
+        "template_pixels": int(np.count_nonzero(template.opacity_mask)),
+        "correct_pixels": int(np.count_nonzero(state.is_correct)),
+        "overwrite_count": int(state.overwrite_count.sum()),
+        "overwritten_pixels": int(np.count_nonzero(state.overwrite_count)),
+        "unrepaired_pixels": int(np.count_nonzero(
+            state.wrong_since != NEVER)),
+        "repair_count": repair_count,
+        "mean_repair_time": (
+            float(state.total_repair_time.sum()) / repair_count
+            if repair_count > 0 else None
+        ),
+        "median_repair_time": state.get_median_repair_time(),
+        "most_overwritten_pixels": [
+            {
+                "x": int(x),
+                "y": int(y),
+                "overwrite_count": int(state.overwrite_count[y, x]),
+            }
+            for y, x in zip(*np.unravel_index(
+                most_overwritten, state.overwrite_count.shape))
+            if state.overwrite_count[y, x] > 0
+        ],
+    }
+    path = os.path.join(config.output_dir,
+                        config.paths.OVERWRITE_STATS_NAME)
+    with open(path, "w") as f:
+        json.dump(statistics, f, indent=2)
+
+
+def update_overwrite_stats(config: Config) -> int:
+    """
+    Walk through all progress pictures that were added since the last
+    update, and save overwrite/repair heatmaps and statistics to the output
+    directory.
+
+    :param config: The config to update the statistics of.
+    :return: The amount of progress pictures that were processed.
+    """
+    template = load_compiled_template(config)
+    state_path = os.path.join(config.data_directory,
+                              config.paths.OVERWRITE_STATE_NAME)
+    state = OverwriteState.load(state_path, template)
+    if state is None:
+        state = OverwriteState(template)
+
+    new_names = [
+        name for name in get_snapshot_names(config)
+        if state.last_snapshot_name is None
+        or name > state.last_snapshot_name
+    ]
+    for name, snapshot in _iterate_snapshots(config, new_names):
+        state.add_snapshot(template, snapshot,
+                           parse_filename_unix_time(name))
+        state.last_snapshot_name = name
+
+    state.save(state_path)
+    _save_overwrite_outputs(config, template, state)
+    return len(new_names)
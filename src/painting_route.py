@@ -0,0 +1,352 @@
+import json
+import math
+import os.path
+from typing import NamedTuple, TypedDict
+
+import numpy as np
+from PIL import Image
+
+from src.config import Config
+from src.utils.color_utils import ColorName
+from src.utils.coord_utils import offset_coordinates
+from src.utils.palette_utils import (
+    PALETTE,
+    TRANSPARENT_INDEX,
+    image_to_palette,
+)
+
+__all__ = [
+    "RouteStop",
+    "RoutePixel",
+    "PixelGrid",
+    "order_nearest_neighbor",
+    "improve_with_two_opt",
+    "plan_painting_route",
+    "get_route_length",
+    "save_painting_route",
+]
+
+
+TWO_OPT_WINDOW = 32
+# ^ How many of the following stops 2-opt tries to reconnect each jump to.
+TWO_OPT_CHUNK_SIZE = 2 ** 14
+# ^ How many jumps 2-opt evaluates at once, to bound its memory use.
+GRID_CELL_SIZE = 8
+
+NEIGHBOR_OFFSETS = ((0, 0), (1, 0), (-1, 0), (0, 1), (0, -1),
+                    (1, 1), (-1, 1), (1, -1), (-1, -1))
+# ^ The closest possible pixels, in order of distance.
+
+
+class RouteStop(NamedTuple):
+    color: int
+    # ^ The palette index of the pixel to place.
+    x: int
+    y: int
+
+
+class RoutePixel(TypedDict):
+    color: ColorName
+    x: int
+    y: int
+    # ^ The position relative to the top left corner of the template.
+    coordinate: tuple[int, int, int, int]
+    # ^ The wplace coordinate: Tl X, Tl Y, Px X, Px Y.
+
+
+class PixelGrid:
+    """
+    A spatial index of pixels, bucketed into square cells, to find the
+    nearest remaining pixel without comparing against every pixel.
+    """
+    def __init__(self, xs: np.ndarray, ys: np.ndarray) -> None:
+        """
+        :param xs: The x positions of the pixels. No two pixels may have the
+         same position.
+        :param ys: The y positions of the pixels.
+        """
+        self.xs = xs.tolist()
+        self.ys = ys.tolist()
+        self.indices = {(x, y): i
+                        for i, (x, y) in enumerate(zip(self.xs, self.ys))}
+        self.cells: dict[tuple[int, int], set[int]] = {}
+        for (x, y), i in self.indices.items():
+            self.cells.setdefault(
+                (x // GRID_CELL_SIZE, y // GRID_CELL_SIZE), set()).add(i)
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def remove(self, i: int) -> None:
+        x, y = self.xs[i], self.ys[i]
+        del self.indices[(x, y)]
+        cell = (x // GRID_CELL_SIZE, y // GRID_CELL_SIZE)
+        self.cells[cell].remove(i)
+        if len(self.cells[cell]) == 0:
+            del self.cells[cell]
+
+    def _closest_in(self, x: int, y: int, indices, best: tuple[int, int]):
+        for i in indices:
+            distance = (self.xs[i] - x) ** 2 + (self.ys[i] - y) ** 2
+            if distance < best[0]:
+                best = (distance, i)
+        return best
+
+    def pop_nearest(self, x: int, y: int) -> int:
+        """
+        Remove the pixel that is closest to a position from the grid.
+
+        :return: The index of the removed pixel.
+        """
+        if len(self) == 0:
+            raise IndexError("The grid is empty!")
+        for dx, dy in NEIGHBOR_OFFSETS:
+            # Most remaining pixels are next to another one, which is
+            #  quicker to look up directly.
+            i = self.indices.get((x + dx, y + dy))
+            if i is not None:
+                self.remove(i)
+                return i
+
+        cell_x, cell_y = x // GRID_CELL_SIZE, y // GRID_CELL_SIZE
+        best = (math.inf, -1)
+        radius = 0
+        while True:
+            ring_size = 8 * radius if radius > 0 else 1
+            if ring_size > len(self.cells):
+                # Fewer cells are left than the ring has, so checking every
+                #  remaining cell is quicker.
+                for indices in self.cells.values():
+                    best = self._closest_in(x, y, indices, best)
+                break
+            for dy in range(-radius, radius + 1):
+                step = 1 if abs(dy) == radius else 2 * radius
+                for dx in range(-radius, radius + 1, step):
+                    indices = self.cells.get((cell_x + dx, cell_y + dy))
+                    if indices is not None:
+                        best = self._closest_in(x, y, indices, best)
+            if best[1] != -1 and (radius * GRID_CELL_SIZE) ** 2 >= best[0]:
+                # Every cell further out is at least this far away.
+                break
+            radius += 1
+        self.remove(best[1])
+        return best[1]
+
+
+def order_nearest_neighbor(
+        xs: np.ndarray,
+        ys: np.ndarray,
+        start: tuple[int, int],
+) -> np.ndarray:
+    """
+    Order pixels by always going to the closest pixel that hasn't been
+    visited yet.
+
+    :param xs: The x positions of the pixels.
+    :param ys: The y positions of the pixels.
+    :param start: The position to start from.
+    :return: The indices of the pixels, in visiting order.
+    """
+    grid = PixelGrid(xs, ys)
+    order = np.empty(len(xs), dtype=np.int64)
+    x, y = start
+    for step in range(len(xs)):
+        i = grid.pop_nearest(x, y)
+        order[step] = i
+        x, y = grid.xs[i], grid.ys[i]
+    return order
+
+
+def _get_best_reversals(
+        xs: np.ndarray,
+        ys: np.ndarray,
+        edges: np.ndarray,
+        starts: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Find the best reversal after each of a set of edges, all at once.
+
+    :param xs: The x positions of the stops, padded with `TWO_OPT_WINDOW`
+     extra stops.
+    :param ys: The y positions of the stops, padded the same way.
+    :param edges: The length of the edge after each stop, padded to the
+     same length.
+    :param starts: The first stop of each edge to try to replace.
+    :return: For each edge, how much shorter the best reversal makes the
+     path, and the last stop of that reversal.
+    """
+    # Edge (i, i + 1) is replaced with (i, j) and (j + 1, i + 1) is
+    #  reconnected, reversing the stops in between. Row r of a window holds
+    #  the values of j = r, r + 1, ..., so whole rows can be taken at once.
+    width = TWO_OPT_WINDOW - 1
+    x_windows = np.lib.stride_tricks.sliding_window_view(xs, width)
+    y_windows = np.lib.stride_tricks.sliding_window_view(ys, width)
+    edge_windows = np.lib.stride_tricks.sliding_window_view(edges, width)
+    i = starts[:, None]
+    old = edges[i] + edge_windows[starts + 2]
+    new = (np.sqrt((x_windows[starts + 2] - xs[i]) ** 2
+                   + (y_windows[starts + 2] - ys[i]) ** 2)
+           + np.sqrt((x_windows[starts + 3] - xs[i + 1]) ** 2
+                     + (y_windows[starts + 3] - ys[i + 1]) ** 2))
+    gains = old - new
+    j = i + np.arange(2, TWO_OPT_WINDOW + 1)
+    gains[j > len(xs) - TWO_OPT_WINDOW - 2] = -np.inf
+    # ^ The last stop of a reversal needs a stop after it.
+    best = np.argmax(gains, axis=1)
+    return gains[np.arange(len(starts)), best], starts + 2 + best
+
+
+def improve_with_two_opt(
+        xs: np.ndarray,
+        ys: np.ndarray,
+        passes: int = 8,
+) -> np.ndarray:
+    """
+    Shorten a path by reversing parts of it where that removes a long jump.
+    Only jumps to a non-adjacent pixel are considered, and only reversals of
+    up to `TWO_OPT_WINDOW` stops, so this stays fast for large paths. Every
+    pass evaluates all jumps at once and applies the improving reversals
+    that don't touch each other, in path order.
+
+    :param xs: The x positions of the stops, in path order.
+    :param ys: The y positions of the stops, in path order.
+    :param passes: The maximum amount of times to go over the path.
+    :return: The new order of the stops, as indices into **xs** and **ys**.
+    """
+    order = np.arange(len(xs))
+    xs = xs.astype(np.float64)
+    ys = ys.astype(np.float64)
+    positions = np.arange(len(xs))
+    for _ in range(passes):
+        if len(xs) < 4:
+            break
+        edges = np.hypot(np.diff(xs), np.diff(ys))
+        jumps = np.flatnonzero(edges[:-2] > math.sqrt(2))
+        if len(jumps) == 0:
+            break
+        padded_xs = np.pad(xs, (0, TWO_OPT_WINDOW), mode="edge")
+        padded_ys = np.pad(ys, (0, TWO_OPT_WINDOW), mode="edge")
+        padded_edges = np.pad(edges, (0, TWO_OPT_WINDOW + 1))
+        gains, ends = [], []
+        for chunk_start in range(0, len(jumps), TWO_OPT_CHUNK_SIZE):
+            chunk_gains, chunk_ends = _get_best_reversals(
+                padded_xs, padded_ys, padded_edges,
+                jumps[chunk_start:chunk_start + TWO_OPT_CHUNK_SIZE])
+            gains.append(chunk_gains)
+            ends.append(chunk_ends)
+        is_improving = np.concatenate(gains) > 1e-9
+        firsts, lasts = [], []
+        reach = 0
+        for i, last in zip(jumps[is_improving].tolist(),
+                           np.concatenate(ends)[is_improving].tolist()):
+            if i >= reach:
+                # ^ A reversal changes the edges from `i` up to `last + 1`,
+                #  so the next one has to start after that.
+                firsts.append(i + 1)
+                lasts.append(last)
+                reach = last + 1
+        if len(firsts) == 0:
+            break
+
+        firsts, lasts = np.array(firsts), np.array(lasts)
+        part = np.maximum(
+            np.searchsorted(firsts, positions, side="right") - 1, 0)
+        is_reversed = (positions >= firsts[part]) & (positions <= lasts[part])
+        indices = np.where(is_reversed,
+                           firsts[part] + lasts[part] - positions, positions)
+        xs, ys, order = xs[indices], ys[indices], order[indices]
+    return order
+
+
+def plan_painting_route(remainder: np.ndarray) -> list[RouteStop]:
+    """
+    Order the remaining pixels into a short path to paint them in. Pixels
+    are grouped by color, so the color only has to be switched once per
+    color, starting with the most common color. Every color group starts at
+    the pixel closest to where the previous group ended.
+
+    :param remainder: The palette indices of the remaining pixels. To
+     leave out colors, make them transparent, like the placeable remainder
+     picture does.
+    :return: The pixels to place, in order.
+    """
+    color_counts = np.bincount(remainder.ravel(), minlength=len(PALETTE))
+    color_counts[TRANSPARENT_INDEX] = 0
+    color_order = [int(i) for i in np.argsort(-color_counts, kind="stable")
+                   if color_counts[i] > 0]
+
+    route: list[RouteStop] = []
+    position = (0, 0)
+    for color in color_order:
+        ys, xs = np.nonzero(remainder == color)
+        order = order_nearest_neighbor(xs, ys, position)
+        xs, ys = xs[order], ys[order]
+        order = improve_with_two_opt(xs, ys)
+        xs, ys = xs[order], ys[order]
+        route.extend(RouteStop(color, int(x), int(y))
+                     for x, y in zip(xs, ys))
+        position = (int(xs[-1]), int(ys[-1]))
+    return route
+
+
+def get_route_length(route: list[RouteStop]) -> float:
+    """
+    :return: The distance in pixels between all consecutive stops.
+    """
+    if len(route) < 2:
+        return 0
+    positions = np.array([(stop.x, stop.y) for stop in route],
+                         dtype=np.float64)
+    return float(np.hypot(*np.diff(positions, axis=0).T).sum())
+
+
+def save_painting_route(
+        config: Config,
+        charges: int,
+        available_only: bool = False,
+) -> list[RouteStop]:
+    """
+    Plan a painting route over the current remainder picture, and save it
+    in batches of **charges** pixels.
+
+    :param config: The config to plan the route for.
+    :param charges: The amount of pixels to put in each batch, usually the
+     amount of charges a painter can save up.
+    :param available_only: Only include colors that the user can place.
+    :return: The planned route.
+    """
+    name = (config.paths.REMAINING_PLACEABLE_PIXELS_NAME if available_only
+            else config.paths.REMAINING_PIXELS_NAME)
+    remainder_path = os.path.join(config.output_dir, name)
+    if not os.path.exists(remainder_path):
+        raise FileNotFoundError(
+            f"File {remainder_path} does not exist! Run "
+            f"`fetch_latest_picture.py` first to create a remainder picture."
+        )
+    route = plan_painting_route(
+        image_to_palette(Image.open(remainder_path)))
+
+    coordinates = np.column_stack(offset_coordinates(
+        config.top_left,
+        np.array([stop.x for stop in route], dtype=np.int64),
+        np.array([stop.y for stop in route], dtype=np.int64),
+    )).tolist()
+    pixels: list[RoutePixel] = [
+        {
+            "color": PALETTE[stop.color],
+            "x": stop.x,
+            "y": stop.y,
+            "coordinate": tuple(coordinate),
+        }
+        for stop, coordinate in zip(route, coordinates)
+    ]
+    batches = [pixels[i:i + charges] for i in range(0, len(pixels), charges)]
+    path = os.path.join(config.output_dir, config.paths.PAINTING_ROUTE_NAME)
+    with open(path, "w") as f:
+        json.dump({
+            "charges": charges,
+            "pixel_count": len(pixels),
+            "length": get_route_length(route),
+            "batches": batches,
+        }, f)
+    return route
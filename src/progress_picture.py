@@ -1,13 +1,20 @@
 import argparse
+import json
 import os.path
+
+import numpy as np
 from PIL import Image
 
 from src.config import load_config, Config
-from src.utils.image_utils import (
-    get_remaining_pixels_image,
-    filter_colors,
-    Mask,
+from src.template_cache import CompiledTemplate, load_compiled_template
+from src.utils.palette_utils import (
+    TRANSPARENT_INDEX,
+    RgbaPngWriter,
+    get_remaining_palette,
+    image_to_palette,
+    save_palette_image,
 )
+from src.utils.profiling_utils import PipelineProfiler, measure_stage
 
 REMAINING_PIXELS_NAME = "remaining_pixels.png"
 REMAINING_PLACEABLE_PIXELS_NAME = "remaining_pixels_placeable.png"
@@ -15,21 +22,203 @@ REMAINING_UNPLACEABLE_PIXELS_NAME = "remaining_pixels_unplaceable.png"
 
 
 def get_progress(
-        template: Image.Image,
-        remainder_image: Image.Image
+        template: CompiledTemplate,
+        remainder: np.ndarray,
 ) -> float:
-    template_mask = Mask.from_pixel_opacity(template)
-    # ^ White for placed pixels, black for unplaced / transparent pixels.
-    remaining_mask = Mask.from_pixel_opacity(remainder_image)
-    # ^ White for unplaced pixels, black for placed / transparent pixels.
-
-    template_count = template_mask.count().get(255, 0)  # get total pixels
-    remaining_count = remaining_mask.count().get(255, 0)  # get unplaced pixels
+    template_count = np.count_nonzero(template.opacity_mask)
+    # ^ total pixels
+    remaining_count = np.count_nonzero(remainder != TRANSPARENT_INDEX)
+    # ^ unplaced pixels
 
     remaining_progress = remaining_count / template_count
     return 1 - remaining_progress
 
 
+def _sum_row_of_cells(
+        values: np.ndarray,
+        cell_height: int,
+        cell_size: int,
+) -> np.ndarray:
+    """
+    Sum a 2D array in cells of **cell_height** by **cell_size** pixels. The
+    height of the array must be a multiple of the cell height, but the last
+    column of cells is narrower if the width isn't a multiple of the cell
+    size.
+    """
+    height, width = values.shape
+    rows = height // cell_height
+    full_width = width - width % cell_size
+    sums = values[:, :full_width].reshape(
+        rows, cell_height, full_width // cell_size, cell_size,
+    ).sum(axis=(1, 3), dtype=np.int64)
+    # ^ Reshaping only splits axes, so it's a view instead of a copy.
+    if full_width < width:
+        ragged = values[:, full_width:].reshape(rows, cell_height, -1).sum(
+            axis=(1, 2), dtype=np.int64)
+        sums = np.column_stack([sums, ragged])
+    return sums
+
+
+def _sum_cells(
+        values: np.ndarray,
+        cell_size: int,
+        top: int = 0,
+) -> np.ndarray:
+    """
+    Sum a 2D array in square cells. The last row and column of cells are
+    smaller if the array's size isn't a multiple of the cell size.
+
+    :param values: The 2D array to sum.
+    :param cell_size: The width and height of each cell, in pixels.
+    :param top: The y position of the array's first row in a larger array
+     that the cells line up with. The first row of cells is smaller if this
+     isn't a multiple of the cell size.
+    :return: A (rows, columns) array with the sum of each cell.
+    """
+    height = values.shape[0]
+    head = min(-top % cell_size, height)
+    # ^ The rows before the first cell boundary.
+    body = head + (height - head) // cell_size * cell_size
+    return np.concatenate([
+        _sum_row_of_cells(values[start:end], cell_height, cell_size)
+        for start, end, cell_height in (
+            (0, head, head),
+            (head, body, cell_size),
+            (body, height, height - body),
+        )
+        if end > start
+    ])
+
+
+def get_regional_progress(
+        template: CompiledTemplate,
+        remainder: np.ndarray,
+        cell_size: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Calculate the progress of each square cell of the template.
+
+    :param template: The compiled template.
+    :param remainder: The palette indices of the remaining pixels.
+    :param cell_size: The width and height of each cell, in pixels.
+    :return: A tuple of a (rows, columns) array with the amount of template
+     pixels in each cell, and one with the amount of remaining pixels.
+    """
+    goal = _sum_cells(template.opacity_mask, cell_size)
+    remaining = _sum_cells(remainder != TRANSPARENT_INDEX, cell_size)
+    return goal, remaining
+
+
+def add_strip_to_cells(
+        cells: np.ndarray,
+        values: np.ndarray,
+        top: int,
+        cell_size: int,
+) -> None:
+    """
+    Like `_sum_cells`, but for one horizontal strip of a larger array at a
+    time. The strip doesn't need to line up with the cells.
+
+    :param cells: The (rows, columns) cell sums to add the strip to.
+    :param values: The 2D strip to sum.
+    :param top: The y position of the strip's first row in the full array.
+    :param cell_size: The width and height of each cell, in pixels.
+    """
+    strip_cells = _sum_cells(values, cell_size, top)
+    first_row = top // cell_size
+    cells[first_row:first_row + len(strip_cells)] += strip_cells
+
+
+def save_progress_heatmap(
+        path: str,
+        goal: np.ndarray,
+        remaining: np.ndarray,
+        cell_size: int,
+        size: tuple[int, int],
+) -> None:
+    """
+    Color each cell from red (0% done) to green (100% done), and save it
+    at the size of the template. Cells without template pixels are
+    transparent. The image is written one row of cells at a time, so it
+    never needs to be in memory at full size.
+
+    :param path: The path to save the heatmap to.
+    :param goal: The (rows, columns) amount of template pixels per cell.
+    :param remaining: The (rows, columns) amount of remaining pixels per
+     cell.
+    :param cell_size: The width and height of each cell, in pixels.
+    :param size: The size of the template, to crop the heatmap to.
+    """
+    completion = np.divide(
+        goal - remaining,
+        goal,
+        out=np.zeros(goal.shape),
+        where=goal > 0,
+    )
+    cells = np.zeros(goal.shape + (4,), dtype=np.uint8)
+    cells[..., 0] = np.round(255 * (1 - completion))
+    cells[..., 1] = np.round(255 * completion)
+    cells[..., 3] = np.where(goal > 0, 255, 0)
+
+    width, height = size
+    with open(path, "wb") as f, RgbaPngWriter(f, width, height) as writer:
+        for row, top in enumerate(range(0, height, cell_size)):
+            band = np.repeat(cells[row], cell_size, axis=0)[:width]
+            writer.write_rows(np.broadcast_to(
+                band, (min(cell_size, height - top),) + band.shape))
+
+
+def save_regional_progress(
+        config: Config,
+        template: CompiledTemplate,
+        remainder: np.ndarray,
+) -> None:
+    cell_size = config.heatmap_cell_size
+    goal, remaining = get_regional_progress(template, remainder, cell_size)
+    save_regional_progress_counts(config, goal, remaining, template.size)
+
+
+def save_regional_progress_counts(
+        config: Config,
+        goal: np.ndarray,
+        remaining: np.ndarray,
+        size: tuple[int, int],
+) -> None:
+    """
+    Save the regional progress heatmap and data, from already-summed cells.
+
+    :param config: The config to save the regional progress of.
+    :param goal: The (rows, columns) amount of template pixels per cell.
+    :param remaining: The (rows, columns) amount of remaining pixels per
+     cell.
+    :param size: The size of the template.
+    """
+    cell_size = config.heatmap_cell_size
+    save_progress_heatmap(
+        os.path.join(config.output_dir, config.paths.REGIONAL_PROGRESS_NAME),
+        goal, remaining, cell_size, size)
+
+    completion = [
+        [
+            round(1 - remaining_count / goal_count, 4)
+            if goal_count > 0 else None
+            for goal_count, remaining_count in zip(goal_row, remaining_row)
+        ]
+        for goal_row, remaining_row in zip(goal.tolist(), remaining.tolist())
+    ]
+    path = os.path.join(config.output_dir,
+                        config.paths.REGIONAL_PROGRESS_DATA_NAME)
+    with open(path, "w") as f:
+        json.dump({
+            "cell_size": cell_size,
+            "rows": goal.shape[0],
+            "columns": goal.shape[1],
+            "completion": completion,
+            "goal": goal.tolist(),
+            "remaining": remaining.tolist(),
+        }, f)
+
+
 def load_picture(config: Config, progress_picture_name: str):
     progress_path = os.path.join(config.picture_dir, progress_picture_name)
 
@@ -42,30 +231,62 @@ def load_picture(config: Config, progress_picture_name: str):
     return Image.open(progress_path).convert("RGBA")
 
 
-def save_remainder_images(config: Config, progress_picture_name: str):
-    template = config.get_template_image()
-    other = load_picture(config, progress_picture_name)
+def save_remainder_palette(
+        config: Config,
+        progress: np.ndarray,
+        *,
+        profiler: PipelineProfiler | None = None,
+) -> np.ndarray:
+    """
+    Compare a progress picture to the template, and save the remainder
+    pictures and regional progress.
 
-    remainder_img = get_remaining_pixels_image(template, other)
-    path = os.path.join(config.output_dir,
-                        config.paths.REMAINING_PIXELS_NAME)
-    remainder_img.save(path)
+    :param config: The config to save the remainder pictures of.
+    :param progress: The palette indices of the progress picture.
+    :param profiler: An optional profiler to record each stage with.
+    :return: The palette indices of the remaining pixels.
+    """
+    with measure_stage(profiler, config, "remainder") as counters:
+        template = load_compiled_template(config)
 
-    available = filter_colors(remainder_img,
-                              list(config.available_colors.keys()))
-    path = os.path.join(config.output_dir,
-                        config.paths.REMAINING_PLACEABLE_PIXELS_NAME)
-    available.save(path)
+        remainder = get_remaining_palette(template.palette, progress)
+        path = os.path.join(config.output_dir,
+                            config.paths.REMAINING_PIXELS_NAME)
+        save_palette_image(remainder, path)
 
-    unavailable = filter_colors(remainder_img,
-                                list(config.unavailable_colors.keys()))
-    path = os.path.join(config.output_dir,
-                        config.paths.REMAINING_UNPLACEABLE_PIXELS_NAME)
+        placeable = template.placeable_colors[remainder]
+        available = np.where(placeable, remainder, TRANSPARENT_INDEX)
+        path = os.path.join(config.output_dir,
+                            config.paths.REMAINING_PLACEABLE_PIXELS_NAME)
+        save_palette_image(available, path)
+
+        unavailable = np.where(placeable, TRANSPARENT_INDEX, remainder)
+        path = os.path.join(config.output_dir,
+                            config.paths.REMAINING_UNPLACEABLE_PIXELS_NAME)
+
+        progress = get_progress(template, remainder)
+        print(f"The template has been built for {progress:.2%}.")
+
+        save_palette_image(unavailable, path)
+        counters.pixels_processed = remainder.size
+
+    with measure_stage(profiler, config, "regional_progress") as counters:
+        save_regional_progress(config, template, remainder)
+        counters.pixels_processed = remainder.size
+    return remainder
 
-    progress = get_progress(template, remainder_img)
-    print(f"The template has been built for {progress:.2%}.")
 
-    unavailable.save(path)
+def save_remainder_images(
+        config: Config,
+        progress_picture_name: str,
+        *,
+        profiler: PipelineProfiler | None = None,
+) -> np.ndarray:
+    with measure_stage(profiler, config, "load_progress") as counters:
+        progress = image_to_palette(
+            load_picture(config, progress_picture_name))
+        counters.pixels_processed = progress.size
+    return save_remainder_palette(config, progress, profiler=profiler)
 
 
 if __name__ == "__main__":
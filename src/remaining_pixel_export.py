@@ -0,0 +1,141 @@
+import json
+import os.path
+from typing import Literal, TypedDict
+
+import numpy as np
+from PIL import Image
+
+from src.config import Config
+from src.utils.color_utils import ColorName
+from src.utils.coord_utils import WplaceCoordinates, offset_coordinates
+from src.utils.palette_utils import (
+    PALETTE,
+    TRANSPARENT_INDEX,
+    image_to_palette,
+)
+
+__all__ = [
+    "ExportFormat",
+    "ColorPixelList",
+    "get_remaining_pixels_by_color",
+    "get_remaining_pixel_list_path",
+    "save_remaining_pixel_list",
+]
+
+
+type ExportFormat = Literal["json", "csv"]
+
+
+class ColorPixelList(TypedDict):
+    pixel_count: int
+    # The following lists have one entry per pixel, together forming the
+    #  wplace coordinate of each pixel.
+    tl_x: list[int]
+    tl_y: list[int]
+    px_x: list[int]
+    px_y: list[int]
+
+
+def get_remaining_pixels_by_color(
+        config: Config,
+        remainder: np.ndarray,
+) -> dict[ColorName, WplaceCoordinates]:
+    """
+    Find the wplace coordinates of all pixels in a remainder picture, with
+    one scan over the picture instead of one per color.
+
+    :param config: The config the remainder picture belongs to.
+    :param remainder: The palette indices of the remainder picture.
+    :return: The coordinates of the remaining pixels of each color, in
+     reading order. Colors without remaining pixels are left out.
+    """
+    ys, xs = np.nonzero(remainder != TRANSPARENT_INDEX)
+    colors = remainder[ys, xs]
+    order = np.argsort(colors, kind="stable")
+    # ^ Stable, so each color's pixels stay in reading order.
+    coords = offset_coordinates(config.top_left, xs[order], ys[order])
+    indices, starts = np.unique(colors[order], return_index=True)
+    ends = np.append(starts[1:], len(order))
+    return {
+        PALETTE[index]: WplaceCoordinates(
+            *(part[start:end] for part in coords))
+        for index, start, end in zip(indices.tolist(), starts.tolist(),
+                                     ends.tolist())
+    }
+
+
+def _write_json(path: str, pixels: dict[ColorName, WplaceCoordinates]):
+    colors: dict[ColorName, ColorPixelList] = {
+        color: {
+            "pixel_count": len(coords.TlX),
+            "tl_x": coords.TlX.tolist(),
+            "tl_y": coords.TlY.tolist(),
+            "px_x": coords.PxX.tolist(),
+            "px_y": coords.PxY.tolist(),
+        }
+        for color, coords in pixels.items()
+    }
+    with open(path, "w") as f:
+        f.write(json.dumps({
+            "pixel_count": sum(len(c.TlX) for c in pixels.values()),
+            "colors": colors,
+        }, separators=(",", ":")))
+        # ^ `json.dumps` encodes everything in C, while `json.dump` encodes
+        #  in Python to write in chunks, which is a lot slower.
+
+
+def _write_csv(path: str, pixels: dict[ColorName, WplaceCoordinates]):
+    with open(path, "w") as f:
+        f.write("color,tl_x,tl_y,px_x,px_y\n")
+        for color, coords in pixels.items():
+            rows = np.column_stack(coords).ravel().tolist()
+            f.write((f"{color},%d,%d,%d,%d\n" * len(coords.TlX))
+                    % tuple(rows))
+            # ^ One formatting call per color is a lot faster than one per
+            #  pixel.
+
+
+def get_remaining_pixel_list_path(
+        config: Config,
+        export_format: ExportFormat,
+) -> str:
+    """
+    :return: The path the remaining pixels are exported to in a format.
+    """
+    name = (config.paths.REMAINING_PIXEL_LIST_NAME if export_format == "json"
+            else config.paths.REMAINING_PIXEL_CSV_NAME)
+    return os.path.join(config.output_dir, name)
+
+
+def save_remaining_pixel_list(
+        config: Config,
+        export_format: ExportFormat = "json",
+        available_only: bool = False,
+) -> dict[ColorName, int]:
+    """
+    Save the wplace coordinates of every remaining pixel, grouped by color,
+    to the output directory.
+
+    :param config: The config to export the remaining pixels of.
+    :param export_format: "json" to save one list per coordinate part for
+     each color, or "csv" to save one row per pixel.
+    :param available_only: Only include colors that the user can place.
+    :return: The amount of remaining pixels of each color.
+    """
+    name = (config.paths.REMAINING_PLACEABLE_PIXELS_NAME if available_only
+            else config.paths.REMAINING_PIXELS_NAME)
+    remainder_path = os.path.join(config.output_dir, name)
+    if not os.path.exists(remainder_path):
+        raise FileNotFoundError(
+            f"File {remainder_path} does not exist! Run "
+            f"`fetch_latest_picture.py` first to create a remainder picture."
+        )
+    pixels = get_remaining_pixels_by_color(
+        config, image_to_palette(Image.open(remainder_path)))
+
+    path = get_remaining_pixel_list_path(config, export_format)
+    if export_format == "json":
+        _write_json(path, pixels)
+    else:
+        _write_csv(path, pixels)
+    return {color: len(coords.TlX) for color, coords in pixels.items()}
@@ -0,0 +1,232 @@
+import argparse
+import json
+import os.path
+import struct
+
+import numpy as np
+
+from src.config import load_config, Config
+from src.snapshot_history import get_snapshot_names, iterate_snapshots
+from src.utils.graphing_utils import parse_filename_unix_time
+
+__all__ = [
+    "SnapshotCube",
+    "export_snapshot_cube",
+    "open_snapshot_cube",
+]
+
+
+CUBE_MAGIC = b"WPLCUBE\0"
+CUBE_VERSION = 1
+# magic, version, height, width, frame count
+HEADER_FORMAT = "<8sIIIQ"
+HEADER_SIZE = 64  # Padded, so that the frames start at an aligned offset.
+
+
+def _read_header(path: str) -> tuple[int, int, int]:
+    """
+    :return: A tuple of the height, width and frame count of a cube file.
+    """
+    with open(path, "rb") as f:
+        header = f.read(struct.calcsize(HEADER_FORMAT))
+    magic, version, height, width, frame_count = struct.unpack(
+        HEADER_FORMAT, header)
+    if magic != CUBE_MAGIC:
+        raise ValueError(f"{path} is not a snapshot cube file!")
+    if version != CUBE_VERSION:
+        raise ValueError(
+            f"Unsupported snapshot cube version {version} (expected "
+            f"{CUBE_VERSION}). Delete {path} and export it again."
+        )
+    return height, width, frame_count
+
+
+def _write_header(
+        f,
+        height: int,
+        width: int,
+        frame_count: int,
+) -> None:
+    header = struct.pack(HEADER_FORMAT, CUBE_MAGIC, CUBE_VERSION,
+                         height, width, frame_count)
+    f.seek(0)
+    f.write(header.ljust(HEADER_SIZE, b"\0"))
+
+
+class SnapshotCube:
+    """
+    Read-only, memory-mapped access to the exported snapshot history of a
+    config. Frames are only read from disk when they are accessed, so
+    slicing a pixel timeline or region doesn't load the whole history.
+    """
+    frames: np.ndarray
+    # ^ (time, height, width) uint8 memory map of palette indices.
+    names: list[str]
+    times: np.ndarray
+    # ^ unix time of every frame.
+
+    def __init__(self, path: str, index_path: str) -> None:
+        height, width, frame_count = _read_header(path)
+        with open(index_path, "r") as f:
+            self.names = json.load(f)["names"][:frame_count]
+        # ^ The index may be ahead of the header if an export was
+        #  interrupted, but never behind it.
+        self.times = np.array(
+            [parse_filename_unix_time(name) for name in self.names],
+            dtype=np.float64,
+        )
+        if frame_count == 0:
+            self.frames = np.zeros((0, height, width), dtype=np.uint8)
+        else:
+            self.frames = np.memmap(
+                path,
+                dtype=np.uint8,
+                mode="r",
+                offset=HEADER_SIZE,
+                shape=(frame_count, height, width),
+            )
+
+    def __len__(self) -> int:
+        return self.frames.shape[0]
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self.frames.shape[2], self.frames.shape[1]
+
+    def get_frame_index(self, unix_time: float) -> int:
+        """
+        Get the index of the latest frame taken at or before a given time.
+
+        :param unix_time: The time to look up.
+        :return: The frame index, or -1 if every frame is newer.
+        """
+        return int(np.searchsorted(self.times, unix_time, side="right")) - 1
+
+    def get_pixel_timeline(self, x: int, y: int) -> np.ndarray:
+        """
+        Get the palette index of one pixel in every frame.
+
+        :return: A (time,) view into the cube.
+        """
+        return self.frames[:, y, x]
+
+    def get_region(
+            self,
+            x1: int,
+            y1: int,
+            x2: int,
+            y2: int,
+            start: int | None = None,
+            end: int | None = None,
+    ) -> np.ndarray:
+        """
+        Get a rectangular region over a range of frames. Like slices, the
+        end coordinates and end frame are exclusive.
+
+        :return: A (time, y2 - y1, x2 - x1) view into the cube.
+        """
+        return self.frames[start:end, y1:y2, x1:x2]
+
+    def get_last_change_time(self, x: int, y: int) -> float | None:
+        """
+        Get when a pixel last changed color.
+
+        :return: The unix time of the first frame with the pixel's current
+         color, or None if the pixel never changed.
+        """
+        timeline = self.get_pixel_timeline(x, y)
+        changes = np.flatnonzero(timeline[1:] != timeline[:-1])
+        if len(changes) == 0:
+            return None
+        return float(self.times[changes[-1] + 1])
+
+
+def _get_cube_paths(config: Config) -> tuple[str, str]:
+    return (
+        os.path.join(config.data_directory, config.paths.SNAPSHOT_CUBE_NAME),
+        os.path.join(config.data_directory,
+                     config.paths.SNAPSHOT_CUBE_INDEX_NAME),
+    )
+
+
+def export_snapshot_cube(config: Config) -> int:
+    """
+    Export the progress pictures of a config into a snapshot cube. If the
+    cube already exists, only the pictures that are newer than its last
+    frame are appended.
+
+    :param config: The config to export the progress pictures of.
+    :return: The amount of frames that were added.
+    """
+    path, index_path = _get_cube_paths(config)
+    width, height = config.image_size
+
+    names: list[str] = []
+    if os.path.exists(path) and os.path.exists(index_path):
+        cube_height, cube_width, frame_count = _read_header(path)
+        if (cube_width, cube_height) != (width, height):
+            raise ValueError(
+                f"The snapshot cube is {cube_width}x{cube_height}, but the "
+                f"config is {width}x{height}. Delete {path} to export it "
+                f"again."
+            )
+        with open(index_path, "r") as f:
+            names = json.load(f)["names"][:frame_count]
+    else:
+        with open(path, "wb") as f:
+            _write_header(f, height, width, 0)
+
+    new_names = [
+        name for name in get_snapshot_names(config)
+        if len(names) == 0 or name > names[-1]
+    ]
+    frame_size = width * height
+    with open(path, "r+b") as f:
+        for name, frame in iterate_snapshots(config, new_names):
+            if frame.shape != (height, width):
+                raise ValueError(
+                    f"Progress picture {name} is {frame.shape[::-1]}, "
+                    f"expected {(width, height)}."
+                )
+            f.seek(HEADER_SIZE + len(names) * frame_size)
+            f.write(frame.tobytes())
+            names.append(name)
+
+        # Write the index before the header, so that the header never
+        #  claims frames that aren't in the index.
+        with open(index_path, "w") as index_file:
+            json.dump({"names": names}, index_file)
+        _write_header(f, height, width, len(names))
+    return len(new_names)
+
+
+def open_snapshot_cube(config: Config) -> SnapshotCube:
+    """
+    Open the exported snapshot cube of a config.
+
+    :param config: The config to open the cube of.
+    :return: The memory-mapped snapshot cube.
+    """
+    path, index_path = _get_cube_paths(config)
+    if not os.path.exists(path) or not os.path.exists(index_path):
+        raise FileNotFoundError(
+            f"Snapshot cube not found! Run `python -m src.snapshot_cube "
+            f"{config.name}` first to export it (path: {path})."
+        )
+    return SnapshotCube(path, index_path)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Export the progress pictures of a config into one "
+                    "memory-mapped file of palette indices."
+    )
+    arg_parser.add_argument(
+        "config",
+        type=str,
+        help="The config to export the progress pictures of."
+    )
+
+    args = arg_parser.parse_args()
+    added = export_snapshot_cube(load_config(args.config))
+    print(f"Added {added} frame(s) to the snapshot cube.")
@@ -0,0 +1,120 @@
+import typing
+from typing import Literal
+
+import numpy as np
+
+from src.template_cache import CompiledTemplate
+from src.utils.palette_utils import PALETTE, TRANSPARENT_INDEX
+
+__all__ = [
+    "ChangeType",
+    "CHANGE_TYPES",
+    "count_snapshot_changes",
+    "get_rolling_rates",
+]
+
+
+type ChangeType = Literal[
+    "placed",
+    # ^ A transparent pixel got a color.
+    "removed",
+    # ^ A colored pixel became transparent.
+    "overwritten_correct",
+    # ^ A colored pixel got a different color that matches the template.
+    "overwritten_wrong",
+    # ^ A colored pixel got a different color that doesn't match the
+    #  template.
+]
+CHANGE_TYPES: tuple[ChangeType, ...] = typing.get_args(ChangeType.__value__)
+
+
+def count_snapshot_changes(
+        template: CompiledTemplate,
+        previous: np.ndarray,
+        current: np.ndarray,
+) -> dict[ChangeType, np.ndarray]:
+    """
+    Count every pixel that changed between two progress pictures. Unlike
+    comparing the color counts of both pictures, this also counts pixels
+    that were replaced by a pixel of the same color elsewhere.
+
+    :param template: The compiled template, to tell if overwritten pixels
+     got the correct color.
+    :param previous: The palette indices of the earlier progress picture.
+    :param current: The palette indices of the later progress picture.
+    :return: For every type of change, an array with the amount of changed
+     pixels per palette index. Removed pixels are counted by their old
+     color, all other changes by their new color.
+    """
+    if previous.shape != current.shape:
+        raise ValueError(
+            f"Progress pictures were not the same size!\n"
+            f"Previous: {previous.shape[::-1]}, "
+            f"current: {current.shape[::-1]}"
+        )
+    changed = np.flatnonzero(previous != current)
+    # ^ Only look at changed pixels from here, so the rest is O(changes).
+    old_colors = previous.ravel()[changed]
+    new_colors = current.ravel()[changed]
+    is_correct = (
+            (new_colors == template.palette.ravel()[changed])
+            & template.opacity_mask.ravel()[changed]
+    )
+
+    placed = old_colors == TRANSPARENT_INDEX
+    removed = new_colors == TRANSPARENT_INDEX
+    overwritten = ~placed & ~removed
+
+    def count(colors: np.ndarray) -> np.ndarray:
+        return np.bincount(colors, minlength=len(PALETTE))
+
+    return {
+        "placed": count(new_colors[placed]),
+        "removed": count(old_colors[removed]),
+        "overwritten_correct": count(new_colors[overwritten & is_correct]),
+        "overwritten_wrong": count(new_colors[overwritten & ~is_correct]),
+    }
+
+
+def get_rolling_rates(
+        times: np.ndarray,
+        counts: np.ndarray,
+        window_minutes: float | None = None,
+) -> np.ndarray:
+    """
+    Convert change counts between progress pictures into changes per
+    minute, optionally averaged over a rolling time window. Averaging
+    smooths out the spikes that appear when someone places a lot of
+    saved-up pixels between two pictures.
+
+    :param times: The (n + 1,) unix times of the progress pictures.
+    :param counts: The (n, colors) amount of changes between each picture
+     and the next.
+    :param window_minutes: The length of the window to average over. Each
+     rate is the amount of changes in the intervals that end within the
+     window, divided by the length of those intervals. (Default: No
+     smoothing; the rate of each interval by itself)
+    :return: The (n, colors) rates, in changes per minute.
+    """
+    durations = np.diff(times).astype(np.float64)
+    if window_minutes is None:
+        window_start = np.arange(len(durations))
+    else:
+        interval_ends = times[1:]
+        window_start = np.searchsorted(
+            interval_ends, interval_ends - window_minutes * 60, side="right")
+        window_start = np.minimum(window_start, np.arange(len(durations)))
+        # ^ Always include the interval itself.
+
+    count_sums = np.concatenate(
+        [np.zeros((1, counts.shape[1])), np.cumsum(counts, axis=0)])
+    duration_sums = np.concatenate([[0.0], np.cumsum(durations)])
+    ends = np.arange(1, len(durations) + 1)
+    window_counts = count_sums[ends] - count_sums[window_start]
+    window_durations = duration_sums[ends] - duration_sums[window_start]
+    return np.divide(
+        window_counts * 60,
+        window_durations[:, np.newaxis],
+        out=np.zeros(window_counts.shape),
+        where=window_durations[:, np.newaxis] > 0,
+    )
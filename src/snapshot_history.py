@@ -0,0 +1,145 @@
+import bisect
+import collections
+import os.path
+import typing
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+from PIL import Image
+
+from src.config import Config
+from src.utils.palette_utils import image_to_palette
+
+__all__ = [
+    "SNAPSHOT_TIME_FORMAT",
+    "SUBSECOND_SNAPSHOT_TIME_FORMAT",
+    "format_snapshot_timestamp",
+    "get_snapshot_names",
+    "load_snapshot_palette",
+    "DEFAULT_PREFETCH_COUNT",
+    "iterate_snapshots",
+]
+
+
+SNAPSHOT_TIME_FORMAT = "%Y-%m-%dT%H%M%S"
+SUBSECOND_SNAPSHOT_TIME_FORMAT = SNAPSHOT_TIME_FORMAT + "_%f"
+# ^ "_" sorts after ".", so "2025-08-22T184429_500000.png" is sorted after
+#  "2025-08-22T184429.png", and names of both formats can be mixed.
+DEFAULT_PREFETCH_COUNT = min(4, os.cpu_count() or 1)
+
+
+def format_snapshot_timestamp(time: datetime, subsecond: bool = False) -> str:
+    """
+    Get the name of a progress picture taken at a given time, without
+    extension.
+
+    :param time: When the picture was taken.
+    :param subsecond: Whether to include microseconds in the name.
+    :return: A name like "2025-08-22T184429" or "2025-08-22T184429_500000".
+    """
+    if subsecond:
+        return time.strftime(SUBSECOND_SNAPSHOT_TIME_FORMAT)
+    return time.strftime(SNAPSHOT_TIME_FORMAT)
+
+
+def get_snapshot_names(
+        config: Config,
+        since: float | None = None,
+        include_previous: bool = False,
+) -> list[str]:
+    """
+    Get the file names of all downloaded progress pictures of a config.
+
+    :param config: The config to get the progress pictures of.
+    :param since: If given, only include progress pictures taken at or after
+     this unix time. This only compares the file names, so no pictures are
+     opened.
+    :param include_previous: Also include the last progress picture before
+     **since**, for callers that compare each picture to the one before.
+    :return: A chronologically sorted list of file names.
+    """
+    snapshot_names = []
+    for snapshot_name in os.listdir(config.picture_dir):
+        assert snapshot_name.endswith(".png"), (
+            f"Expected .png file, got {snapshot_name}!"
+        )
+        snapshot_names.append(snapshot_name)
+    snapshot_names.sort()  # yyyy-mm-ddThhmmss[_ffffff] sorts alphabetically.
+    if since is not None:
+        first_name = format_snapshot_timestamp(datetime.fromtimestamp(since),
+                                               subsecond=since % 1 != 0)
+        # ^ Every name taken in or after this second sorts after it, since
+        #  it is a prefix of them. Within a second, only the names with
+        #  enough microseconds sort after the subsecond name.
+        start = bisect.bisect_left(snapshot_names, first_name)
+        if include_previous:
+            start = max(start - 1, 0)
+        snapshot_names = snapshot_names[start:]
+    return snapshot_names
+
+
+def load_snapshot_palette(config: Config, snapshot_name: str) -> np.ndarray:
+    """
+    Load a progress picture as an array of palette indices.
+
+    :param config: The config the progress picture belongs to.
+    :param snapshot_name: The file name of the progress picture.
+    :return: A (height, width) uint8 array of palette indices.
+    """
+    path = os.path.join(config.picture_dir, snapshot_name)
+    with Image.open(path) as img:
+        return image_to_palette(img)
+
+
+def iterate_snapshots[T](
+        config: Config,
+        snapshot_names: list[str] | None = None,
+        *,
+        loader: typing.Callable[[Config, str], T] = load_snapshot_palette,
+        prefetch: int = DEFAULT_PREFETCH_COUNT,
+) -> typing.Iterator[tuple[str, T]]:
+    """
+    Load progress pictures in chronological order, while the next ones are
+    already decoded in background threads. PNG decoding releases the GIL,
+    so this keeps other cores busy while the caller processes a picture.
+
+    :param config: The config the progress pictures belong to.
+    :param snapshot_names: The file names of the progress pictures to load,
+     in the order to yield them. (Default: all progress pictures)
+    :param loader: The function to load a progress picture with. It is
+     called from a background thread, so it should fully decode the picture.
+     (Default: `load_snapshot_palette`)
+    :param prefetch: The maximum amount of pictures to decode ahead. At most
+     this many decoded pictures are kept besides the yielded one. With 0,
+     pictures are loaded one at a time, without threads.
+    :return: An iterator of each file name and its loaded picture.
+    """
+    if snapshot_names is None:
+        snapshot_names = get_snapshot_names(config)
+    if prefetch <= 0:
+        for name in snapshot_names:
+            yield name, loader(config, name)
+        return
+
+    with ThreadPoolExecutor(max_workers=prefetch) as executor:
+        pending: collections.deque[tuple[str, Future[T]]] = (
+            collections.deque())
+        names = iter(snapshot_names)
+        try:
+            for name in names:
+                pending.append((name, executor.submit(loader, config, name)))
+                if len(pending) == prefetch:
+                    break
+            while len(pending) > 0:
+                name, future = pending.popleft()
+                next_name = next(names, None)
+                if next_name is not None:
+                    pending.append((next_name, executor.submit(
+                        loader, config, next_name)))
+                yield name, future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
+                # ^ Don't decode pictures that won't be used, if the caller
+                #  stopped early.
@@ -0,0 +1,244 @@
+import asyncio
+import contextlib
+import os
+import typing
+from datetime import datetime
+
+import numpy as np
+
+from src.config import Config
+from src.count_pixels import save_remaining_counts
+from src.latest_image_loader import (
+    CHUNK_SIZES,
+    TileFetcher,
+    fetch_pictures,
+    get_grid_coordinates,
+    load_latest_snapshot_hash,
+    new_snapshot_hasher,
+    publish_snapshot_file,
+    save_latest_snapshot_hash,
+    stitch_pictures,
+)
+from src.progress_picture import (
+    add_strip_to_cells,
+    save_regional_progress_counts,
+)
+from src.template_cache import load_compiled_template
+from src.utils.palette_utils import (
+    OUTPUT_COMPRESS_LEVEL,
+    PALETTE,
+    SNAPSHOT_COMPRESS_LEVEL,
+    TRANSPARENT_INDEX,
+    PalettePngWriter,
+    get_color_counts,
+    get_remaining_palette,
+    image_to_palette,
+)
+from src.utils.profiling_utils import PipelineProfiler, measure_stage
+
+__all__ = [
+    "Strip",
+    "get_strips",
+    "save_latest_image_in_strips",
+]
+
+
+class Strip(typing.NamedTuple):
+    start: int
+    end: int
+    # ^ The rows of the config's canvas that the strip covers.
+    coords: list[tuple[int, int]]
+    # ^ The chunks that the strip intersects.
+
+
+def get_strips(config: Config, strip_height: int) -> list[Strip]:
+    """
+    Split a config's canvas into horizontal strips along the chunk rows.
+
+    :param config: The config to split the canvas of.
+    :param strip_height: The maximum height of a strip, in pixels. Must be a
+     multiple of the chunk height (1000).
+    :return: The strips, from top to bottom.
+    """
+    chunk_height = CHUNK_SIZES[1]
+    if strip_height < chunk_height or strip_height % chunk_height != 0:
+        raise ValueError(f"The strip height must be a multiple of "
+                         f"{chunk_height}!")
+    rows_per_strip = strip_height // chunk_height
+    coords = get_grid_coordinates(config.top_left, config.image_size)
+    chunk_rows = sorted({tl_y for _, tl_y in coords})
+    top = config.top_left.TlY * chunk_height + config.top_left.PxY
+    bottom = top + config.image_size[1]
+
+    strips = []
+    for i in range(0, len(chunk_rows), rows_per_strip):
+        rows = chunk_rows[i:i + rows_per_strip]
+        strips.append(Strip(
+            max(top, rows[0] * chunk_height) - top,
+            min(bottom, (rows[-1] + 1) * chunk_height) - top,
+            [coord for coord in coords if coord[1] in rows],
+        ))
+    return strips
+
+
+def _crop_strip(
+        config: Config,
+        strip: Strip,
+        pictures: list[bytes],
+) -> np.ndarray:
+    image = stitch_pictures(strip.coords, pictures)
+    x = config.top_left.PxX
+    y = (
+            config.top_left.PxY + strip.start
+            - (strip.coords[0][1] - config.top_left.TlY) * CHUNK_SIZES[1]
+    )
+    return image_to_palette(image.crop(
+        (x, y, x + config.image_size[0], y + strip.end - strip.start)))
+
+
+async def _save_in_strips(
+        config: Config,
+        ignore_if_identical: bool,
+        strip_height: int,
+        subsecond: bool,
+        profiler: PipelineProfiler | None,
+        fetcher: TileFetcher,
+) -> str | None:
+    template = load_compiled_template(config)
+    width, height = config.image_size
+    cell_size = config.heatmap_cell_size
+    cell_shape = (-(-height // cell_size), -(-width // cell_size))
+
+    previous_hash = None
+    if ignore_if_identical:
+        previous_hash = load_latest_snapshot_hash(config)
+        # ^ Compared to a hash of the new canvas, since decoding the
+        #  previous picture would need the whole canvas in memory. Without
+        #  a saved hash, the canvas is always saved.
+    hasher = new_snapshot_hasher((height, width))
+
+    color_counts = np.zeros(len(PALETTE), dtype=np.int64)
+    goal_cells = np.zeros(cell_shape, dtype=np.int64)
+    remaining_cells = np.zeros(cell_shape, dtype=np.int64)
+    fetched_at: datetime | None = None
+
+    # Everything is written to temporary files first, so that the outputs
+    #  are only replaced once the whole canvas has been processed.
+    output_names = {
+        "snapshot": None,
+        "remainder": config.paths.REMAINING_PIXELS_NAME,
+        "placeable": config.paths.REMAINING_PLACEABLE_PIXELS_NAME,
+        "unplaceable": config.paths.REMAINING_UNPLACEABLE_PIXELS_NAME,
+    }
+    temporary_paths = {
+        key: os.path.join(config.output_dir, f"strip_{key}.png.tmp")
+        for key in output_names
+    }
+    try:
+        with contextlib.ExitStack() as stack:
+            writers = {
+                key: stack.enter_context(PalettePngWriter(
+                    stack.enter_context(open(path, "wb")),
+                    width,
+                    height,
+                    SNAPSHOT_COMPRESS_LEVEL if key == "snapshot"
+                    else OUTPUT_COMPRESS_LEVEL,
+                ))
+                for key, path in temporary_paths.items()
+            }
+            for strip in get_strips(config, strip_height):
+                with measure_stage(profiler, config, "strip") as counters:
+                    pictures = await fetcher(strip.coords)
+                    if fetched_at is None:
+                        fetched_at = datetime.now()
+                    counters.tiles_fetched = len(pictures)
+                    counters.bytes_downloaded = sum(len(i) for i in pictures)
+                    canvas = _crop_strip(config, strip, pictures)
+                    del pictures
+
+                    hasher.update(np.ascontiguousarray(canvas))
+                    template_rows = template.palette[strip.start:strip.end]
+                    remainder = get_remaining_palette(template_rows, canvas)
+                    placeable = template.placeable_colors[remainder]
+
+                    writers["snapshot"].write_rows(canvas)
+                    writers["remainder"].write_rows(remainder)
+                    writers["placeable"].write_rows(np.where(
+                        placeable, remainder, TRANSPARENT_INDEX))
+                    writers["unplaceable"].write_rows(np.where(
+                        placeable, TRANSPARENT_INDEX, remainder))
+
+                    color_counts += np.bincount(remainder.ravel(),
+                                                minlength=len(PALETTE))
+                    add_strip_to_cells(
+                        goal_cells,
+                        template.opacity_mask[strip.start:strip.end],
+                        strip.start, cell_size)
+                    add_strip_to_cells(
+                        remaining_cells, remainder != TRANSPARENT_INDEX,
+                        strip.start, cell_size)
+                    counters.pixels_processed = canvas.size
+    except BaseException:
+        for path in temporary_paths.values():
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+
+    digest = hasher.hexdigest()
+    if digest == previous_hash:
+        for path in temporary_paths.values():
+            os.remove(path)
+        return None
+
+    timestamp = publish_snapshot_file(
+        config, temporary_paths.pop("snapshot"), fetched_at, subsecond)
+    save_latest_snapshot_hash(config, f"{timestamp}.png", digest)
+    for key, path in temporary_paths.items():
+        os.replace(path, os.path.join(config.output_dir, output_names[key]))
+
+    remaining_count = int(color_counts.sum()
+                          - color_counts[TRANSPARENT_INDEX])
+    template_count = int(goal_cells.sum())
+    progress = 1 - remaining_count / template_count
+    print(f"The template has been built for {progress:.2%}.")
+    save_remaining_counts(config, get_color_counts(color_counts),
+                          f"{timestamp}.png")
+    save_regional_progress_counts(config, goal_cells, remaining_cells,
+                                  template.size)
+    return timestamp
+
+
+def save_latest_image_in_strips(
+        config: Config,
+        ignore_if_identical: bool,
+        strip_height: int,
+        *,
+        subsecond: bool = False,
+        profiler: PipelineProfiler | None = None,
+        fetcher: TileFetcher | None = None,
+) -> str | None:
+    """
+    Like `save_latest_image` followed by `save_remainder_images` and
+    `save_pixel_count`, but fetch and process the canvas one horizontal
+    strip of chunk rows at a time. The progress picture and remainder
+    pictures are written strip by strip, so only one strip of the canvas is
+    in memory at once, besides the compiled template.
+
+    :param config: The config for which to get the canvas.
+    :param ignore_if_identical: Don't create a file if the downloaded image is
+     identical to the most recent saved one.
+    :param strip_height: The height of each strip, in pixels. Must be a
+     multiple of the chunk height (1000).
+    :param subsecond: Whether to include microseconds in the name of the
+     saved image.
+    :param profiler: An optional profiler to record each strip with.
+    :param fetcher: The function to get the chunk images with.
+     (Default: `fetch_pictures`)
+    :return: The timestamp of the saved image, or None if
+     **ignore-if_identical** is True and the canvas hasn't changed.
+    """
+    if fetcher is None:
+        fetcher = fetch_pictures
+    return asyncio.run(_save_in_strips(config, ignore_if_identical,
+                                       strip_height, subsecond, profiler,
+                                       fetcher))
@@ -0,0 +1,172 @@
+import asyncio
+from typing import NamedTuple
+
+import numpy as np
+
+from src.config import Config
+from src.latest_image_loader import (
+    crop_image,
+    fetch_pictures,
+    get_grid_coordinates,
+    stitch_pictures,
+)
+from src.template_cache import CompiledTemplate, load_compiled_template
+from src.utils.coord_utils import (
+    WplaceCoordinate,
+    get_bottom_right_corner,
+    offset_coordinate,
+)
+from src.utils.palette_utils import TRANSPARENT_INDEX, image_to_palette
+
+__all__ = [
+    "AlignmentResult",
+    "fetch_search_area",
+    "find_template_offset",
+    "align_template",
+]
+
+
+class AlignmentResult(NamedTuple):
+    top_left: WplaceCoordinate
+    # ^ The top left corner where the template fits best.
+    x_offset: int
+    y_offset: int
+    # ^ How far the best top left corner is from the configured one.
+    match_ratio: float
+    # ^ The fraction of template pixels with the correct color at the best
+    #  offset.
+    peak_ratio: float
+    # ^ How much better the best offset scored than the best offset outside
+    #  its direct neighborhood. Close to 1 means the result is ambiguous.
+
+
+def fetch_search_area(
+        config: Config,
+        margin: int,
+) -> tuple[WplaceCoordinate, np.ndarray]:
+    """
+    Download the configured area of the canvas, plus a margin on each side.
+
+    :param config: The config with the area to download.
+    :param margin: The amount of extra pixels to download on each side.
+    :return: A tuple of the top left corner of the downloaded area and its
+     palette indices.
+    """
+    top_left = offset_coordinate(config.top_left, -margin, -margin)
+    size = (config.image_size[0] + 2 * margin,
+            config.image_size[1] + 2 * margin)
+    bottom_right = get_bottom_right_corner(top_left, size)
+    coords = get_grid_coordinates(top_left, size)
+    pictures = asyncio.run(fetch_pictures(coords))
+    canvas = crop_image(stitch_pictures(coords, pictures),
+                        top_left, bottom_right)
+    return top_left, image_to_palette(canvas)
+
+
+def _correlate(
+        canvas_spectra: dict[int, np.ndarray],
+        template_channels: dict[int, np.ndarray],
+        shape: tuple[int, int],
+) -> np.ndarray:
+    """
+    Sum the cross-correlations of every channel, using FFTs of the size of
+    the canvas. Offsets where the template fits inside the canvas never wrap
+    around, so they are equal to a direct (non-circular) correlation.
+    """
+    total_spectrum = np.zeros((shape[0], shape[1] // 2 + 1),
+                              dtype=np.complex128)
+    for key, template_channel in template_channels.items():
+        template_spectrum = np.fft.rfft2(template_channel, s=shape)
+        total_spectrum += canvas_spectra[key] * np.conj(template_spectrum)
+    return np.fft.irfft2(total_spectrum, s=shape)
+
+
+def find_template_offset(
+        template: CompiledTemplate,
+        canvas: np.ndarray,
+        max_colors: int = 8,
+) -> tuple[int, int, float, float]:
+    """
+    Find where the template fits best in a (larger) canvas, by
+    cross-correlating the template's most common colors with the canvas.
+
+    :param template: The compiled template.
+    :param canvas: The palette indices of the canvas to search in. Must be
+     at least as large as the template.
+    :param max_colors: The amount of template colors to correlate. Fewer
+     colors is faster; all colors is the most accurate.
+    :return: A tuple of the best x and y position of the template within the
+     canvas, the fraction of matching template pixels at that position,
+     and the peak ratio (see `AlignmentResult`).
+    """
+    template_height, template_width = template.palette.shape
+    canvas_height, canvas_width = canvas.shape
+    if canvas_height < template_height or canvas_width < template_width:
+        raise ValueError("The canvas must be at least as large as the "
+                         "template!")
+
+    colors = [
+        index for index in np.argsort(
+            np.bincount(template.palette.ravel()))[::-1]
+        if index != TRANSPARENT_INDEX
+    ][:max_colors]
+    template_channels = {
+        int(index): (template.palette == index).astype(np.float64)
+        for index in colors
+    }
+    canvas_spectra = {
+        int(index): np.fft.rfft2((canvas == index).astype(np.float64))
+        for index in colors
+    }
+
+    correlation = _correlate(canvas_spectra, template_channels, canvas.shape)
+    valid = correlation[:canvas_height - template_height + 1,
+                        :canvas_width - template_width + 1]
+    best_y, best_x = np.unravel_index(np.argmax(valid), valid.shape)
+
+    # Compare to the best score outside the peak's direct neighborhood.
+    others = valid.copy()
+    others[max(best_y - 2, 0):best_y + 3, max(best_x - 2, 0):best_x + 3] = 0
+    second_best = others.max() if others.size > 0 else 0
+    peak_ratio = (
+        float(valid[best_y, best_x] / second_best)
+        if second_best > 0.5 else float("inf")
+    )
+
+    # Count exact matches at the best position, across all colors.
+    window = canvas[best_y:best_y + template_height,
+                    best_x:best_x + template_width]
+    matches = np.count_nonzero(
+        (window == template.palette) & template.opacity_mask)
+    template_count = np.count_nonzero(template.opacity_mask)
+    match_ratio = (
+        float(matches / template_count) if template_count > 0 else 0.0)
+    return int(best_x), int(best_y), match_ratio, peak_ratio
+
+
+def align_template(
+        config: Config,
+        margin: int = 20,
+        max_colors: int = 8,
+) -> AlignmentResult:
+    """
+    Find the top left corner where the template matches the canvas best,
+    within a margin around the configured top left corner.
+
+    :param config: The config to align.
+    :param margin: How many pixels the configured top left corner may be
+     off in each direction.
+    :param max_colors: The amount of template colors to correlate.
+    :return: The best top left corner and how confident the match is.
+    """
+    template = load_compiled_template(config)
+    area_top_left, canvas = fetch_search_area(config, margin)
+    x, y, match_ratio, peak_ratio = find_template_offset(
+        template, canvas, max_colors)
+    return AlignmentResult(
+        offset_coordinate(area_top_left, x, y),
+        x - margin,
+        y - margin,
+        match_ratio,
+        peak_ratio,
+    )
@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os.path
+
+import numpy as np
+from PIL import Image
+
+from src.config import Config
+from src.utils.color_utils import ColorName
+from src.utils.palette_utils import (
+    PALETTE,
+    TRANSPARENT_INDEX,
+    count_palette,
+    get_color_index_mask,
+    palette_to_image,
+    snap_image_to_palette,
+)
+
+__all__ = [
+    "CompiledTemplate",
+    "load_compiled_template",
+]
+
+
+class CompiledTemplate:
+    """
+    A preprocessed template image, so that consumers don't need to decode
+    and count the template image every time they need it.
+    """
+    palette: np.ndarray
+    # ^ (height, width) uint8 array of palette indices.
+    opacity_mask: np.ndarray
+    # ^ (height, width) bool array; True for pixels that should be placed.
+    placeable_colors: np.ndarray
+    # ^ bool array for every palette index; True for free and bought colors.
+    goal_counts: dict[ColorName, int]
+    snapped_pixel_count: int
+    # ^ The amount of template pixels that weren't exactly a wplace color,
+    #  and were changed to the nearest one.
+
+    def __init__(
+            self,
+            palette: np.ndarray,
+            placeable_colors: np.ndarray,
+            opacity_mask: np.ndarray | None = None,
+            snapped_pixel_count: int = 0,
+    ) -> None:
+        self.palette = palette
+        self.placeable_colors = placeable_colors
+        self.snapped_pixel_count = snapped_pixel_count
+        if opacity_mask is None:
+            opacity_mask = palette != TRANSPARENT_INDEX
+        self.opacity_mask = opacity_mask
+        self.goal_counts = count_palette(palette)
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self.palette.shape[1], self.palette.shape[0]
+
+    @property
+    def pixel_count(self) -> int:
+        return sum(self.goal_counts.values())
+
+    @property
+    def placeable_goal_counts(self) -> dict[ColorName, int]:
+        return {
+            color_name: count
+            for color_name, count in self.goal_counts.items()
+            if self.placeable_colors[PALETTE.index(color_name)]
+        }
+
+    @property
+    def unplaceable_goal_counts(self) -> dict[ColorName, int]:
+        return {
+            color_name: count
+            for color_name, count in self.goal_counts.items()
+            if not self.placeable_colors[PALETTE.index(color_name)]
+        }
+
+    def get_image(self) -> Image.Image:
+        return palette_to_image(self.palette)
+
+    def get_hash(self) -> str:
+        """
+        :return: A hash of the template's pixels, to tell if data that was
+         derived from the template is outdated.
+        """
+        return hashlib.sha256(self.palette.tobytes()).hexdigest()
+
+
+# Keeps the templates that have been loaded in this process, so that a
+#  command that needs the template twice only checks the file hash again.
+_loaded_templates: dict[str, tuple[str, CompiledTemplate]] = {}
+
+
+def _get_template_path(config: Config) -> str:
+    return os.path.join(config.data_directory, config.paths.TEMPLATE_NAME)
+
+
+def _get_fingerprint(config: Config) -> str:
+    """
+    Get a string that changes whenever the compiled template would change:
+    when the template file is edited or the bought colors change.
+    """
+    template_path = _get_template_path(config)
+    if not os.path.exists(template_path):
+        # Raise the usual error message.
+        config.get_template_image()
+    with open(template_path, "rb") as f:
+        template_hash = hashlib.sha256(f.read()).hexdigest()
+    return json.dumps({
+        "template": template_hash,
+        "bought_colors": sorted(config.bought_colors),
+        "alpha_threshold": config.template_alpha_threshold,
+        "perceptual": config.perceptual_color_matching,
+    })
+
+
+def _compile_template(config: Config) -> CompiledTemplate:
+    template = config.get_template_image()
+    palette, snapped_pixel_count = snap_image_to_palette(
+        template,
+        config.template_alpha_threshold,
+        config.perceptual_color_matching,
+    )
+    if snapped_pixel_count > 0:
+        print(
+            f"Changed {snapped_pixel_count} template pixel(s) to the "
+            f"nearest wplace color, because they weren't exactly a wplace "
+            f"color or were semi-transparent."
+        )
+    return CompiledTemplate(
+        palette,
+        get_color_index_mask(config.available_colors),
+        snapped_pixel_count=snapped_pixel_count,
+    )
+
+
+def _read_cache(path: str, fingerprint: str) -> CompiledTemplate | None:
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as cache:
+            if str(cache["fingerprint"]) != fingerprint:
+                return None
+            return CompiledTemplate(
+                cache["palette"],
+                cache["placeable_colors"],
+                cache["opacity_mask"],
+                int(cache["snapped_pixel_count"]),
+            )
+    except (OSError, KeyError, ValueError):
+        # Broken or outdated cache file; it will be overwritten.
+        return None
+
+
+def _write_cache(
+        path: str,
+        fingerprint: str,
+        template: CompiledTemplate,
+) -> None:
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as f:
+        np.savez(
+            f,
+            fingerprint=np.array(fingerprint),
+            palette=template.palette,
+            opacity_mask=template.opacity_mask,
+            placeable_colors=template.placeable_colors,
+            snapped_pixel_count=np.array(template.snapped_pixel_count),
+        )
+    os.replace(temporary_path, path)
+
+
+def load_compiled_template(config: Config) -> CompiledTemplate:
+    """
+    Load the compiled template of a config. The template is only decoded
+    again if the template file or the config's bought colors have changed
+    since the last time it was compiled.
+
+    :param config: The config to load the template for.
+    :return: The compiled template.
+    """
+    fingerprint = _get_fingerprint(config)
+    cache_path = os.path.join(config.data_directory,
+                              config.paths.TEMPLATE_CACHE_NAME)
+
+    loaded = _loaded_templates.get(cache_path)
+    if loaded is not None and loaded[0] == fingerprint:
+        return loaded[1]
+
+    template = _read_cache(cache_path, fingerprint)
+    if template is None:
+        template = _compile_template(config)
+        _write_cache(cache_path, fingerprint, template)
+
+    _loaded_templates[cache_path] = (fingerprint, template)
+    return template
@@ -0,0 +1,168 @@
+import bisect
+import hashlib
+import json
+import os.path
+import time
+from typing import TypedDict
+
+from src.latest_image_loader import TileFetcher, fetch_pictures
+
+__all__ = [
+    "ArchiveEntry",
+    "TileRecorder",
+    "TileReplayer",
+]
+
+
+ARCHIVE_MANIFEST_NAME = "manifest.jsonl"
+
+
+class ArchiveEntry(TypedDict):
+    unix_time: float
+    # ^ When the chunk was received. All chunks of one fetch share this time,
+    #  which identifies the fetch when replaying.
+    tile: tuple[int, int]
+    file: str
+    # ^ The file name of the chunk image, relative to the archive directory.
+
+
+class TileRecorder:
+    """
+    A chunk fetcher that passes every request on to another fetcher, and
+    saves the responses in an archive directory, for `TileReplayer`.
+
+    Chunk images are saved under their content hash, so chunks that didn't
+    change between fetches are only saved once. Every fetched chunk is
+    appended to a manifest file.
+    """
+    def __init__(
+            self,
+            directory: str,
+            fetcher: TileFetcher | None = None,
+            run_time: float | None = None,
+    ) -> None:
+        """
+        :param directory: The archive directory to save the chunks in.
+        :param fetcher: The fetcher to record. (Default: download from
+         wplace)
+        :param run_time: The time to record every chunk with, so that the
+         chunks of all configs fetched in one run are replayed as one fetch.
+         (Default: the time each request was received)
+        """
+        self.directory = directory
+        self.fetcher = fetcher
+        self.run_time = run_time
+        os.makedirs(directory, exist_ok=True)
+
+    async def __call__(self, coords: list[tuple[int, int]]) -> list[bytes]:
+        fetcher = fetch_pictures if self.fetcher is None else self.fetcher
+        pictures = await fetcher(coords)
+        self.record(coords, pictures,
+                    time.time() if self.run_time is None else self.run_time)
+        return pictures
+
+    def record(
+            self,
+            coords: list[tuple[int, int]],
+            pictures: list[bytes],
+            unix_time: float,
+    ) -> None:
+        """
+        Save fetched chunks to the archive.
+
+        :param coords: The coordinates of each chunk.
+        :param pictures: The image data of each chunk.
+        :param unix_time: When the chunks were received.
+        """
+        lines = []
+        for tile, picture in zip(coords, pictures):
+            file_name = hashlib.sha1(picture).hexdigest() + ".png"
+            path = os.path.join(self.directory, file_name)
+            if not os.path.exists(path):
+                with open(path, "wb") as f:
+                    f.write(picture)
+            entry: ArchiveEntry = {
+                "unix_time": unix_time,
+                "tile": tile,
+                "file": file_name,
+            }
+            lines.append(json.dumps(entry) + "\n")
+        manifest_path = os.path.join(self.directory, ARCHIVE_MANIFEST_NAME)
+        with open(manifest_path, "a") as f:
+            f.write("".join(lines))
+
+
+class TileReplayer:
+    """
+    A chunk fetcher that serves chunks from an archive made by
+    `TileRecorder`, as they were at the archive time `self.time`, instead
+    of downloading them.
+    """
+    times: list[float]
+    # ^ The sorted times at which chunks were recorded.
+
+    def __init__(self, directory: str) -> None:
+        """
+        :param directory: The archive directory to replay.
+        """
+        self.directory = directory
+        manifest_path = os.path.join(directory, ARCHIVE_MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(
+                f"No recorded chunks found! Expected a manifest at "
+                f"`{manifest_path}`. Record chunks with `--record` first."
+            )
+
+        recordings: dict[tuple[int, int], list[tuple[float, str]]] = {}
+        with open(manifest_path, "r") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # unfinished last line
+                entry: ArchiveEntry = json.loads(line)
+                tl_x, tl_y = entry["tile"]
+                recordings.setdefault((tl_x, tl_y), []).append(
+                    (entry["unix_time"], entry["file"]))
+        for tile_recordings in recordings.values():
+            tile_recordings.sort()
+        self._recordings = recordings
+        self._pictures: dict[str, bytes] = {}
+
+        self.times = sorted({
+            unix_time
+            for tile_recordings in recordings.values()
+            for unix_time, _ in tile_recordings
+        })
+        if len(self.times) == 0:
+            raise ValueError(f"The archive at `{directory}` is empty!")
+        self.time = self.times[0]
+
+    def get_times(self, coords: list[tuple[int, int]]) -> list[float]:
+        """
+        :return: The sorted times at which any of the given chunks were
+         recorded, which are the fetches of a config with these chunks.
+        """
+        return sorted({
+            unix_time
+            for tile in coords
+            for unix_time, _ in self._recordings.get(tile, [])
+        })
+
+    def get_picture(self, tile: tuple[int, int]) -> bytes:
+        """
+        :return: The most recent recording of a chunk at `self.time`, or its
+         first recording if it was only recorded later.
+        """
+        if tile not in self._recordings:
+            raise KeyError(
+                f"Chunk {tile[0]},{tile[1]} was never recorded!")
+        tile_recordings = self._recordings[tile]
+        index = bisect.bisect_right(tile_recordings, self.time,
+                                    key=lambda recording: recording[0])
+        _, file_name = tile_recordings[max(index - 1, 0)]
+        if file_name not in self._pictures:
+            with open(os.path.join(self.directory, file_name), "rb") as f:
+                self._pictures[file_name] = f.read()
+        return self._pictures[file_name]
+
+    async def __call__(self, coords: list[tuple[int, int]]) -> list[bytes]:
+        return [self.get_picture(tile) for tile in coords]
@@ -0,0 +1,219 @@
+import argparse
+import json
+import os.path
+
+import numpy as np
+
+from src.config import load_config, Config
+from src.snapshot_history import get_snapshot_names, load_snapshot_palette
+from src.template_cache import load_compiled_template
+from src.utils.palette_utils import (
+    TRANSPARENT_INDEX,
+    get_remaining_palette,
+    save_palette_image,
+)
+
+__all__ = [
+    "TILE_SIZE",
+    "get_level_count",
+    "build_tile_pyramid",
+    "update_tile_pyramids",
+]
+
+
+TILE_SIZE = 256
+PYRAMID_VERSION = 2
+PYRAMID_METADATA_NAME = "pyramid.json"
+PYRAMID_BASE_NAME = "base.npy"
+# ^ The raw palette indices the pyramids were last built from, to find the
+#  changed pixels without decoding the previous progress picture.
+
+
+def get_level_count(size: tuple[int, int]) -> int:
+    """
+    :param size: The width and height of the full image.
+    :return: The amount of zoom levels needed until the whole image fits in
+     one tile.
+    """
+    levels = 1
+    while TILE_SIZE * 2 ** (levels - 1) < max(size):
+        levels += 1
+    return levels
+
+
+def _get_dirty_tiles(
+        changed: np.ndarray | None,
+        level_shape: tuple[int, int],
+        step: int,
+) -> np.ndarray:
+    """
+    Find the tiles of a zoom level that contain a changed pixel.
+
+    :param changed: A full-size bool array of changed pixels, or None if
+     everything changed.
+    :param level_shape: The shape of the zoom level.
+    :param step: The distance between the full-size pixels that the zoom
+     level samples.
+    :return: A (rows, columns) bool array; True for tiles to rebuild.
+    """
+    rows = -(-level_shape[0] // TILE_SIZE)  # ceil division
+    columns = -(-level_shape[1] // TILE_SIZE)
+    if changed is None:
+        return np.ones((rows, columns), dtype=bool)
+    padded = np.zeros((rows * TILE_SIZE, columns * TILE_SIZE), dtype=bool)
+    padded[:level_shape[0], :level_shape[1]] = changed[::step, ::step]
+    # ^ Only pixels that the zoom level samples can change it.
+    return padded.reshape(rows, TILE_SIZE, columns, TILE_SIZE).any(
+        axis=(1, 3))
+
+
+def build_tile_pyramid(
+        palette: np.ndarray,
+        directory: str,
+        changed: np.ndarray | None = None,
+) -> int:
+    """
+    Save an image as a pyramid of `TILE_SIZE` tiles at every zoom level, as
+    `{directory}/{zoom}/{x}/{y}.png`. The highest zoom level is the full
+    image, and every lower level is half as large. Levels are downsampled by
+    taking every other pixel (nearest neighbor), so every pixel keeps an
+    exact wplace color.
+
+    :param palette: The palette indices of the full image.
+    :param directory: The directory to save the tiles in.
+    :param changed: A bool array of the pixels that changed since the
+     pyramid was last built. Only tiles with a changed pixel are saved
+     again. (Default: save all tiles)
+    :return: The amount of tiles that were saved.
+    """
+    height, width = palette.shape
+    levels = get_level_count((width, height))
+    saved_count = 0
+    for zoom in range(levels):
+        step = 2 ** (levels - 1 - zoom)
+        level = palette[::step, ::step]
+        for tile_y, tile_x in np.argwhere(
+                _get_dirty_tiles(changed, level.shape, step)):
+            part = level[tile_y * TILE_SIZE:(tile_y + 1) * TILE_SIZE,
+                         tile_x * TILE_SIZE:(tile_x + 1) * TILE_SIZE]
+            tile = np.full((TILE_SIZE, TILE_SIZE), TRANSPARENT_INDEX,
+                           dtype=np.uint8)
+            tile[:part.shape[0], :part.shape[1]] = part
+            tile_directory = os.path.join(directory, str(zoom), str(tile_x))
+            os.makedirs(tile_directory, exist_ok=True)
+            save_palette_image(tile,
+                               os.path.join(tile_directory, f"{tile_y}.png"))
+            saved_count += 1
+    return saved_count
+
+
+def _load_metadata(path: str) -> dict | None:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        metadata = json.load(f)
+    if metadata.get("version") != PYRAMID_VERSION:
+        return None
+    return metadata
+
+
+def _write_atomically(path: str, write) -> None:
+    """
+    Write a file through a temporary file, so that an interrupted run never
+    leaves a partially written file behind.
+    """
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as f:
+        write(f)
+    os.replace(temporary_path, path)
+
+
+def update_tile_pyramids(
+        config: Config,
+        snapshot_name: str,
+        snapshot: np.ndarray | None = None,
+        remainder: np.ndarray | None = None,
+) -> int:
+    """
+    Update the tile pyramids of a progress picture and its remaining pixels
+    in the output directory. Only tiles where the progress picture differs
+    from the one the pyramids were last built from are saved again.
+
+    :param config: The config to update the pyramids of.
+    :param snapshot_name: The file name of the new progress picture.
+    :param snapshot: The palette indices of the progress picture, if they
+     are still in memory. (Default: load the progress picture)
+    :param remainder: The palette indices of its remaining pixels, if they
+     are still in memory. (Default: compare the progress picture to the
+     template)
+    :return: The amount of tiles that were saved.
+    """
+    template = load_compiled_template(config)
+    if snapshot is None:
+        snapshot = load_snapshot_palette(config, snapshot_name)
+    if remainder is None:
+        remainder = get_remaining_palette(template.palette, snapshot)
+    # ^ The remainder only changes where the progress picture changes, as
+    #  long as the template stays the same.
+
+    root = os.path.join(config.output_dir,
+                        config.paths.TILE_PYRAMID_DIRECTORY)
+    os.makedirs(root, exist_ok=True)
+    metadata_path = os.path.join(root, PYRAMID_METADATA_NAME)
+    base_path = os.path.join(root, PYRAMID_BASE_NAME)
+    metadata = _load_metadata(metadata_path)
+    template_hash = template.get_hash()
+
+    changed = None
+    if (
+            metadata is not None
+            and metadata["template_hash"] == template_hash
+            and os.path.exists(base_path)
+    ):
+        previous = np.load(base_path, mmap_mode="r")
+        if previous.shape == snapshot.shape:
+            changed = previous != snapshot
+        del previous
+        # ^ Closes the memory map before the file is replaced.
+
+    saved_count = (
+            build_tile_pyramid(snapshot, os.path.join(root, "snapshot"),
+                               changed)
+            + build_tile_pyramid(remainder, os.path.join(root, "remainder"),
+                                 changed)
+    )
+    height, width = snapshot.shape
+    _write_atomically(base_path, lambda f: np.save(f, snapshot))
+    _write_atomically(metadata_path, lambda f: f.write(json.dumps({
+        "version": PYRAMID_VERSION,
+        "snapshot": snapshot_name,
+        "template_hash": template_hash,
+        "width": width,
+        "height": height,
+        "tile_size": TILE_SIZE,
+        "levels": get_level_count((width, height)),
+    }, indent=2).encode()))
+    # ^ The base is replaced first, so the metadata never describes a base
+    #  that wasn't written.
+    return saved_count
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Build zoomable tile pyramids of the latest progress "
+                    "picture and its remaining pixels."
+    )
+    arg_parser.add_argument(
+        "config",
+        type=str,
+        help="The config to build the tile pyramids of."
+    )
+
+    args = arg_parser.parse_args()
+    pyramid_config = load_config(args.config)
+    snapshot_names = get_snapshot_names(pyramid_config)
+    if len(snapshot_names) == 0:
+        raise FileNotFoundError("No progress pictures found! Run "
+                                "`fetch_latest_picture.py` first.")
+    count = update_tile_pyramids(pyramid_config, snapshot_names[-1])
+    print(f"Saved {count} pyramid tile(s).")
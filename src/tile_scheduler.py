@@ -0,0 +1,205 @@
+import hashlib
+import json
+import math
+import os.path
+from typing import TypedDict
+
+__all__ = [
+    "TileState",
+    "TileScheduler",
+]
+
+
+TILE_SCHEDULE_PATH = "tile_schedule.json"
+
+
+class TileState(TypedDict):
+    content_hash: str | None
+    last_fetch_time: float | None
+    last_change_time: float | None
+    change_rate: float
+    # ^ Estimate of the amount of changes per second.
+    fetch_weight: float
+    change_weight: float
+    time_weight: float
+    # ^ Decaying sums of the amount of fetches, the amount of fetches that
+    #  saw a change and the seconds between fetches.
+    interval: float
+    # ^ Seconds to wait after the last fetch before fetching again.
+    fetch_count: int
+    change_count: int
+
+
+class TileScheduler:
+    """
+    Decide how often to fetch each chunk (tile), based on how often it
+    changed in the past. Tiles that change often are fetched at
+    `min_interval`, tiles that never change at `max_interval`.
+
+    The most recently fetched copy of every tile is kept, so a canvas can be
+    assembled from the freshest tiles without fetching all of them.
+    """
+    def __init__(
+            self,
+            min_interval: float = 60,
+            max_interval: float = 1800,
+            half_life: float = 3600,
+            changes_per_fetch: float = 1.0,
+            schedule_path: str = TILE_SCHEDULE_PATH,
+    ) -> None:
+        """
+        :param min_interval: The shortest time between two fetches of a
+         tile, in seconds.
+        :param max_interval: The longest time between two fetches of a
+         tile, in seconds.
+        :param half_life: How long it takes before an observed change counts
+         half as much towards a tile's change rate, in seconds.
+        :param changes_per_fetch: How many changes a tile may get between
+         two fetches, on average. Lower values fetch active tiles more often.
+        :param schedule_path: The file to save the tile states in, so that
+         they survive a restart.
+        """
+        if min_interval <= 0 or max_interval < min_interval:
+            raise ValueError("Intervals must be positive, and the minimum "
+                             "interval can't be larger than the maximum!")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.decay = math.log(2) / half_life
+        self.changes_per_fetch = changes_per_fetch
+        self.schedule_path = schedule_path
+        self.states: dict[tuple[int, int], TileState] = {}
+        self.tiles: dict[tuple[int, int], bytes] = {}
+        self._load()
+
+    # region Saving and loading
+    def _load(self) -> None:
+        if not os.path.exists(self.schedule_path):
+            return
+        with open(self.schedule_path, "r") as f:
+            saved: dict[str, TileState] = json.load(f)
+        for key, state in saved.items():
+            tl_x, tl_y = key.split(",")
+            state["interval"] = self._clamp(state["interval"])
+            self.states[(int(tl_x), int(tl_y))] = state
+
+    def save(self) -> None:
+        temporary_path = self.schedule_path + ".tmp"
+        with open(temporary_path, "w") as f:
+            json.dump({
+                f"{tile[0]},{tile[1]}": state
+                for tile, state in self.states.items()
+            }, f)
+        os.replace(temporary_path, self.schedule_path)
+    # endregion Saving and loading
+
+    def _clamp(self, interval: float) -> float:
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def _get_state(self, tile: tuple[int, int]) -> TileState:
+        if tile not in self.states:
+            self.states[tile] = {
+                "content_hash": None,
+                "last_fetch_time": None,
+                "last_change_time": None,
+                "change_rate": 0.0,
+                "fetch_weight": 0.0,
+                "change_weight": 0.0,
+                "time_weight": 0.0,
+                "interval": self.min_interval,
+                "fetch_count": 0,
+                "change_count": 0,
+            }
+        return self.states[tile]
+
+    @staticmethod
+    def _estimate_change_rate(state: TileState) -> float:
+        """
+        Estimate the amount of changes per second from how many fetches saw
+        a change. A fetch only tells whether the tile changed, not how often,
+        so simply dividing the changes by the time would never estimate more
+        than one change per fetch, and busy tiles would never be fetched
+        more often. This assumes changes arrive randomly (Poisson) and uses
+        the bias-reduced estimator of Cho & Garcia-Molina.
+        """
+        if state["time_weight"] <= 0:
+            return 0.0
+        unchanged_ratio = (
+                (state["fetch_weight"] - state["change_weight"] + 0.5)
+                / (state["fetch_weight"] + 0.5)
+        )
+        mean_interval = state["time_weight"] / state["fetch_weight"]
+        return -math.log(unchanged_ratio) / mean_interval
+
+    def get_next_fetch_time(self, tile: tuple[int, int]) -> float:
+        """
+        :return: The unix time at which the tile should be fetched next.
+        """
+        state = self._get_state(tile)
+        if state["last_fetch_time"] is None or tile not in self.tiles:
+            return 0  # fetch as soon as possible
+        return state["last_fetch_time"] + state["interval"]
+
+    def get_due_tiles(
+            self,
+            tiles: list[tuple[int, int]],
+            now: float,
+    ) -> list[tuple[int, int]]:
+        """
+        :param tiles: The tiles to check.
+        :param now: The current unix time.
+        :return: The tiles that should be fetched now.
+        """
+        return [
+            tile for tile in tiles
+            if self.get_next_fetch_time(tile) <= now
+        ]
+
+    def record_fetch(
+            self,
+            tile: tuple[int, int],
+            data: bytes,
+            now: float,
+    ) -> bool:
+        """
+        Store a freshly fetched tile, and update its polling interval.
+
+        :param tile: The coordinates of the tile.
+        :param data: The tile's image data.
+        :param now: The unix time at which the tile was fetched.
+        :return: True if the tile changed since its previous fetch (or has
+         never been fetched before), else False.
+        """
+        state = self._get_state(tile)
+        content_hash = hashlib.sha1(data).hexdigest()
+        changed = content_hash != state["content_hash"]
+
+        if state["last_fetch_time"] is not None:
+            elapsed = max(now - state["last_fetch_time"], 0)
+            # Older fetches count less, so the estimate follows tiles that
+            #  become more or less active.
+            weight = math.exp(-self.decay * elapsed)
+            state["fetch_weight"] = state["fetch_weight"] * weight + 1
+            state["change_weight"] = (
+                    state["change_weight"] * weight + changed)
+            state["time_weight"] = state["time_weight"] * weight + elapsed
+            if changed:
+                state["change_count"] += 1
+                state["last_change_time"] = now
+            state["change_rate"] = self._estimate_change_rate(state)
+            if state["change_rate"] > 0:
+                interval = self.changes_per_fetch / state["change_rate"]
+            else:
+                interval = self.max_interval
+            state["interval"] = self._clamp(interval)
+
+        state["content_hash"] = content_hash
+        state["last_fetch_time"] = now
+        state["fetch_count"] += 1
+        self.tiles[tile] = data
+        return changed
+
+    def get_tile(self, tile: tuple[int, int]) -> bytes:
+        """
+        :return: The most recently fetched copy of a tile.
+        """
+        return self.tiles[tile]
@@ -1,5 +1,7 @@
 from typing import NamedTuple
 
+import numpy as np
+
 
 class WplaceCoordinate(NamedTuple):
     TlX: int
@@ -44,6 +46,80 @@ def get_bottom_right_corner(
     return coords
 
 
+def offset_coordinate(
+        coord: WplaceCoordinate,
+        x_offset: int,
+        y_offset: int,
+) -> WplaceCoordinate:
+    """
+    Move a coordinate by a number of pixels, crossing chunk borders if
+    needed.
+
+    :param coord: The coordinate to move.
+    :param x_offset: The amount of pixels to move right (or left, if
+     negative).
+    :param y_offset: The amount of pixels to move down (or up, if negative).
+    :return: A new wplace coordinate.
+    """
+    x = coord.TlX * 1000 + coord.PxX + x_offset
+    y = coord.TlY * 1000 + coord.PxY + y_offset
+    return WplaceCoordinate(x // 1000, y // 1000, x % 1000, y % 1000)
+
+
+class WplaceCoordinates(NamedTuple):
+    """
+    Many wplace coordinates at once, as one array per part.
+    """
+    TlX: np.ndarray
+    TlY: np.ndarray
+    PxX: np.ndarray
+    PxY: np.ndarray
+
+
+def offset_coordinates(
+        coord: WplaceCoordinate,
+        x_offsets: np.ndarray,
+        y_offsets: np.ndarray,
+) -> WplaceCoordinates:
+    """
+    Like `offset_coordinate`, but move a coordinate by many offsets at once,
+    such as the canvas positions of pixels to get their wplace coordinates.
+
+    :param coord: The coordinate to move, like the top left corner of a
+     config.
+    :param x_offsets: The amounts of pixels to move right.
+    :param y_offsets: The amounts of pixels to move down.
+    :return: The wplace coordinate of every offset.
+    """
+    xs = np.asarray(x_offsets, dtype=np.int64) + (coord.TlX * 1000
+                                                  + coord.PxX)
+    ys = np.asarray(y_offsets, dtype=np.int64) + (coord.TlY * 1000
+                                                  + coord.PxY)
+    tl_x, px_x = np.divmod(xs, 1000)
+    tl_y, px_y = np.divmod(ys, 1000)
+    return WplaceCoordinates(tl_x, tl_y, px_x, px_y)
+
+
+def get_canvas_positions(
+        coords: WplaceCoordinates,
+        *,
+        top_left: WplaceCoordinate,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Convert many wplace coordinates to positions relative to a top left
+    corner at once. The reverse of `offset_coordinates`.
+
+    :param coords: The wplace coordinates to convert.
+    :param top_left: The top left corner of the canvas.
+    :return: The x and y positions on the canvas.
+    """
+    xs = ((np.asarray(coords.TlX, dtype=np.int64) - top_left.TlX) * 1000
+          + coords.PxX - top_left.PxX)
+    ys = ((np.asarray(coords.TlY, dtype=np.int64) - top_left.TlY) * 1000
+          + coords.PxY - top_left.PxY)
+    return xs, ys
+
+
 def get_canvas_size(
         top_left: WplaceCoordinate,
         bottom_right: WplaceCoordinate,
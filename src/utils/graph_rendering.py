@@ -0,0 +1,299 @@
+import html
+import typing
+from datetime import datetime
+from typing import Literal, NamedTuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+__all__ = [
+    "GraphRenderer",
+    "GRAPH_RENDERERS",
+    "GraphSeries",
+    "get_pyplot",
+    "render_graph_image",
+    "render_graph_svg",
+]
+
+
+type GraphRenderer = Literal[
+    "matplotlib",
+    # ^ The full matplotlib figure.
+    "pil",
+    # ^ A PNG drawn directly with Pillow, without importing matplotlib.
+    "svg",
+    # ^ An SVG file written directly, without importing matplotlib.
+]
+GRAPH_RENDERERS: tuple[GraphRenderer, ...] = typing.get_args(
+    GraphRenderer.__value__)
+
+GRAPH_SIZE = (640, 480)
+# ^ The same size as a default matplotlib figure.
+MARGINS = (70, 30, 50, 70)
+# ^ The left, top, right and bottom space around the plot, for the labels.
+TICK_COUNT = 5
+VALUE_PADDING = 0.05
+# ^ The space above and below the lines, as a fraction of their value range.
+GRID_COLOR = (200, 200, 200)
+TEXT_COLOR = (0, 0, 0)
+
+
+class GraphSeries(NamedTuple):
+    label: str
+    values: np.ndarray
+    # ^ One value per time. NaN values are not drawn.
+    color: tuple[int, int, int]
+    dotted: bool
+
+
+def get_pyplot():
+    """
+    Import pyplot only when a matplotlib graph is made, since importing it
+    is slow. The non-interactive Agg backend is used, so no GUI backend is
+    loaded and graphs can be made without a display.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib import pyplot
+    return pyplot
+
+
+def _get_drawn_series(series: list[GraphSeries]) -> list[GraphSeries]:
+    return [s for s in series if s.label != "Transparent"]
+    # ^ Transparent pixels aren't a color to place, so they're not drawn.
+
+
+def _get_value_range(series: list[GraphSeries]) -> tuple[float, float]:
+    values = [s.values for s in series if np.isfinite(s.values).any()]
+    if len(values) == 0:
+        return 0, 1
+    low = min(float(np.nanmin(v)) for v in values)
+    high = max(float(np.nanmax(v)) for v in values)
+    if low == high:
+        return low - 1, high + 1
+    padding = (high - low) * VALUE_PADDING
+    return low - padding, high + padding
+
+
+def _get_points(
+        times: np.ndarray,
+        values: np.ndarray,
+        as_step: bool,
+) -> tuple[np.ndarray, np.ndarray]:
+    if not as_step or len(times) < 2:
+        return times, values
+    # A step graph holds each value until the next time ("post").
+    step_times = np.repeat(times, 2)[1:]
+    step_values = np.repeat(values, 2)[:-1]
+    return step_times, step_values
+
+
+def _split_finite_runs(
+        xs: np.ndarray,
+        ys: np.ndarray,
+) -> list[tuple[np.ndarray, np.ndarray]]:
+    """
+    Split a line at its NaN values, since those points aren't drawn.
+    """
+    finite = np.isfinite(ys)
+    if finite.all():
+        return [(xs, ys)]
+    edges = np.flatnonzero(np.diff(finite.astype(np.int8)))
+    bounds = np.concatenate([[0], edges + 1, [len(ys)]])
+    return [
+        (xs[start:end], ys[start:end])
+        for start, end in zip(bounds[:-1], bounds[1:])
+        if finite[start]
+    ]
+
+
+class _Layout:
+    """
+    Converts times and values to pixel positions inside the plot area.
+    Without any times, only the value axis has ticks.
+    """
+    def __init__(
+            self,
+            times: np.ndarray,
+            value_range: tuple[float, float],
+            size: tuple[int, int],
+    ) -> None:
+        left, top, right, bottom = MARGINS
+        self.left, self.top = left, top
+        self.right, self.bottom = size[0] - right, size[1] - bottom
+        self.has_times = len(times) > 0
+        self.time_range = (
+            (float(times.min()), float(times.max())) if self.has_times
+            else (0.0, 1.0)
+        )
+        if self.time_range[0] == self.time_range[1]:
+            self.time_range = (self.time_range[0] - 1,
+                               self.time_range[1] + 1)
+        self.value_range = value_range
+
+    def get_x(self, times: np.ndarray) -> np.ndarray:
+        low, high = self.time_range
+        return self.left + (times - low) / (high - low) * (
+                self.right - self.left)
+
+    def get_y(self, values: np.ndarray) -> np.ndarray:
+        low, high = self.value_range
+        return self.bottom - (values - low) / (high - low) * (
+                self.bottom - self.top)
+
+    def get_time_ticks(self) -> list[tuple[float, str]]:
+        if not self.has_times:
+            return []
+        return [
+            (float(self.get_x(np.float64(time))),
+             datetime.fromtimestamp(time).strftime("%Y-%m-%d %H:%M"))
+            for time in np.linspace(*self.time_range, TICK_COUNT)
+        ]
+
+    def get_value_ticks(self) -> list[tuple[float, str]]:
+        low, high = self.value_range
+        decimals = 0 if high - low >= TICK_COUNT * 2 else 2
+        return [
+            (float(self.get_y(np.float64(value))), f"{value:.{decimals}f}")
+            for value in np.linspace(low, high, TICK_COUNT)
+        ]
+
+
+def render_graph_image(
+        times: np.ndarray,
+        series: list[GraphSeries],
+        title: str,
+        y_axis_label: str,
+        as_step: bool = False,
+        size: tuple[int, int] = GRAPH_SIZE,
+) -> Image.Image:
+    """
+    Draw a line graph with Pillow.
+
+    :param times: The unix time of every data point. If there are none, an
+     empty graph is drawn.
+    :param series: The lines to draw.
+    :param title: The title above the graph.
+    :param y_axis_label: The label of the y-axis.
+    :param as_step: Draw each line as steps instead of straight lines.
+    :param size: The width and height of the image.
+    :return: The drawn graph.
+    """
+    series = _get_drawn_series(series)
+    layout = _Layout(times, _get_value_range(series), size)
+    image = Image.new("RGB", size, (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default()
+
+    for y, label in layout.get_value_ticks():
+        draw.line((layout.left, y, layout.right, y), fill=GRID_COLOR)
+        draw.text((layout.left - 5, y), label, fill=TEXT_COLOR, font=font,
+                  anchor="rm")
+    for x, label in layout.get_time_ticks():
+        draw.line((x, layout.bottom, x, layout.bottom + 4), fill=TEXT_COLOR)
+        draw.text((x, layout.bottom + 8), label, fill=TEXT_COLOR, font=font,
+                  anchor="mt")
+
+    for line in series:
+        xs, ys = _get_points(times, line.values, as_step)
+        for run_xs, run_ys in _split_finite_runs(layout.get_x(xs),
+                                                 layout.get_y(ys)):
+            points = np.column_stack([run_xs, run_ys])
+            if len(points) == 0:
+                continue
+            if line.dotted:
+                for start in range(0, len(points) - 1, 2):
+                    draw.line(points[start:start + 2].ravel().tolist(),
+                              fill=line.color)
+            elif len(points) == 1:
+                draw.point(points.ravel().tolist(), fill=line.color)
+            else:
+                draw.line(points.ravel().tolist(), fill=line.color)
+
+    draw.rectangle((layout.left, layout.top, layout.right, layout.bottom),
+                   outline=TEXT_COLOR)
+    draw.text((size[0] / 2, layout.top / 2), title, fill=TEXT_COLOR,
+              font=font, anchor="mm")
+    draw.text((size[0] / 2, size[1] - 15), "Time", fill=TEXT_COLOR,
+              font=font, anchor="mm")
+    if y_axis_label:
+        label_image = Image.new("RGBA", (size[1], 20), (0, 0, 0, 0))
+        ImageDraw.Draw(label_image).text(
+            (size[1] / 2, 10), y_axis_label, fill=TEXT_COLOR, font=font,
+            anchor="mm")
+        label_image = label_image.rotate(90, expand=True)
+        image.paste(label_image, (0, 0), label_image)
+    return image
+
+
+def _format_points(xs: np.ndarray, ys: np.ndarray) -> str:
+    return ("%.1f,%.1f " * len(xs)) % tuple(
+        np.column_stack([xs, ys]).ravel().tolist())
+    # ^ One formatting call for all points is a lot faster than one per
+    #  point.
+
+
+def render_graph_svg(
+        times: np.ndarray,
+        series: list[GraphSeries],
+        title: str,
+        y_axis_label: str,
+        as_step: bool = False,
+        size: tuple[int, int] = GRAPH_SIZE,
+) -> str:
+    """
+    Like `render_graph_image`, but make an SVG document.
+
+    :return: The SVG document.
+    """
+    series = _get_drawn_series(series)
+    layout = _Layout(times, _get_value_range(series), size)
+    width, height = size
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" '
+        f'height="{height}" viewBox="0 0 {width} {height}" '
+        f'font-family="sans-serif" font-size="10">',
+        f'<rect width="{width}" height="{height}" fill="white"/>',
+    ]
+    for y, label in layout.get_value_ticks():
+        parts.append(
+            f'<line x1="{layout.left}" y1="{y:.1f}" x2="{layout.right}" '
+            f'y2="{y:.1f}" stroke="rgb{GRID_COLOR}"/>'
+            f'<text x="{layout.left - 5}" y="{y:.1f}" text-anchor="end" '
+            f'dominant-baseline="middle">{label}</text>'
+        )
+    for x, label in layout.get_time_ticks():
+        parts.append(
+            f'<text x="{x:.1f}" y="{layout.bottom + 8}" text-anchor="middle" '
+            f'dominant-baseline="hanging">{label}</text>'
+        )
+
+    for line in series:
+        xs, ys = _get_points(times, line.values, as_step)
+        dash = ' stroke-dasharray="2,2"' if line.dotted else ""
+        for run_xs, run_ys in _split_finite_runs(layout.get_x(xs),
+                                                 layout.get_y(ys)):
+            if len(run_xs) == 0:
+                continue
+            parts.append(
+                f'<polyline fill="none" stroke="rgb{line.color}"{dash} '
+                f'points="{_format_points(run_xs, run_ys)}">'
+                f'<title>{html.escape(line.label)}</title></polyline>'
+            )
+
+    parts.append(
+        f'<rect x="{layout.left}" y="{layout.top}" '
+        f'width="{layout.right - layout.left}" '
+        f'height="{layout.bottom - layout.top}" fill="none" stroke="black"/>'
+        f'<text x="{width / 2}" y="{layout.top / 2}" text-anchor="middle" '
+        f'font-size="12">{html.escape(title)}</text>'
+        f'<text x="{width / 2}" y="{height - 12}" '
+        f'text-anchor="middle">Time</text>'
+    )
+    if y_axis_label:
+        parts.append(
+            f'<text transform="translate(12 {height / 2}) rotate(-90)" '
+            f'text-anchor="middle">{html.escape(y_axis_label)}</text>'
+        )
+    parts.append("</svg>")
+    return "\n".join(parts)
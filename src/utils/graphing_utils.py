@@ -3,8 +3,21 @@ from typing import Literal, get_args, overload
 
 from src.utils.color_utils import ColorName, ColorTuple, PIXEL_COLORS
 from datetime import datetime
-from matplotlib import pyplot as plt
+
+import numpy as np
+
 from src.config import Config
+from src.snapshot_history import (
+    SNAPSHOT_TIME_FORMAT,
+    SUBSECOND_SNAPSHOT_TIME_FORMAT,
+)
+from src.utils.graph_rendering import (
+    GraphRenderer,
+    GraphSeries,
+    get_pyplot,
+    render_graph_image,
+    render_graph_svg,
+)
 
 
 def _pixel_color_to_graph_color(
@@ -14,26 +27,43 @@ def _pixel_color_to_graph_color(
     return r / 255, g / 255, b / 255
 
 
-def parse_filename_unix_time(filename: str) -> int:
-    """Convert a name like "2025-08-22T184429.png" to a unix integer."""
+def parse_filename_unix_time(filename: str) -> float:
+    """
+    Convert a name like "2025-08-22T184429.png" or
+    "2025-08-22T184429_500000.png" to a unix time. The microseconds are
+    kept, so pictures taken within the same second get different times.
+    """
     time = parse_filename_datetime(filename)
-    return int(time.timestamp())
+    return time.timestamp()
 
 
 def parse_filename_datetime(filename: str) -> datetime:
-    """Convert a name like "2025-08-22T184429.png" to a datetime object."""
-    assert filename.count(".") == 1
-    raw_name = filename.split(".", 3)[0]  # remove extension
-    time = datetime.strptime(
-        raw_name,
-        '%Y-%m-%dT%H%M%S'
-    )
-    if time is None:
-        raise ValueError(f"Could not parse datetime from filename: {filename}")
-    return time
-
-
-def _unix_to_timestring(unix_time: int) -> str:
+    """
+    Convert a name like "2025-08-22T184429.png" or
+    "2025-08-22T184429_500000.png" to a datetime object.
+    """
+    raw_name = os.path.splitext(os.path.basename(filename))[0]
+    # ^ remove directory and extension
+    for time_format in (SUBSECOND_SNAPSHOT_TIME_FORMAT, SNAPSHOT_TIME_FORMAT):
+        try:
+            return datetime.strptime(raw_name, time_format)
+        except ValueError:
+            continue
+    raise ValueError(f"Could not parse datetime from filename: {filename}")
+
+
+def get_time_range_start(max_minutes: int | None) -> int | None:
+    """
+    :param max_minutes: How far back in time a graph goes, in minutes.
+    :return: The unix time at which the graph starts, or None if the graph
+     has no time limit.
+    """
+    if max_minutes is None:
+        return None
+    return int(datetime.now().timestamp()) - max_minutes * 60
+
+
+def _unix_to_timestring(unix_time: float) -> str:
     return datetime.fromtimestamp(unix_time).strftime('%Y-%m-%d %H:%M')
 
 
@@ -47,7 +77,7 @@ class Grapher:
 
     def add_data_point(
             self,
-            time: int,
+            time: float,
             appended_data: dict[ColorName, float],
     ) -> None:
         # Todo: this is a duplicate
@@ -79,8 +109,8 @@ class Grapher:
 
     def crop_data_to_time_range(
             self,
-            earliest_bound: int,
-            latest_bound: int
+            earliest_bound: float,
+            latest_bound: float
     ) -> None:
         assert "time" in self.data.keys(), "Missing \"time\" key!"
         keys, values = zip(*self.data.items())
@@ -119,6 +149,22 @@ class Grapher:
                 for i in range(len(self.data[key]))
             ]
 
+    def _get_series(self) -> list[GraphSeries]:
+        series = []
+        for key in self.data:
+            if key == 'time':
+                continue
+            r, g, b, _ = PIXEL_COLORS[key]
+            series.append(GraphSeries(
+                key,
+                np.array(self.data[key], dtype=np.float64),
+                (0, 0, 0) if (r, g, b) == (255, 255, 255) else (r, g, b),
+                (r, g, b) == (255, 255, 255),
+                # ^ Display white as a dotted black line (on a white
+                #  background)
+            ))
+        return series
+
     def make_graph(
             self,
             config: Config,
@@ -129,36 +175,64 @@ class Grapher:
             max_minutes: int | None = None,
             as_step: bool = False,
             hide_repeating_zeros: bool = True,
+            renderer: GraphRenderer = "matplotlib",
     ):
-        fig, ax = plt.subplots()
-        only_one_data_point = True
+        """
+        Save the data as a line graph in the output directory.
 
+        :param renderer: What to draw the graph with. "pil" and "svg" don't
+         import matplotlib, which makes them a lot faster for scheduled
+         runs. With "svg", the file extension is changed to ".svg".
+         (Default: matplotlib)
+        """
         if max_minutes is not None:
             now_unix = int(datetime.now().timestamp())
-            max_minutes_unix = now_unix - max_minutes * 60
-            self.crop_data_to_time_range(max_minutes_unix, now_unix)
+            self.crop_data_to_time_range(get_time_range_start(max_minutes),
+                                         now_unix)
 
         if hide_repeating_zeros:
             self.hide_repeating_zeros_data()
 
-        for key in self.data:
-            if key == 'time':
-                continue
-            if len(self.data[key]) > 1:
-                only_one_data_point = False
-            line_color = _pixel_color_to_graph_color(PIXEL_COLORS[key])
-            if line_color == (1, 1, 1):
-                # Display white as a dotted black line (on a white background)
-                line_style = "dotted"
-                line_color = (0, 0, 0)
-            else:
-                line_style = "solid"
+        if not any(len(self.data[key]) > 1 for key in self.data
+                   if key != 'time'):
+            print(
+                "You only have one data point so far. This means your graph will "
+                "not have any graphs displayed on them yet. Gather more progress "
+                "data to see graphs."
+            )
+
+        path = os.path.join(config.output_dir, file_name)
+        if renderer == "matplotlib":
+            self._make_matplotlib_graph(path, title, y_axis_label, as_step)
+            return
+        times = np.array(self.data['time'], dtype=np.float64)
+        if renderer == "svg":
+            svg = render_graph_svg(times, self._get_series(), title,
+                                   y_axis_label, as_step)
+            with open(os.path.splitext(path)[0] + ".svg", "w") as f:
+                f.write(svg)
+        else:
+            render_graph_image(times, self._get_series(), title,
+                               y_axis_label, as_step).save(path)
+
+    def _make_matplotlib_graph(
+            self,
+            path: str,
+            title: str,
+            y_axis_label: str,
+            as_step: bool,
+    ) -> None:
+        plt = get_pyplot()
+        fig, ax = plt.subplots()
 
+        for line in self._get_series():
+            line_color = _pixel_color_to_graph_color((*line.color, 255))
+            line_style = "dotted" if line.dotted else "solid"
             if as_step:
                 ax.step(
                     self.data['time'],
-                    self.data[key],
-                    label=key,
+                    line.values,
+                    label=line.label,
                     color=line_color,
                     linestyle=line_style,
                     where="post",
@@ -166,19 +240,12 @@ class Grapher:
             else:
                 ax.plot(
                     self.data['time'],
-                    self.data[key],
-                    label=key,
+                    line.values,
+                    label=line.label,
                     color=line_color,
                     linestyle=line_style,
                 )
 
-        if only_one_data_point:
-            print(
-                "You only have one data point so far. This means your graph will "
-                "not have any graphs displayed on them yet. Gather more progress "
-                "data to see graphs."
-            )
-
         ax.set_title(title)
         ax.set_xlabel('Time')
         ax.set_ylabel(y_axis_label)
@@ -209,5 +276,6 @@ class Grapher:
         ax.tick_params(axis='x', labelrotation=20)
         # ax.legend()
         fig.subplots_adjust(bottom=0.2)
-        path = os.path.join(config.output_dir, file_name)
-        plt.savefig(path)
+        fig.savefig(path)
+        plt.close(fig)
+        # ^ Free the figure, for processes that make many graphs.
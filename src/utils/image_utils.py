@@ -1,5 +1,6 @@
 import typing
 
+import numpy as np
 from PIL import Image
 
 from src.utils.color_utils import (
@@ -7,6 +8,7 @@ from src.utils.color_utils import (
     ColorName,
     PIXEL_COLORS,
 )
+from src.utils.palette_utils import count_palette, image_to_palette
 
 
 class Mask(Image.Image):
@@ -194,27 +196,10 @@ def get_pixel_count(img: Image.Image) -> dict[ColorName, int]:
     :param img: The image to count pixels for.
     :return: A dictionary mapping each color's name to its number of pixels.
     """
-    assert img.mode == "RGBA", "Image is expected to be RGBA!"
-    name_table: dict[ColorTuple, ColorName] = {
-        v: k
-        for k, v in PIXEL_COLORS.items()
-    }
-    pixel_count: dict[ColorName, int] = {k: 0 for k in name_table.values()}
-    for x in range(img.width):
-        for y in range(img.height):
-            pixel: ColorTuple = img.getpixel((x, y))  # type: ignore
-            if pixel[3] == 0:  # why does (255, 255, 255, 0) exist -_-
-                pixel = (0, 0, 0, 0)
-            pixel_name = name_table[pixel]
-            pixel_count[pixel_name] += 1
-
-    del pixel_count["Transparent"]
-    sorted_pixel_count = dict(sorted(
-        pixel_count.items(),
-        key=lambda i: i[1],
-        reverse=True
-    ))
-    return sorted_pixel_count
+    # Note: fully transparent pixels like (255, 255, 255, 0) count as
+    #  transparent too. Palette images made by `save_palette_image` are
+    #  counted without converting them to RGBA.
+    return count_palette(image_to_palette(img))
 
 
 def filter_colors(
@@ -257,3 +242,31 @@ def are_images_identical(
             if pixel1 != pixel2:
                 return False
     return True
+
+
+def make_heatmap_image(
+        values: np.ndarray,
+        mask: np.ndarray | None = None,
+        maximum: float | None = None,
+) -> Image.Image:
+    """
+    Color a 2D array of values from yellow (low) to red (high).
+
+    :param values: The (height, width) values to color.
+    :param mask: Optional (height, width) bool array. Pixels outside the mask
+     are transparent. (Default: Every non-zero value)
+    :param maximum: The value that is colored fully red. Higher values are
+     clipped. (Default: The highest value)
+    :return: A new RGBA image.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if mask is None:
+        mask = values != 0
+    if maximum is None:
+        maximum = float(values[mask].max()) if mask.any() else 1.0
+    scaled = np.clip(values / maximum if maximum > 0 else values * 0, 0, 1)
+    heatmap = np.zeros(values.shape + (4,), dtype=np.uint8)
+    heatmap[..., 0] = 255
+    heatmap[..., 1] = np.round(255 * (1 - scaled))
+    heatmap[..., 3] = np.where(mask, 255, 0)
+    return Image.fromarray(heatmap, "RGBA")
@@ -0,0 +1,515 @@
+import functools
+import struct
+import typing
+import zlib
+
+import numpy as np
+from PIL import Image
+
+from src.utils.color_utils import ColorName, PIXEL_COLORS
+
+__all__ = [
+    "PALETTE",
+    "PALETTE_RGBA",
+    "TRANSPARENT_INDEX",
+    "get_palette_index",
+    "get_color_index_mask",
+    "image_to_palette",
+    "palette_to_image",
+    "palette_to_palette_image",
+    "save_palette_image",
+    "PalettePngWriter",
+    "RgbaPngWriter",
+    "SNAPSHOT_COMPRESS_LEVEL",
+    "OUTPUT_COMPRESS_LEVEL",
+    "count_palette",
+    "get_color_counts",
+    "get_remaining_palette",
+    "get_misplaced_palette",
+    "snap_image_to_palette",
+]
+
+
+TRANSPARENT_INDEX = 0
+
+# Every wplace color, with "Transparent" first so that a palette index of 0
+#  always means an unplaced pixel.
+PALETTE: tuple[ColorName, ...] = (
+    "Transparent",
+    *(name for name in PIXEL_COLORS if name != "Transparent"),
+)
+PALETTE_RGBA: np.ndarray = np.array(
+    [PIXEL_COLORS[name] for name in PALETTE],
+    dtype=np.uint8,
+)
+
+
+def _pack_rgba(rgba: np.ndarray) -> np.ndarray:
+    """
+    Pack an (..., 4) uint8 RGBA array into one uint32 per pixel. Pixels with
+    an alpha of 0 are all packed to 0, since they're all transparent.
+    """
+    rgba = np.ascontiguousarray(rgba, dtype=np.uint8)
+    packed = rgba.view(np.uint32)[..., 0]
+    return np.where(rgba[..., 3] == 0, np.uint32(0), packed)
+
+
+_PNG_PALETTE: list[int] = PALETTE_RGBA[:, :3].ravel().tolist()
+
+SNAPSHOT_COMPRESS_LEVEL = 9
+# ^ Progress pictures are kept forever, and palette images are quick to
+#  compress even at the highest level.
+OUTPUT_COMPRESS_LEVEL = 3
+# ^ Output pictures are overwritten on every fetch.
+
+_PALETTE_KEYS = _pack_rgba(PALETTE_RGBA)
+_KEY_ORDER = np.argsort(_PALETTE_KEYS)
+_SORTED_PALETTE_KEYS = _PALETTE_KEYS[_KEY_ORDER]
+
+
+def get_palette_index(color_name: ColorName) -> int:
+    return PALETTE.index(color_name)
+
+
+def get_color_index_mask(colors: typing.Iterable[ColorName]) -> np.ndarray:
+    """
+    Create a lookup table to test if a palette index is one of the given
+    colors, like `mask[palette_array]`.
+
+    :param colors: The colors that should be marked as True.
+    :return: A boolean array with one value for each palette index.
+    """
+    mask = np.zeros(len(PALETTE), dtype=bool)
+    for color_name in colors:
+        mask[get_palette_index(color_name)] = True
+    return mask
+
+
+def _has_wplace_palette(img: Image.Image) -> bool:
+    """
+    Test if an image is a palette image that was saved with
+    `save_palette_image`, so its pixel values are already palette indices.
+    """
+    if img.mode != "P" or img.info.get("transparency") != TRANSPARENT_INDEX:
+        return False
+    palette = img.getpalette()
+    return (
+            palette is not None
+            and palette[:len(_PNG_PALETTE)] == _PNG_PALETTE
+            and img.getextrema()[1] < len(PALETTE)
+    )
+
+
+def image_to_palette(img: Image.Image) -> np.ndarray:
+    """
+    Convert an image to an array of palette indices.
+
+    :param img: The image to convert. Every pixel must be a wplace color or
+     fully transparent.
+    :return: A (height, width) uint8 array, with an index into `PALETTE`
+     for every pixel.
+    """
+    if _has_wplace_palette(img):
+        return np.asarray(img, dtype=np.uint8)
+    if img.mode != "RGBA":
+        img = img.convert("RGBA")
+    keys = _pack_rgba(np.asarray(img))
+    positions = np.searchsorted(_SORTED_PALETTE_KEYS, keys)
+    positions = np.minimum(positions, len(_SORTED_PALETTE_KEYS) - 1)
+    invalid = _SORTED_PALETTE_KEYS[positions] != keys
+    if invalid.any():
+        y, x = np.argwhere(invalid)[0]
+        raise ValueError(
+            f"Image contains {np.count_nonzero(invalid)} pixels that aren't "
+            f"a wplace color, like {img.getpixel((int(x), int(y)))} "
+            f"at ({x}, {y})."
+        )
+    return _KEY_ORDER[positions].astype(np.uint8)
+
+
+def palette_to_image(palette: np.ndarray) -> Image.Image:
+    """
+    Convert an array of palette indices back into an RGBA image.
+
+    :param palette: A (height, width) array of palette indices.
+    :return: A new RGBA image.
+    """
+    return Image.fromarray(PALETTE_RGBA[palette], "RGBA")
+
+
+def palette_to_palette_image(palette: np.ndarray) -> Image.Image:
+    """
+    Convert an array of palette indices into a palette ("P" mode) image
+    using the wplace colors, with "Transparent" as the transparency index.
+
+    :param palette: A (height, width) array of palette indices.
+    :return: A new palette image.
+    """
+    img = Image.fromarray(np.asarray(palette, dtype=np.uint8), "P")
+    img.putpalette(_PNG_PALETTE)
+    img.info["transparency"] = TRANSPARENT_INDEX
+    return img
+
+
+def save_palette_image(
+        palette: np.ndarray,
+        path: str | typing.BinaryIO,
+        compress_level: int = OUTPUT_COMPRESS_LEVEL,
+) -> None:
+    """
+    Save an array of palette indices as a palette PNG, which is a lot
+    smaller and faster to save and load than an RGBA PNG.
+
+    :param palette: A (height, width) array of palette indices.
+    :param path: The path or opened file to save the image to.
+    :param compress_level: The zlib compression level, from 0 (none) to 9.
+    """
+    palette_to_palette_image(palette).save(
+        path,
+        format="PNG",
+        compress_level=compress_level,
+        transparency=TRANSPARENT_INDEX,
+    )
+
+
+class _PngWriter:
+    """
+    Write a PNG a few rows at a time, so that images that are too large to
+    keep in memory can still be saved.
+    """
+    _IDAT_SIZE = 1 << 16
+    _COLOR_TYPE: int
+    _CHANNELS: int
+
+    def __init__(
+            self,
+            file: typing.BinaryIO,
+            width: int,
+            height: int,
+            compress_level: int = OUTPUT_COMPRESS_LEVEL,
+    ) -> None:
+        """
+        :param file: The opened file to write the image to.
+        :param width: The width of the image.
+        :param height: The amount of rows that will be written.
+        :param compress_level: The zlib compression level, from 0 (none)
+         to 9.
+        """
+        self.file = file
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self._compressor = zlib.compressobj(compress_level)
+        self._buffer = bytearray()
+
+        file.write(b"\x89PNG\r\n\x1a\n")
+        self._write_chunk(b"IHDR", struct.pack(
+            ">IIBBBBB", width, height, 8, self._COLOR_TYPE, 0, 0, 0))
+        # ^ 8 bits per channel, no interlacing.
+
+    def _write_chunk(self, chunk_type: bytes, data: bytes) -> None:
+        self.file.write(struct.pack(">I", len(data)))
+        self.file.write(chunk_type)
+        self.file.write(data)
+        self.file.write(struct.pack(">I", zlib.crc32(chunk_type + data)))
+
+    def _flush(self, minimum_size: int) -> None:
+        while len(self._buffer) >= max(minimum_size, 1):
+            self._write_chunk(b"IDAT",
+                              bytes(self._buffer[:self._IDAT_SIZE]))
+            del self._buffer[:self._IDAT_SIZE]
+
+    def write_rows(self, rows: np.ndarray) -> None:
+        """
+        Append rows to the image.
+
+        :param rows: A (rows, width) array of pixels, with an extra axis
+         for the channels if the image has more than one.
+        """
+        if rows.shape[1] != self.width:
+            raise ValueError(f"Expected rows of width {self.width}, got "
+                             f"{rows.shape[1]}!")
+        if self.rows_written + rows.shape[0] > self.height:
+            raise ValueError("Wrote more rows than the height of the image!")
+        scanlines = np.zeros(
+            (rows.shape[0], self.width * self._CHANNELS + 1), dtype=np.uint8)
+        scanlines[:, 1:] = rows.reshape(rows.shape[0], -1)
+        # ^ Every row starts with a filter type byte; 0 means no filter.
+        self._buffer += self._compressor.compress(scanlines.tobytes())
+        self._flush(self._IDAT_SIZE)
+        self.rows_written += rows.shape[0]
+
+    def close(self) -> None:
+        """
+        Finish the image. All rows must have been written.
+        """
+        if self.rows_written != self.height:
+            raise ValueError(f"Only wrote {self.rows_written} of "
+                             f"{self.height} rows!")
+        self._buffer += self._compressor.flush()
+        self._flush(0)
+        self._write_chunk(b"IEND", b"")
+
+    def __enter__(self) -> typing.Self:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+
+
+class PalettePngWriter(_PngWriter):
+    """
+    Write a palette PNG a few rows at a time, so that images that are too
+    large to keep in memory can still be saved. The result is the same as
+    `save_palette_image`.
+    """
+    _COLOR_TYPE = 3
+    _CHANNELS = 1
+
+    def __init__(
+            self,
+            file: typing.BinaryIO,
+            width: int,
+            height: int,
+            compress_level: int = OUTPUT_COMPRESS_LEVEL,
+    ) -> None:
+        """
+        :param file: The opened file to write the image to.
+        :param width: The width of the image.
+        :param height: The amount of rows that will be written.
+        :param compress_level: The zlib compression level, from 0 (none)
+         to 9.
+        """
+        super().__init__(file, width, height, compress_level)
+        alpha = [255] * len(PALETTE)
+        alpha[TRANSPARENT_INDEX] = 0
+        self._write_chunk(b"PLTE", bytes(_PNG_PALETTE))
+        self._write_chunk(b"tRNS", bytes(alpha[:TRANSPARENT_INDEX + 1]))
+        # ^ Palette entries after the last alpha value are opaque.
+
+
+class RgbaPngWriter(_PngWriter):
+    """
+    Write an RGBA PNG a few rows at a time, like `PalettePngWriter`.
+    """
+    _COLOR_TYPE = 6
+    _CHANNELS = 4
+
+
+def count_palette(palette: np.ndarray) -> dict[ColorName, int]:
+    """
+    Count the occurrence of each color in an array of palette indices.
+
+    :param palette: The palette indices to count.
+    :return: A dictionary mapping each color's name to its number of pixels,
+     sorted by count, without "Transparent". This matches `get_pixel_count`.
+    """
+    return get_color_counts(
+        np.bincount(palette.ravel(), minlength=len(PALETTE)))
+
+
+def get_color_counts(counts: np.ndarray) -> dict[ColorName, int]:
+    """
+    Convert an array with the amount of pixels of each palette index (like
+    from `np.bincount`) to the format of `count_palette`.
+
+    :param counts: The amount of pixels for every palette index.
+    :return: A dictionary mapping each color's name to its number of pixels,
+     sorted by count, without "Transparent".
+    """
+    pixel_count: dict[ColorName, int] = {
+        color_name: int(counts[index])
+        for index, color_name in enumerate(PALETTE)
+        if index != TRANSPARENT_INDEX
+    }
+    return dict(sorted(
+        pixel_count.items(),
+        key=lambda i: i[1],
+        reverse=True
+    ))
+
+
+def get_remaining_palette(
+        template: np.ndarray,
+        progress: np.ndarray,
+) -> np.ndarray:
+    """
+    Get the template pixels that haven't been placed, or that have been
+    placed with the wrong color. This matches `get_remaining_pixels_image`.
+
+    :param template: The palette indices of the goal image.
+    :param progress: The palette indices of the current canvas.
+    :return: A palette array with the template's color for every remaining
+     pixel, and transparent everywhere else.
+    """
+    if template.shape != progress.shape:
+        raise ValueError(
+            f"Template and progress image were not the same size!\n"
+            f"Template image: {template.shape[::-1]}, "
+            f"progress image: {progress.shape[::-1]}"
+        )
+    return np.where(progress != template, template, TRANSPARENT_INDEX)
+
+
+def get_misplaced_palette(
+        template: np.ndarray,
+        progress: np.ndarray,
+) -> np.ndarray:
+    """
+    Get the template pixels that have been placed with the wrong color.
+    Unplaced pixels are not counted as misplaced.
+
+    :param template: The palette indices of the goal image.
+    :param progress: The palette indices of the current canvas.
+    :return: A palette array with the template's color for every misplaced
+     pixel, and transparent everywhere else.
+    """
+    misplaced = (
+            (progress != template)
+            & (progress != TRANSPARENT_INDEX)
+    )
+    return np.where(misplaced, template, TRANSPARENT_INDEX)
+
+
+LOOKUP_BITS = 6
+# ^ Bits per channel in the nearest-color lookup table: 64*64*64 entries.
+
+
+def _srgb_to_lab(rgb: np.ndarray) -> np.ndarray:
+    """
+    Convert (..., 3) sRGB values (0-255) to CIE L*a*b* (D65).
+    """
+    linear = rgb / 255
+    linear = np.where(linear > 0.04045,
+                      ((linear + 0.055) / 1.055) ** 2.4,
+                      linear / 12.92)
+    xyz = linear @ np.array([
+        [0.4124, 0.2126, 0.0193],
+        [0.3576, 0.7152, 0.1192],
+        [0.1805, 0.0722, 0.9505],
+    ])
+    xyz /= np.array([0.95047, 1.0, 1.08883])
+    f = np.where(xyz > 216 / 24389,
+                 np.cbrt(xyz),
+                 (24389 / 27 * xyz + 16) / 116)
+    return np.stack([
+        116 * f[..., 1] - 16,
+        500 * (f[..., 0] - f[..., 1]),
+        200 * (f[..., 1] - f[..., 2]),
+    ], axis=-1)
+
+
+def _pack_rgba_little_endian(rgba: np.ndarray) -> np.ndarray:
+    """
+    Pack an (..., 4) uint8 RGBA array into one uint32 per pixel, with red
+    in the lowest byte and alpha in the highest byte.
+    """
+    rgba = np.ascontiguousarray(rgba, dtype=np.uint8)
+    return rgba.view("<u4")[..., 0]
+
+
+_PALETTE_PACKED = _pack_rgba_little_endian(PALETTE_RGBA)
+_OPAQUE_PALETTE_RGB = _PALETTE_PACKED[1:] & 0xFFFFFF
+# ^ Skip "Transparent", since it has the same RGB values as "Black".
+_OPAQUE_RGB_ORDER = np.argsort(_OPAQUE_PALETTE_RGB)
+_SORTED_OPAQUE_PALETTE_RGB = _OPAQUE_PALETTE_RGB[_OPAQUE_RGB_ORDER]
+
+
+def _get_lookup_keys(packed: np.ndarray) -> np.ndarray:
+    """
+    Get the lookup table index of little-endian packed colors: the highest
+    bits of red, green and blue, concatenated.
+    """
+    shift = 8 - LOOKUP_BITS
+    mask = (1 << LOOKUP_BITS) - 1
+    return (
+            ((packed >> shift) & mask)
+            | ((packed >> (8 + shift - LOOKUP_BITS)) & (mask << LOOKUP_BITS))
+            | ((packed >> (16 + shift - 2 * LOOKUP_BITS))
+               & (mask << (2 * LOOKUP_BITS)))
+    )
+
+
+@functools.cache
+def _get_nearest_color_table(perceptual: bool) -> np.ndarray:
+    """
+    Build a lookup table from a quantized RGB color to the palette index of
+    the nearest opaque wplace color.
+
+    :param perceptual: Measure distance in CIELAB instead of RGB.
+    :return: A flat uint8 array, indexed by `_get_lookup_keys`.
+    """
+    levels = 1 << LOOKUP_BITS
+    step = 256 // levels
+    centers = np.arange(levels) * step + step / 2
+    b, g, r = np.meshgrid(centers, centers, centers, indexing="ij")
+    # ^ Blue varies slowest, to match the order of `_get_lookup_keys`.
+    table_colors = np.stack([r, g, b], axis=-1).reshape(-1, 3)
+    palette_colors = PALETTE_RGBA[1:, :3].astype(np.float64)
+    # ^ Skip "Transparent"; alpha is handled separately.
+    if perceptual:
+        table_colors = _srgb_to_lab(table_colors)
+        palette_colors = _srgb_to_lab(palette_colors)
+
+    nearest = np.empty(len(table_colors), dtype=np.uint8)
+    chunk_size = 1 << 15  # limit memory for the distance matrix
+    for start in range(0, len(table_colors), chunk_size):
+        chunk = table_colors[start:start + chunk_size]
+        distances = (
+                (chunk[:, np.newaxis, :] - palette_colors[np.newaxis]) ** 2
+        ).sum(axis=-1)
+        nearest[start:start + chunk_size] = np.argmin(distances, axis=1) + 1
+    return nearest
+
+
+def snap_image_to_palette(
+        img: Image.Image,
+        alpha_threshold: int = 128,
+        perceptual: bool = False,
+) -> tuple[np.ndarray, int]:
+    """
+    Convert an image to palette indices, mapping colors that aren't exactly
+    a wplace color to the nearest wplace color. Use this for templates
+    exported from art tools, which may contain slightly-off colors or
+    semi-transparent edges. Colors are looked up in a table with 6 bits per
+    channel, so colors almost exactly between two wplace colors may get the
+    slightly-further one.
+
+    :param img: The image to convert.
+    :param alpha_threshold: Pixels with a lower alpha become transparent;
+     other pixels become fully opaque.
+    :param perceptual: Find the nearest color by CIELAB distance, which is
+     closer to how people see colors, instead of RGB distance.
+    :return: A tuple of the (height, width) palette indices, and the amount
+     of pixels whose color was changed.
+    """
+    if img.mode != "RGBA":
+        img = img.convert("RGBA")
+    packed = _pack_rgba_little_endian(np.asarray(img))
+    rgb = packed & 0xFFFFFF
+    opaque = (packed >> 24) >= alpha_threshold
+
+    table = _get_nearest_color_table(perceptual)
+    palette = table[_get_lookup_keys(rgb)]
+    # A wplace color may be in a table cell whose center is closer to
+    #  another wplace color. Look those pixels up exactly, so that wplace
+    #  colors always stay the same.
+    inexact = np.flatnonzero(_PALETTE_PACKED[palette] & 0xFFFFFF != rgb)
+    if len(inexact) > 0:
+        inexact_rgb = rgb.ravel()[inexact]
+        positions = np.minimum(
+            np.searchsorted(_SORTED_OPAQUE_PALETTE_RGB, inexact_rgb),
+            len(_SORTED_OPAQUE_PALETTE_RGB) - 1,
+        )
+        exact = _SORTED_OPAQUE_PALETTE_RGB[positions] == inexact_rgb
+        palette.ravel()[inexact[exact]] = (
+                _OPAQUE_RGB_ORDER[positions[exact]] + 1)
+    palette[~opaque] = TRANSPARENT_INDEX
+
+    changed = np.where(
+        opaque,
+        _PALETTE_PACKED[palette] != packed,
+        (packed >> 24) != 0,
+    )
+    return palette, int(np.count_nonzero(changed))
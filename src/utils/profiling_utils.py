@@ -0,0 +1,161 @@
+import cProfile
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator, TypedDict
+
+from src.config import Config
+
+try:
+    import resource
+except ImportError:
+    # `resource` is only available on unix-like systems.
+    resource = None
+
+__all__ = [
+    "StageRecord",
+    "StageCounters",
+    "PipelineProfiler",
+    "measure_stage",
+    "cprofile_run",
+]
+
+
+PROFILE_DIRECTORY = "profiles"
+
+
+class StageRecord(TypedDict):
+    run_id: str
+    config: str
+    stage: str
+    started_at: str
+    wall_time: float
+    cpu_time: float
+    peak_rss: int | None
+    bytes_downloaded: int
+    tiles_fetched: int
+    pixels_processed: int
+
+
+class StageCounters:
+    """
+    Counters that a pipeline stage can increment while it is measured.
+    """
+    def __init__(self) -> None:
+        self.bytes_downloaded: int = 0
+        self.tiles_fetched: int = 0
+        self.pixels_processed: int = 0
+
+
+def get_peak_rss() -> int | None:
+    """
+    Get the peak resident set size of the current process.
+
+    :return: The peak memory usage in bytes, or None if the platform
+     doesn't support measuring it.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak  # macOS reports bytes, linux reports kilobytes.
+    return peak * 1024
+
+
+class PipelineProfiler:
+    """
+    Record wall time, CPU time, memory usage and counters for each stage
+    of the fetch pipeline. Every stage is appended as one JSON line to
+    the `pipeline_stats.jsonl` file in the config's output directory.
+    """
+    def __init__(self, run_id: str | None = None) -> None:
+        if run_id is None:
+            run_id = datetime.now().strftime("%Y-%m-%dT%H%M%S")
+        self.run_id = run_id
+
+    @contextmanager
+    def stage(
+            self,
+            config: Config,
+            stage_name: str,
+    ) -> Iterator[StageCounters]:
+        """
+        Measure a pipeline stage.
+
+        :param config: The config the stage is run for.
+        :param stage_name: The name of the stage, like "fetch" or "count".
+        :return: A context manager yielding counters that the stage can
+         increment.
+        """
+        counters = StageCounters()
+        started_at = datetime.now().isoformat(timespec="milliseconds")
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield counters
+        finally:
+            record: StageRecord = {
+                "run_id": self.run_id,
+                "config": config.name,
+                "stage": stage_name,
+                "started_at": started_at,
+                "wall_time": round(time.perf_counter() - wall_start, 6),
+                "cpu_time": round(time.process_time() - cpu_start, 6),
+                # ^ The peak so far, since the OS only tracks the process.
+                "peak_rss": get_peak_rss(),
+                "bytes_downloaded": counters.bytes_downloaded,
+                "tiles_fetched": counters.tiles_fetched,
+                "pixels_processed": counters.pixels_processed,
+            }
+            self._write_record(config, record)
+
+    @staticmethod
+    def _write_record(config: Config, record: StageRecord) -> None:
+        path = os.path.join(config.output_dir,
+                            config.paths.PIPELINE_STATS_NAME)
+        with open(path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+@contextmanager
+def measure_stage(
+        profiler: PipelineProfiler | None,
+        config: Config,
+        stage_name: str,
+) -> Iterator[StageCounters]:
+    """
+    Helper to measure a stage only if a profiler is given.
+
+    :param profiler: The profiler to record the stage with, or None to
+     skip measuring.
+    :param config: The config the stage is run for.
+    :param stage_name: The name of the stage.
+    :return: A context manager yielding counters for the stage.
+    """
+    if profiler is None:
+        yield StageCounters()
+        return
+    with profiler.stage(config, stage_name) as counters:
+        yield counters
+
+
+@contextmanager
+def cprofile_run(run_id: str) -> Iterator[str]:
+    """
+    Run the body under cProfile and dump the stats to the profile directory.
+
+    :param run_id: The name to give the dump file.
+    :return: A context manager yielding the path of the dump file.
+    """
+    os.makedirs(PROFILE_DIRECTORY, exist_ok=True)
+    path = os.path.join(PROFILE_DIRECTORY, f"{run_id}.prof")
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield path
+    finally:
+        profile.disable()
+        profile.dump_stats(path)
@@ -0,0 +1,155 @@
+import glob
+import json
+import os.path
+from typing import TypedDict
+
+import numpy as np
+from PIL import Image
+
+from src.config import Config
+from src.utils.color_utils import ColorName
+from src.utils.coord_utils import offset_coordinates
+from src.utils.palette_utils import (
+    PALETTE,
+    TRANSPARENT_INDEX,
+    image_to_palette,
+    save_palette_image,
+)
+
+__all__ = [
+    "ZonePixel",
+    "WorkZoneFile",
+    "partition_pixels",
+    "save_work_zones",
+]
+
+
+class ZonePixel(TypedDict):
+    color: ColorName
+    x: int
+    y: int
+    # ^ The position relative to the top left corner of the template.
+    coordinate: tuple[int, int, int, int]
+    # ^ The wplace coordinate: Tl X, Tl Y, Px X, Px Y.
+
+
+class WorkZoneFile(TypedDict):
+    zone: int
+    pixel_count: int
+    bounding_box: tuple[int, int, int, int]
+    # ^ The left, top, right and bottom of the zone's pixels (inclusive).
+    pixels: list[ZonePixel]
+
+
+def partition_pixels(
+        xs: np.ndarray,
+        ys: np.ndarray,
+        zone_count: int,
+) -> list[np.ndarray]:
+    """
+    Split pixels into compact zones with (almost) the same amount of pixels,
+    by recursive bisection: the pixels are cut in two across the longer side
+    of their bounding box, with each side getting a share of the pixels
+    that matches its share of the zones, until every part is one zone.
+
+    :param xs: The x positions of the pixels.
+    :param ys: The y positions of the pixels.
+    :param zone_count: The amount of zones to make.
+    :return: The indices of the pixels in each zone. Zone sizes differ by at
+     most one pixel.
+    """
+    if zone_count < 1:
+        raise ValueError("There must be at least one zone!")
+    zones: list[np.ndarray] = []
+
+    def bisect(indices: np.ndarray, count: int) -> None:
+        if count == 1:
+            zones.append(indices)
+            return
+        first_count = count // 2
+        split = len(indices) * first_count // count
+        if 0 < split < len(indices):
+            part_xs, part_ys = xs[indices], ys[indices]
+            width, height = np.ptp(part_xs), np.ptp(part_ys)
+            if width >= height:
+                key = part_xs.astype(np.int64) * (height + 1) + (
+                        part_ys - part_ys.min())
+            else:
+                key = part_ys.astype(np.int64) * (width + 1) + (
+                        part_xs - part_xs.min())
+            # ^ Sorting by the other axis second makes the cut a straight
+            #  line with at most one step, instead of a ragged edge.
+            order = np.argpartition(key, split)
+        else:
+            order = np.arange(len(indices))
+        bisect(indices[order[:split]], first_count)
+        bisect(indices[order[split:]], count - first_count)
+
+    bisect(np.arange(len(xs)), zone_count)
+    return zones
+
+
+def save_work_zones(config: Config, zone_count: int) -> list[int]:
+    """
+    Split the remaining placeable pixels into zones for **zone_count**
+    painters. For every zone, save a picture of its remaining pixels (to lay
+    over the canvas) and a list of its pixels, to the work zone directory.
+
+    :param config: The config to split the remaining pixels of.
+    :param zone_count: The amount of zones to make.
+    :return: The amount of pixels in each zone.
+    """
+    remainder_path = os.path.join(config.output_dir,
+                                  config.paths.REMAINING_PLACEABLE_PIXELS_NAME)
+    if not os.path.exists(remainder_path):
+        raise FileNotFoundError(
+            f"File {remainder_path} does not exist! Run "
+            f"`fetch_latest_picture.py` first to create a remainder picture."
+        )
+    remainder = image_to_palette(Image.open(remainder_path))
+    ys, xs = np.nonzero(remainder != TRANSPARENT_INDEX)
+
+    directory = os.path.join(config.output_dir,
+                             config.paths.WORK_ZONE_DIRECTORY)
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, "zone_*")):
+        os.remove(path)
+        # ^ Zones from a run with more painters would be left over.
+
+    pixel_counts = []
+    for zone, indices in enumerate(partition_pixels(xs, ys, zone_count), 1):
+        zone_xs, zone_ys = xs[indices], ys[indices]
+        overlay = np.full(remainder.shape, TRANSPARENT_INDEX, dtype=np.uint8)
+        overlay[zone_ys, zone_xs] = remainder[zone_ys, zone_xs]
+        save_palette_image(overlay,
+                           os.path.join(directory, f"zone_{zone}.png"))
+
+        order = np.lexsort((zone_xs, zone_ys))
+        zone_xs, zone_ys = zone_xs[order], zone_ys[order]
+        coordinates = np.column_stack(
+            offset_coordinates(config.top_left, zone_xs, zone_ys)).tolist()
+        pixels: list[ZonePixel] = [
+            {
+                "color": PALETTE[color],
+                "x": x,
+                "y": y,
+                "coordinate": tuple(coordinate),
+            }
+            for x, y, color, coordinate in zip(
+                zone_xs.tolist(), zone_ys.tolist(),
+                remainder[zone_ys, zone_xs].tolist(), coordinates)
+        ]
+        zone_file: WorkZoneFile = {
+            "zone": zone,
+            "pixel_count": len(pixels),
+            "bounding_box": (
+                (int(zone_xs.min()), int(zone_ys.min()),
+                 int(zone_xs.max()), int(zone_ys.max()))
+                if len(pixels) > 0 else (0, 0, -1, -1)
+            ),
+            "pixels": pixels,
+        }
+        with open(os.path.join(directory, f"zone_{zone}.json"), "w") as f:
+            json.dump(zone_file, f)
+        pixel_counts.append(len(pixels))
+    return pixel_counts
@@ -0,0 +1,66 @@
+import argparse
+
+from src.config import load_config
+from src.template_alignment import align_template
+
+
+def print_template_alignment(
+        config_name: str,
+        margin: int = 20,
+        max_colors: int = 8,
+) -> None:
+    config = load_config(config_name)
+    result = align_template(config, margin, max_colors)
+    top_left = result.top_left
+
+    if result.x_offset == 0 and result.y_offset == 0:
+        print("The configured top left corner is already the best fit.")
+    else:
+        print(
+            f"The template fits best {result.x_offset} pixel(s) to the "
+            f"right and {result.y_offset} pixel(s) down from the configured "
+            f"top left corner."
+        )
+    print(
+        f"Best top left corner: (Tl X: {top_left.TlX}, Tl Y: {top_left.TlY}, "
+        f"Px X: {top_left.PxX}, Px Y: {top_left.PxY})"
+    )
+    print(
+        f"{result.match_ratio:.2%} of the template pixels match at this "
+        f"position (peak ratio: {result.peak_ratio:.2f})."
+    )
+    if result.peak_ratio < 1.2:
+        print(
+            "Warning: another position scored almost as well, so this "
+            "result may be wrong. Try a smaller margin, or more colors."
+        )
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Find the top left corner where the template matches "
+                    "the canvas best."
+    )
+    arg_parser.add_argument(
+        "config",
+        type=str,
+        help="The config to align."
+    )
+    arg_parser.add_argument(
+        "--margin", "-m",
+        type=int,
+        default=20,
+        help="How many pixels the top left corner may be off in each "
+             "direction. (Default: 20)"
+    )
+    arg_parser.add_argument(
+        "--max_colors", "-c",
+        type=int,
+        default=8,
+        help="The amount of template colors to compare. More colors is "
+             "slower, but more accurate. (Default: 8)"
+    )
+
+    args = arg_parser.parse_args()
+
+    print_template_alignment(args.config, args.margin, args.max_colors)
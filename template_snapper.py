@@ -0,0 +1,37 @@
+import argparse
+import os
+
+from src.config import load_config
+from src.template_cache import load_compiled_template
+from src.utils.palette_utils import save_palette_image
+
+
+def save_snapped_template(config_name: str) -> None:
+    config = load_config(config_name)
+    template = load_compiled_template(config)
+    if template.snapped_pixel_count == 0:
+        print("Every template pixel is already a wplace color.")
+        return
+    output_path = os.path.join(config.output_dir,
+                               config.paths.SNAPPED_TEMPLATE_NAME)
+    save_palette_image(template.palette, output_path)
+    print(
+        f"{template.snapped_pixel_count} pixel(s) were changed to the "
+        f"nearest wplace color. Saved the result to `{output_path}`."
+    )
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Save a copy of the template where every pixel is "
+                    "changed to the nearest wplace color."
+    )
+    arg_parser.add_argument(
+        "config",
+        type=str,
+        help="The config to use."
+    )
+
+    args = arg_parser.parse_args()
+
+    save_snapped_template(args.config)
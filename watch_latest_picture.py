@@ -0,0 +1,239 @@
+import argparse
+import asyncio
+import time
+from datetime import datetime
+
+from fetch_latest_picture import update_outputs
+from src.change_stream import ChangeLog
+from src.config import load_config, Config
+from src.latest_image_loader import (
+    TileFetcher,
+    fetch_pictures,
+    get_grid_coordinates,
+    save_fetched_image,
+)
+from src.tile_archive import TileRecorder
+from src.tile_scheduler import TILE_SCHEDULE_PATH, TileScheduler
+from src.utils.profiling_utils import PipelineProfiler
+
+
+def _get_config_tiles(config: Config) -> list[tuple[int, int]]:
+    return get_grid_coordinates(config.top_left, config.image_size)
+
+
+def poll_once(
+        scheduler: TileScheduler,
+        configs: list[Config],
+        profiler: PipelineProfiler | None = None,
+        track_overwrites: bool = False,
+        subsecond: bool = False,
+        fetcher: TileFetcher | None = None,
+        change_log: ChangeLog | None = None,
+) -> float:
+    """
+    Fetch the tiles that are due, and save a new progress picture for every
+    config with a changed tile.
+
+    :param scheduler: The scheduler that decides which tiles are due.
+    :param configs: The configs to save progress pictures for.
+    :param profiler: An optional profiler to record each stage with.
+    :param track_overwrites: Whether to update the overwrite statistics.
+    :param subsecond: Whether to include microseconds in the names of the
+     saved images.
+    :param fetcher: The function to get the chunk images with.
+     (Default: download them from wplace)
+    :param change_log: If given, record the pixels that changed in each
+     config in it.
+    :return: The unix time at which the next tile will be due.
+    """
+    config_tiles = {config.name: _get_config_tiles(config)
+                    for config in configs}
+    all_tiles = sorted({tile for tiles in config_tiles.values()
+                        for tile in tiles})
+
+    now = time.time()
+    due_tiles = scheduler.get_due_tiles(all_tiles, now)
+    changed_tiles = set()
+    fetch_time = now
+    if len(due_tiles) > 0:
+        print(f"Fetching {len(due_tiles)} of {len(all_tiles)} chunk(s)...")
+        if fetcher is None:
+            fetcher = fetch_pictures
+        pictures = asyncio.run(fetcher(due_tiles))
+        fetch_time = time.time()
+        for tile, picture in zip(due_tiles, pictures):
+            if scheduler.record_fetch(tile, picture, fetch_time):
+                changed_tiles.add(tile)
+        scheduler.save()
+
+    for config in configs:
+        coords = config_tiles[config.name]
+        if changed_tiles.isdisjoint(coords):
+            continue
+        print(f"Assembling `{config.name}` from the latest chunks...")
+        saved_timestamp = save_fetched_image(
+            config,
+            coords,
+            [scheduler.get_tile(tile) for tile in coords],
+            True,
+            fetched_at=datetime.fromtimestamp(fetch_time),
+            subsecond=subsecond,
+            profiler=profiler,
+            change_log=change_log,
+        )
+        # ^ A chunk can change outside the config's area, so identical
+        #  pictures are always discarded here.
+        update_outputs(config, saved_timestamp, True, profiler,
+                       track_overwrites)
+
+    return min(scheduler.get_next_fetch_time(tile) for tile in all_tiles)
+
+
+def main(
+        config_names: list[str],
+        min_interval: float,
+        max_interval: float,
+        half_life: float,
+        profiler: PipelineProfiler | None = None,
+        track_overwrites: bool = False,
+        subsecond: bool = False,
+        fetcher: TileFetcher | None = None,
+        change_log: ChangeLog | None = None,
+):
+    """
+    Keep fetching the chunks of all configs, fetching chunks that change
+    often more often than chunks that rarely change.
+
+    :param config_names: The names of the configs to watch.
+    :param min_interval: The shortest time between fetches of a chunk, in
+     seconds.
+    :param max_interval: The longest time between fetches of a chunk, in
+     seconds.
+    :param half_life: How long an observed change keeps influencing a
+     chunk's fetch interval, in seconds.
+    :param profiler: An optional profiler to record each stage with.
+    :param track_overwrites: Whether to update the overwrite statistics.
+    :param subsecond: Whether to include microseconds in the names of the
+     saved images.
+    :param fetcher: The function to get the chunk images with.
+     (Default: download them from wplace)
+    :param change_log: If given, record the pixels that changed in each
+     config in it.
+    """
+    configs = [load_config(config_name) for config_name in config_names]
+    scheduler = TileScheduler(min_interval, max_interval, half_life)
+    try:
+        while True:
+            next_fetch_time = poll_once(scheduler, configs, profiler,
+                                        track_overwrites, subsecond, fetcher,
+                                        change_log)
+            time.sleep(max(next_fetch_time - time.time(), 0))
+    except KeyboardInterrupt:
+        scheduler.save()
+        print(f"Stopped watching. Saved chunk schedule at "
+              f"`{TILE_SCHEDULE_PATH}`")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Keep fetching the latest wplace images, checking chunks "
+                    "that change often more often than quiet chunks."
+    )
+    arg_parser.add_argument(
+        "config",
+        type=str,
+        nargs="+",
+        help="The configs to watch."
+    )
+    arg_parser.add_argument(
+        "--min_interval",
+        type=float,
+        default=60,
+        help="The shortest time between two fetches of a chunk, in seconds. "
+             "(Default: 60)"
+    )
+    arg_parser.add_argument(
+        "--max_interval",
+        type=float,
+        default=1800,
+        help="The longest time between two fetches of a chunk, in seconds. "
+             "(Default: 1800)"
+    )
+    arg_parser.add_argument(
+        "--half_life",
+        type=float,
+        default=3600,
+        help="How long it takes for an observed change to count half as "
+             "much towards a chunk's change rate, in seconds. "
+             "(Default: 3600)"
+    )
+    arg_parser.add_argument(
+        "--instrument", "-i",
+        action="store_true",
+        help="Record the wall time, CPU time and memory usage of each "
+             "pipeline stage to `pipeline_stats.jsonl` in the output "
+             "directory of each config."
+    )
+    arg_parser.add_argument(
+        "--track_overwrites", "-o",
+        action="store_true",
+        help="Also update the overwrite heatmaps and statistics with every "
+             "new progress picture. (See griefing_heatmap_maker.py)"
+    )
+    arg_parser.add_argument(
+        "--subsecond", "-s",
+        action="store_true",
+        help="Include microseconds in the names of the progress pictures, "
+             "for intervals shorter than a second."
+    )
+    arg_parser.add_argument(
+        "--record",
+        type=str,
+        default=None,
+        metavar="DIRECTORY",
+        help="Also save the downloaded chunks to an archive directory, to "
+             "replay them later with load_tester.py."
+    )
+    arg_parser.add_argument(
+        "--change_log",
+        action="store_true",
+        help="Append the pixels that changed since the previous progress "
+             "picture to `pixel_changes.jsonl` in the output directory. "
+             "(See fetch_latest_picture.py)"
+    )
+    arg_parser.add_argument(
+        "--change_socket",
+        type=str,
+        default=None,
+        metavar="PATH",
+        help="Also send every change record to this Unix socket, as one JSON "
+             "line. Implies --change_log."
+    )
+    arg_parser.add_argument(
+        "--change_webhook",
+        type=str,
+        default=None,
+        metavar="URL",
+        help="Also POST every change record to this URL, as JSON. Implies "
+             "--change_log."
+    )
+    args = arg_parser.parse_args()
+    pixel_change_log = None
+    if (
+            args.change_log
+            or args.change_socket is not None
+            or args.change_webhook is not None
+    ):
+        pixel_change_log = ChangeLog(args.change_socket, args.change_webhook)
+
+    main(
+        args.config,
+        args.min_interval,
+        args.max_interval,
+        args.half_life,
+        PipelineProfiler() if args.instrument else None,
+        args.track_overwrites,
+        args.subsecond,
+        None if args.record is None else TileRecorder(args.record),
+        pixel_change_log,
+    )
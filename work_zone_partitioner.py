@@ -0,0 +1,44 @@
+import argparse
+import os.path
+import time
+
+from src.config import load_config
+from src.work_zones import save_work_zones
+
+
+def main(config_name: str, painter_count: int):
+    config = load_config(config_name)
+    start = time.perf_counter()
+    pixel_counts = save_work_zones(config, painter_count)
+    duration = time.perf_counter() - start
+    print(f"Split {sum(pixel_counts)} remaining pixel(s) into "
+          f"{painter_count} zone(s) in {duration:.2f} seconds:")
+    for zone, pixel_count in enumerate(pixel_counts, 1):
+        print(f"  Zone {zone}: {pixel_count} pixel(s)")
+    zone_directory = os.path.join(config.output_dir,
+                                  config.paths.WORK_ZONE_DIRECTORY)
+    print(f"Saved the zones at `{zone_directory}`")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Split the remaining placeable pixels into compact zones "
+                    "with the same amount of pixels, one for each painter."
+    )
+    arg_parser.add_argument(
+        "config",
+        type=str,
+        help="The config to split the remaining pixels of."
+    )
+    arg_parser.add_argument(
+        "--painters", "-n",
+        type=int,
+        required=True,
+        help="The amount of painters, and so the amount of zones to make."
+    )
+
+    args = arg_parser.parse_args()
+    if args.painters < 1:
+        arg_parser.error("--painters must be at least 1")
+
+    main(args.config, args.painters)
@@ -1,35 +1,43 @@
 import argparse
-from PIL import Image
+
+import numpy as np
 from src.config import load_config, Config
+from src.snapshot_history import get_snapshot_names, iterate_snapshots
 
+from src.template_cache import CompiledTemplate, load_compiled_template
 from src.utils.color_utils import ColorName
-from src.utils.graphing_utils import Grapher
-from src.utils.image_utils import Mask, get_pixel_count
-import os
+from src.utils.graph_rendering import GRAPH_RENDERERS, GraphRenderer
+from src.utils.graphing_utils import Grapher, get_time_range_start
+from src.utils.palette_utils import (
+    count_palette,
+    get_misplaced_palette,
+)
 
 
 def _get_image_misplacement_count(
-        template: Image.Image,
-        img: Image.Image,
+        template: CompiledTemplate,
+        snapshot: np.ndarray,
 ) -> dict[ColorName, int]:
-    mask: Mask = Mask.from_image_difference(template, img)
-    wrong_pixels = Image.new("RGBA", template.size, (0, 0, 0, 0))
-    wrong_pixels.paste(template, mask=mask)
-    return get_pixel_count(wrong_pixels)
+    wrong_pixels = get_misplaced_palette(template.palette, snapshot)
+    return count_palette(wrong_pixels)
 
 
 def put_misplacement_data(
         config: Config,
         grapher: Grapher,
+        since: float | None = None,
 ) -> None:
-    template: Image.Image = config.get_template_image()
-    for image_name in os.listdir(config.picture_dir):
-        assert image_name.endswith(".png"), (
-            f"Expected .png file, got {image_name}!"
-        )
-        path = os.path.join(config.picture_dir, image_name)
-        img = Image.open(path)
-        image_data = _get_image_misplacement_count(template, img)
+    """
+    Add the amount of misplaced pixels in each progress picture to the
+    grapher.
+
+    :param since: If given, skip progress pictures taken before this unix
+     time without opening them.
+    """
+    template = load_compiled_template(config)
+    snapshot_names = get_snapshot_names(config, since)
+    for image_name, snapshot in iterate_snapshots(config, snapshot_names):
+        image_data = _get_image_misplacement_count(template, snapshot)
         grapher.add_data_point_from_filename(image_name, image_data)
 
 
@@ -37,10 +45,11 @@ def save_misplacement_data(
         config_name: str,
         max_minutes: int | None = None,
         step_graph: bool = False,
+        renderer: GraphRenderer = "matplotlib",
 ):
     config = load_config(config_name)
     grapher = Grapher()
-    put_misplacement_data(config, grapher)
+    put_misplacement_data(config, grapher, get_time_range_start(max_minutes))
     grapher.make_graph(
         config,
         config.paths.MISPLACEMENT_GRAPH_NAME,
@@ -48,6 +57,7 @@ def save_misplacement_data(
         "Misplaced pixels",
         max_minutes=max_minutes,
         as_step=step_graph,
+        renderer=renderer,
     )
 
 
@@ -74,6 +84,15 @@ if __name__ == "__main__":
         help="Whether to make the graph as steps or as a line. "
              "(Default: Line graph)"
     )
+    arg_parser.add_argument(
+        "--renderer",
+        type=str,
+        choices=GRAPH_RENDERERS,
+        default="matplotlib",
+        help="What to draw the graph with. \"pil\" (PNG) and \"svg\" are "
+             "a lot faster, since they don't load matplotlib. "
+             "(Default: matplotlib)"
+    )
 
     args = arg_parser.parse_args()
 
@@ -81,4 +100,5 @@ if __name__ == "__main__":
         args.config,
         args.max_minutes,
         args.step_graph,
+        args.renderer,
     )